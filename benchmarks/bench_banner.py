@@ -0,0 +1,45 @@
+"""
+Micro-benchmark for the startup banner renderer.
+
+Reports the one-time precompute cost and the per-frame cost of producing a
+frame and rendering the panel to a terminal-sized console.
+
+    python -m benchmarks.bench_banner --frames 1000
+"""
+import argparse
+import io
+import time
+
+from rich.console import Console
+
+from ollama_coder.ui import BannerRenderer, _banner_panel
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=1000)
+    parser.add_argument("--width", type=int, default=100)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    renderer = BannerRenderer()
+    precompute = time.perf_counter() - started
+    print(f"precompute (canvas, style lookup, {len(renderer.frames)} frames): {precompute * 1000:.2f} ms")
+    print(f"fits {args.width} columns: {renderer.fits(args.width)}")
+
+    started = time.perf_counter()
+    for frame in range(args.frames):
+        renderer.frame(frame)
+    lookup = (time.perf_counter() - started) / args.frames
+    print(f"frame lookup: {lookup * 1e6:.2f} us/frame")
+
+    console = Console(file=io.StringIO(), width=args.width, force_terminal=True, color_system="truecolor")
+    started = time.perf_counter()
+    for frame in range(args.frames):
+        console.print(_banner_panel(renderer.frame(frame)))
+    render = (time.perf_counter() - started) / args.frames
+    print(f"frame + panel render: {render * 1000:.3f} ms/frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Replay recorded sessions and compare end-to-end agent time across releases.
+
+Replays each trace (recorded with `start --record`) with stubbed tools and
+no model latency, so the timing covers Agent.chat, rendering and history
+handling only. Save a baseline on one release and compare on the next.
+
+    python -m benchmarks.bench_replay benchmarks/traces/*.jsonl.gz --save baseline.json
+    python -m benchmarks.bench_replay benchmarks/traces/*.jsonl.gz --compare baseline.json
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+
+from ollama_coder.trace import replay_trace
+
+DEFAULT_TRACES = os.path.join(os.path.dirname(__file__), "traces", "*.jsonl*")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("traces", nargs="*", help=f"Trace files (default: {DEFAULT_TRACES})")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--execute", action="store_true", help="Re-run real tools instead of stubbing them")
+    parser.add_argument("--save", help="Write median timings to this JSON file")
+    parser.add_argument("--compare", help="Compare against timings saved with --save")
+    args = parser.parse_args()
+
+    paths = args.traces or sorted(glob.glob(DEFAULT_TRACES))
+    if not paths:
+        parser.error("no trace files given or found")
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    medians = {}
+    for path in paths:
+        totals = [sum(turn["replayed"] for turn in replay_trace(path, execute_tools=args.execute))
+                  for _ in range(args.runs)]
+        name = os.path.basename(path)
+        medians[name] = statistics.median(totals)
+        line = f"{name}: median {medians[name] * 1000:.1f} ms over {args.runs} runs"
+        if name in baseline:
+            change = (medians[name] - baseline[name]) / baseline[name] * 100
+            line += f" (baseline {baseline[name] * 1000:.1f} ms, {change:+.1f}%)"
+        print(line)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(medians, f, indent=2)
+        print(f"saved {args.save}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Guard the CLI startup budget.
+
+Measures the wall time of importing the CLI entry point in a fresh
+interpreter, lists the slowest imports, and checks that heavy modules not
+needed for the first prompt stay lazy. Exits non-zero when over budget.
+
+    python -m benchmarks.bench_startup --budget-ms 250
+"""
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+ENTRY_MODULE = "ollama_coder.main"
+
+# Modules that must not be imported before the first prompt
+LAZY_MODULES = ["ollama", "httpx", "ollama_coder.agent", "ollama_coder.ui", "rich.live", "rich.markdown"]
+
+
+def import_wall_time(runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {ENTRY_MODULE}"], check=True)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def slowest_imports(limit: int):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {ENTRY_MODULE}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)", line)
+        if match:
+            rows.append((int(match.group(2)), len(match.group(3)), match.group(4)))
+    # Direct imports of top-level modules, so cumulative times are not double counted
+    direct = [row for row in rows if row[1] == 3]
+    return sorted(direct, reverse=True)[:limit]
+
+
+def eager_heavy_modules():
+    code = (
+        f"import sys, {ENTRY_MODULE}\n"
+        f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return [m for m in result.stdout.strip().split(",") if m]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=250.0, help="Max median wall time to import the CLI")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    interpreter = time.perf_counter() - started
+
+    median = import_wall_time(args.runs)
+    print(f"interpreter startup: {interpreter * 1000:.0f} ms")
+    print(f"import {ENTRY_MODULE}: median {median * 1000:.0f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    print("slowest top-level imports (cumulative):")
+    for cumulative_us, _, name in slowest_imports(8):
+        print(f"  {cumulative_us / 1000:7.1f} ms  {name}")
+
+    failed = False
+    eager = eager_heavy_modules()
+    if eager:
+        print(f"FAIL: imported eagerly: {', '.join(eager)}")
+        failed = True
+    if median * 1000 > args.budget_ms:
+        print("FAIL: startup import over budget")
+        failed = True
+    if not failed:
+        print("OK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
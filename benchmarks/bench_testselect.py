@@ -0,0 +1,71 @@
+"""
+Benchmark the import graph behind run_affected_tests on a synthetic project.
+
+Measures a cold build, a reload from the on-disk cache, an incremental
+refresh after one edit, and selecting the tests for one changed module.
+
+    python -m benchmarks.bench_testselect --modules 5000
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from ollama_coder.testselect import ImportGraph
+
+
+def build_project(root: str, n_modules: int, imports_per_module: int = 3, seed: int = 0):
+    """A package of modules importing a few earlier ones, plus one test file per ten modules."""
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(root, "app"))
+    os.makedirs(os.path.join(root, "tests"))
+    open(os.path.join(root, "app", "__init__.py"), "w").close()
+    for i in range(n_modules):
+        deps = rng.sample(range(i), min(i, imports_per_module))
+        with open(os.path.join(root, "app", f"mod{i}.py"), "w") as f:
+            f.writelines(f"from app.mod{d} import f{d}\n" for d in deps)
+            f.write(f"\n\ndef f{i}():\n    return {i}\n")
+        if i % 10 == 0:
+            with open(os.path.join(root, "tests", f"test_mod{i}.py"), "w") as f:
+                f.write(f"from app.mod{i} import f{i}\n\n\ndef test_f{i}():\n    assert f{i}() == {i}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modules", type=int, default=5000)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="space-bench-tests-")
+    try:
+        build_project(root, args.modules)
+
+        started = time.perf_counter()
+        graph = ImportGraph(root)
+        parsed = graph.refresh()
+        graph.dependents()
+        print(f"cold build: {time.perf_counter() - started:.3f}s ({parsed} files parsed)")
+
+        started = time.perf_counter()
+        graph = ImportGraph(root)
+        parsed = graph.refresh()
+        print(f"cached reload: {time.perf_counter() - started:.3f}s ({parsed} files parsed)")
+
+        changed = f"app/mod{args.modules // 2}.py"
+        with open(os.path.join(root, changed), "a") as f:
+            f.write("# edited\n")
+        started = time.perf_counter()
+        parsed = graph.refresh()
+        print(f"refresh after one edit: {time.perf_counter() - started:.3f}s ({parsed} files parsed)")
+
+        started = time.perf_counter()
+        selection = graph.select([changed])
+        print(f"select for {changed}: {time.perf_counter() - started:.3f}s, "
+              f"{len(selection.tests)} of {selection.total_tests} test files")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark the workspace watcher on a large synthetic tree.
+
+Measures the initial manifest scan, the cost of resolving and publishing a
+batch of changes, and end-to-end latency from a write to the subscriber call.
+
+    python -m benchmarks.bench_watcher --files 100000
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+from ollama_coder.watcher import WorkspaceWatcher
+
+
+def build_tree(root: str, n_files: int, per_dir: int = 100):
+    for i in range(n_files):
+        directory = os.path.join(root, f"pkg{i // (per_dir * per_dir)}", f"mod{(i // per_dir) % per_dir}")
+        if i % per_dir == 0:
+            os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"file{i}.py"), "w") as f:
+            f.write(f"VALUE = {i}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--changes", type=int, default=1000, help="Files modified per batch")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--polling", action="store_true", help="Force the polling backend")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="space-bench-watch-")
+    try:
+        started = time.perf_counter()
+        build_tree(root, args.files)
+        print(f"built {args.files} files in {time.perf_counter() - started:.2f}s")
+
+        watcher = WorkspaceWatcher(root, use_inotify=not args.polling, batch_interval=0.05, poll_interval=0.5)
+        started = time.perf_counter()
+        watcher.start(wait=True)
+        print(f"backend: {watcher.backend.name}")
+        print(f"initial scan + watch setup: {time.perf_counter() - started:.2f}s "
+              f"({len(watcher.files())} files tracked)")
+
+        received = []
+        done = threading.Event()
+
+        def on_change(events):
+            received.extend(events)
+            if len(received) >= args.changes:
+                done.set()
+
+        watcher.subscribe(on_change)
+        paths = [os.path.join(root, p) for p in sorted(watcher.files())[:args.changes]]
+
+        latencies = []
+        flush_costs = []
+        for round_no in range(args.rounds):
+            received.clear()
+            done.clear()
+            started = time.perf_counter()
+            for path in paths:
+                with open(path, "a") as f:
+                    f.write(f"# round {round_no}\n")
+            if not done.wait(30):
+                print(f"round {round_no}: only {len(received)} events received")
+                continue
+            latencies.append(time.perf_counter() - started)
+
+        # Cost of resolving a batch (stat + hash + publish) without the backend in the loop
+        for round_no in range(args.rounds):
+            for path in paths:
+                watcher.notify(path)
+            started = time.perf_counter()
+            watcher._flush()
+            flush_costs.append(time.perf_counter() - started)
+
+        watcher.stop()
+        if latencies:
+            median = statistics.median(latencies)
+            print(f"write -> subscriber for {args.changes} files: median {median * 1000:.1f} ms "
+                  f"({median / args.changes * 1e6:.1f} us/event)")
+        median = statistics.median(flush_costs)
+        print(f"batch resolution of {args.changes} unchanged files: median {median * 1000:.1f} ms "
+              f"({median / args.changes * 1e6:.1f} us/event)")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
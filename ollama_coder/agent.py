@@ -1,32 +1,125 @@
 import json
-from typing import List, Dict, Any
-import ollama
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from typing import List, Dict, Any, Optional, Tuple
 from .llm import ChatModel
 from .tools import (
-    list_files, read_file, write_file, edit_file, run_command,
+    list_files, read_file, write_file, edit_file, run_command, read_command_log,
     search_file, grep_search, find_files,
     delete_file, create_directory, move_file, copy_file, append_to_file, get_file_info,
     git_status, git_diff, git_log, git_commit, git_add,
     install_package, list_installed_packages,
-    check_syntax, lint_file, format_file,
-    python_repl
+    check_syntax, lint_file, format_file, check_files,
+    python_repl, set_shell_session, bind_shell_session, READ_ONLY_TOOLS
 )
+from . import vcs
+from .shell import ShellSession
+from .verifier import BackgroundVerifier, WRITE_TOOLS
+from .watcher import get_watcher
+from .profiler import Profiler
+from .mentions import expand_mentions
+from .repomap import RepoMap, DEFAULT_TOKENS
+from .reads import ReadTracker
+from .subagents import delegate, _field
+from .bestof import best_of
+from .planner import PlanExecutor, PlanError, parse_plan
+from .results import ResultStats, ToolResult, serialize
+from .budget import BudgetGovernor, CHANGING_TOOLS
+from .testselect import ImportGraph, run_affected
+from .validation import ArgumentError, ValidationStats, compile_validators
+from .ui import render_tool_call, render_tool_result, render_plan_progress
 from .prompts import SYSTEM_PROMPT
 from rich.console import Console
 
 console = Console()
 
 class Agent:
-    def __init__(self, model_name: str = "qwen3:4b"):
+    # Seconds to wait for background verification before the next generation
+    VERIFY_WAIT = 5.0
+
+    def __init__(
+        self,
+        model_name: str = "qwen3:4b",
+        verify: bool = True,
+        verify_command: Optional[str] = None,
+        watch: bool = True,
+        options: Optional[Dict[str, Any]] = None,
+        response_cache=None,
+        map_tokens: int = DEFAULT_TOKENS,
+        subagent_model: Optional[str] = None,
+        best_of: int = 1,
+        hosts: Optional[List[str]] = None,
+        gate=None,
+        repo_map: Optional[RepoMap] = None,
+        output: Optional[Console] = None,
+        events=None,
+        budget: Optional[BudgetGovernor] = None,
+    ):
         self.model_name = model_name
-        self.llm = ChatModel(model=model_name)
+        # Model for delegate() sub-agents; a smaller one keeps exploration cheap
+        self.subagent_model = subagent_model
+        # Where turns are rendered; space serve gives each session its own
+        self.console = output or console
+        # EventWriter for --output jsonl; when set, turns emit typed events instead of rendering
+        self.events = events
+        if events is not None and output is None:
+            self.console = Console(file=open(os.devnull, "w"))
+        self.llm = ChatModel(model=model_name, options=options, cache=response_cache, gate=gate)
+        # Best-of-N: sample this many candidates per turn and keep the one whose edits verify
+        self.best_of = max(1, best_of)
+        self.hosts = hosts or []
+        self._host_models: List[ChatModel] = []
+        self.test_command = verify_command or os.environ.get("SPACE_VERIFY_CMD")
+        self.round_trips_saved = 0
+        # One long-lived bash per agent so cwd, env and virtualenvs persist
+        self.shell = ShellSession()
+        if gate is None:
+            # Standalone, this is the process default; under space serve (gate set) sessions share
+            # the process, so their shells are only bound per thread
+            set_shell_session(self.shell)
+        # Workspace watcher keeps caches fresh when files change outside our tools
+        self.watcher = None
+        self._unsubscribe = None
+        if watch:
+            self.watcher = get_watcher(os.getcwd())
+            self._unsubscribe = self.watcher.subscribe(lambda events: vcs.invalidate_cache())
+        # Edited .py files are checked in the background; results ride along with later messages
+        self.verifier = None
+        if verify:
+            self.verifier = BackgroundVerifier(test_command=self.test_command)
+        # Ranked file/symbol map appended to the system prompt so the model can skip blind exploration
+        self.repo_map = repo_map
+        if repo_map is None and map_tokens > 0:
+            self.repo_map = RepoMap(os.getcwd(), max_tokens=map_tokens, watcher=self.watcher)
+            threading.Thread(target=self.repo_map.render, name="space-repomap", daemon=True).start()
         self.messages: List[Dict[str, str]] = [{"role": "system", "content": SYSTEM_PROMPT}]
+        # Phase timers for --profile and /profile; no-ops until started
+        self.profiler = Profiler()
+        # Optional TraceRecorder capturing model chunks and tool I/O for offline replay
+        self.recorder = None
+        # Versions of files the model has already read, so re-reads can send a diff or a note
+        self.read_tracker = ReadTracker()
+        # Token totals of compact tool results against their verbose views
+        self.result_stats = ResultStats()
+        # Per-turn and per-session limits on tool rounds, time and tokens
+        self.budget = budget or BudgetGovernor()
+        # Set while a tool runs: shows a renderable under the tool's spinner (e.g. plan progress)
+        self.progress = None
+        # Workspace-relative files changed by tools this session, for run_affected_tests
+        self.changed_files = set()
+        self._import_graph: Optional[ImportGraph] = None
+        # Full arguments and results of recent tool calls, for /last
+        self.tool_history = deque(maxlen=20)
         self.tools = {
             "list_files": list_files,
             "read_file": read_file,
             "write_file": write_file,
             "edit_file": edit_file,
             "run_command": run_command,
+            "read_command_log": read_command_log,
             "search_file": search_file,
             "grep_search": grep_search,
             "find_files": find_files,
@@ -46,7 +139,11 @@ class Agent:
             "check_syntax": check_syntax,
             "lint_file": lint_file,
             "format_file": format_file,
+            "check_files": check_files,
             "python_repl": python_repl,
+            "delegate": self._delegate,
+            "execute_plan": self._execute_plan,
+            "run_affected_tests": self._run_affected_tests,
         }
         self.tool_definitions = [
             {
@@ -67,11 +164,12 @@ class Agent:
                 "type": "function",
                 "function": {
                     "name": "read_file",
-                    "description": "Read the content of a file",
+                    "description": "Read the content of a file. If you already read it this session, you get a diff against that version, or a note if it is unchanged.",
                     "parameters": {
                         "type": "object",
                         "properties": {
-                            "path": {"type": "string", "description": "The file path"}
+                            "path": {"type": "string", "description": "The file path"},
+                            "full": {"type": "boolean", "description": "Return the whole file even if you have seen it before"}
                         },
                         "required": ["path"]
                     }
@@ -112,17 +210,34 @@ class Agent:
                 "type": "function",
                 "function": {
                     "name": "run_command",
-                    "description": "Run a shell command using bash. Supports advanced features like 'source', pipes, and redirects.",
+                    "description": "Run a shell command in a persistent bash session. cwd, exported variables and activated virtualenvs carry over between calls. Supports 'source', pipes, and redirects.",
                     "parameters": {
                         "type": "object",
                         "properties": {
                             "command": {"type": "string", "description": "The bash command to run"},
-                            "cwd": {"type": "string", "description": "Optional working directory for the command"}
+                            "cwd": {"type": "string", "description": "Optional working directory for this command only"},
+                            "timeout": {"type": "integer", "description": "Seconds before the command is interrupted (default 60)"}
                         },
                         "required": ["command"]
                     }
                 }
             },
+            {
+                "type": "function",
+                "function": {
+                    "name": "read_command_log",
+                    "description": "Read lines from the full output log of an earlier run_command call. run_command reports a log_id when output was truncated or the command timed out.",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "log_id": {"type": "string", "description": "Log handle reported by run_command (e.g. 'cmd-3')"},
+                            "start_line": {"type": "integer", "description": "First line to return (1-based; negative counts from the end)"},
+                            "num_lines": {"type": "integer", "description": "Maximum number of lines to return (default 200)"}
+                        },
+                        "required": ["log_id"]
+                    }
+                }
+            },
             {
                 "type": "function",
                 "function": {
@@ -272,11 +387,13 @@ class Agent:
                 "type": "function",
                 "function": {
                     "name": "git_diff",
-                    "description": "Show git diff for uncommitted changes",
+                    "description": "Show git diff for uncommitted changes. Large diffs return a per-file summary; pass file_path, and hunk to page through one file's changes.",
                     "parameters": {
                         "type": "object",
                         "properties": {
-                            "file_path": {"type": "string", "description": "Optional file path to diff"}
+                            "file_path": {"type": "string", "description": "Optional file path to diff"},
+                            "staged": {"type": "boolean", "description": "Show staged changes instead of unstaged ones"},
+                            "hunk": {"type": "integer", "description": "1-based hunk number to show (requires file_path)"}
                         }
                     }
                 }
@@ -312,11 +429,11 @@ class Agent:
                 "type": "function",
                 "function": {
                     "name": "git_add",
-                    "description": "Stage a file for commit",
+                    "description": "Stage files for commit",
                     "parameters": {
                         "type": "object",
                         "properties": {
-                            "file_path": {"type": "string", "description": "File path to stage"}
+                            "file_path": {"type": "string", "description": "File path to stage (several paths may be separated by spaces)"}
                         },
                         "required": ["file_path"]
                     }
@@ -390,6 +507,93 @@ class Agent:
                     }
                 }
             },
+            {
+                "type": "function",
+                "function": {
+                    "name": "check_files",
+                    "description": "Check many Python files in one call: syntax check, ruff lint and optional ruff format over all of them. Returns one report grouped by file. Prefer this over calling check_syntax/lint_file/format_file per file.",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "paths": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "File paths, globs (e.g. 'src/**/*.py') or directories"
+                            },
+                            "lint": {"type": "boolean", "description": "Run ruff check (default true)"},
+                            "fix": {"type": "boolean", "description": "Let ruff fix lint issues where possible"},
+                            "format": {"type": "boolean", "description": "Run ruff format on the files"}
+                        },
+                        "required": ["paths"]
+                    }
+                }
+            },
+            {
+                "type": "function",
+                "function": {
+                    "name": "run_affected_tests",
+                    "description": "Run only the tests that can be affected by the files changed in this session (and uncommitted git changes), found through the Python import graph. Falls back to the full suite when a change can't be traced (config files, deleted modules). Prefer this over running the whole test suite with run_command.",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "files": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "Changed files to select tests for (default: changes from this session and git)"
+                            },
+                            "base": {"type": "string", "description": "Git ref to diff against for changed files (default HEAD)"},
+                            "shards": {"type": "integer", "description": "Parallel pytest processes to split the tests over (default 1)"},
+                            "timeout": {"type": "integer", "description": "Seconds each pytest process may run (default 300)"},
+                            "full": {"type": "boolean", "description": "Run the whole suite regardless of what changed"}
+                        }
+                    }
+                }
+            },
+            {
+                "type": "function",
+                "function": {
+                    "name": "delegate",
+                    "description": "Investigate broad questions about the codebase with parallel read-only sub-agents. Each task gets its own sub-agent that searches and reads files, and only its condensed findings come back. Use it for questions like 'how is config loaded?' instead of a long chain of find/grep/read calls.",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "tasks": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "Independent, self-contained questions, one per sub-agent (at most 4 run at once)"
+                            }
+                        },
+                        "required": ["tasks"]
+                    }
+                }
+            },
+            {
+                "type": "function",
+                "function": {
+                    "name": "execute_plan",
+                    "description": "Execute an approved multi-step plan as a task graph. Independent steps run in parallel, each handled by its own worker; steps that touch the same file run one after the other. Only use this after the user approved the plan.",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "steps": {
+                                "type": "array",
+                                "description": "The plan steps",
+                                "items": {
+                                    "type": "object",
+                                    "properties": {
+                                        "id": {"type": "string", "description": "Short unique step id, e.g. '1'"},
+                                        "description": {"type": "string", "description": "Self-contained instruction for this step"},
+                                        "files": {"type": "array", "items": {"type": "string"}, "description": "Files this step creates or changes"},
+                                        "depends_on": {"type": "array", "items": {"type": "string"}, "description": "Ids of steps that must finish first"}
+                                    },
+                                    "required": ["id", "description"]
+                                }
+                            }
+                        },
+                        "required": ["steps"]
+                    }
+                }
+            },
             {
                 "type": "function",
                 "function": {
@@ -405,49 +609,155 @@ class Agent:
                 }
             }
         ]
+        # Compiled once from the schemas above; arguments are checked and repaired before dispatch
+        self.validators = compile_validators(self.tool_definitions)
+        self.validation_stats = ValidationStats()
 
     def chat(self, user_input: str):
-        self.messages.append({"role": "user", "content": user_input})
+        # Tools called from this thread use this agent's shell, even with other agents in the process
+        bind_shell_session(self.shell)
+        self._refresh_system_prompt()
+
+        # Inline @path / @path:10-80 / @dir/ mentions so the model doesn't spend turns fetching them
+        watcher_ready = self.watcher is not None and self.watcher.ready.is_set()
+        content, mentions = expand_mentions(user_input, files=self.watcher.files if watcher_ready else None)
+        turn_started = time.perf_counter()
+        events = self.events
+        if events is not None:
+            events.emit("turn_start", message=user_input)
+        exhausted = self.budget.session_exhausted()
+        if exhausted is not None:
+            message = f"Session budget used up ({exhausted}); start a new session or raise --session-budget"
+            if events is None:
+                self.console.print(f"[yellow]{message}[/yellow]")
+            self._end_turn(turn_started, error=message)
+            return
+        self.budget.start_turn()
+        if mentions:
+            if events is not None:
+                events.emit("notice", text=f"Attached {', '.join(m.summary for m in mentions)}")
+            else:
+                self.console.print(f"[dim]Attached {', '.join(m.summary for m in mentions)}[/dim]")
+        self.messages.append({"role": "user", "content": content})
+        if self.recorder is not None:
+            self.recorder.user(user_input)
         
         from rich.live import Live
         from rich.spinner import Spinner
         from rich.panel import Panel
         from rich.markdown import Markdown
         from rich.console import Group
+        from rich.text import Text
         
+        profiler = self.profiler
+        # Set once a budget runs out: the next reply is the last and gets no tools
+        stopped = None
         while True:
             full_content = ""
             tool_calls = []
-            
-            # Streaming generation
-            with Live(Spinner("dots", text="Thinking...", style="cyan"), refresh_per_second=10, console=console) as live:
-                stream = self.llm.generate_stream(self.messages, tools=self.tool_definitions)
-                
-                for chunk in stream:
-                    if "error" in chunk:
-                        live.update(f"[red]Error:[/red] {chunk['error']}")
-                        return
+            tools = self.tool_definitions if stopped is None else None
+
+            # Let verification of the previous round's edits finish so the model sees it now
+            with profiler.phase("verify.wait"):
+                self._attach_verification(wait=self.VERIFY_WAIT)
+
+            if profiler.enabled:
+                # The client serializes the whole history on every request; measure what that costs
+                with profiler.phase("history.serialize"):
+                    json.dumps(self.messages, default=str)
+
+            if self.best_of > 1:
+                with profiler.phase("model.generate"), \
+                        self.console.status(f"[cyan]Sampling {self.best_of} candidates...[/cyan]", spinner="dots"):
+                    outcome = best_of(self._candidate_models(), self.messages, tools, self.best_of,
+                                      options=self.llm.options, test_command=self.test_command,
+                                      check_arguments=lambda name, arguments: self._check_arguments(
+                                          name, arguments, record=False))
+                self.budget.record_generation(outcome.prompt_tokens, outcome.tokens)
+                chosen = outcome.chosen
+                if chosen.error:
+                    self.console.print(f"[red]Error:[/red] {chosen.error}")
+                    self._end_turn(turn_started, error=chosen.error, stopped=stopped is not None)
+                    return
+                full_content = chosen.content
+                tool_calls = chosen.tool_calls
+                if self.recorder is not None:
+                    # Replays stream the chosen reply like any other round
+                    message = {"role": "assistant", "content": full_content}
+                    if tool_calls:
+                        message["tool_calls"] = tool_calls
+                    self.recorder.response({"message": message, "done": True}, chosen.seconds)
+                self.round_trips_saved += outcome.saved_round_trips
+                if events is not None:
+                    if full_content:
+                        events.emit("token", text=full_content)
+                    events.emit("notice", text=outcome.summary())
+                else:
+                    with profiler.phase("ui.render"):
+                        if full_content:
+                            self.console.print(Markdown(full_content))
+                        self.console.print(f"[dim]{outcome.summary()}[/dim]")
+            else:
+                # Streaming generation (includes ui.render time for the live markdown)
+                display = Live(Spinner("dots", text="Thinking...", style="cyan"), refresh_per_second=10,
+                               console=self.console) if events is None else nullcontext()
+                with profiler.phase("model.generate"), display as live:
+                    requested = time.perf_counter()
+                    stream = self.llm.generate_stream(self.messages, tools=tools)
+                    if self.recorder is not None:
+                        stream = self.recorder.wrap_stream(stream)
+                    first_chunk = True
+
+                    for chunk in stream:
+                        if first_chunk:
+                            profiler.record("model.first_chunk", time.perf_counter() - requested)
+                            if events is not None:
+                                events.emit("timing", phase="first_token",
+                                            seconds=round(time.perf_counter() - requested, 4))
+                            first_chunk = False
 
-                    if "message" in chunk:
-                        msg = chunk["message"]
+                        if "error" in chunk:
+                            if live is not None:
+                                live.update(f"[red]Error:[/red] {chunk['error']}")
+                            self._end_turn(turn_started, error=chunk["error"], stopped=stopped is not None)
+                            return
+
+                        if _field(chunk, "done"):
+                            self.budget.record_generation(_field(chunk, "prompt_eval_count"), _field(chunk, "eval_count"))
+
+                        if "message" in chunk:
+                            msg = chunk["message"]
                         
-                        # Handle content
-                        if "content" in msg and msg["content"]:
-                            full_content += msg["content"]
-                            live.update(Markdown(full_content))
+                            # Handle content
+                            if "content" in msg and msg["content"]:
+                                full_content += msg["content"]
+                                if events is not None:
+                                    events.emit("token", text=msg["content"])
+                                else:
+                                    with profiler.phase("ui.render"):
+                                        live.update(Markdown(full_content))
                         
-                        # Handle tool calls (Ollama usually sends them in the final chunk or distinct chunks)
-                        if "tool_calls" in msg and msg["tool_calls"]:
-                            tool_calls.extend(msg["tool_calls"])
+                            # Handle tool calls (Ollama usually sends them in the final chunk or distinct chunks)
+                            if "tool_calls" in msg and msg["tool_calls"]:
+                                tool_calls.extend(msg["tool_calls"])
+                if events is not None:
+                    events.emit("timing", phase="generate", seconds=round(time.perf_counter() - requested, 4))
+
+            if stopped is not None:
+                # The final reply after a budget ran out; any tool calls in it are not run
+                tool_calls = []
 
             # Append assistant message to history
             assistant_msg = {"role": "assistant", "content": full_content}
             if tool_calls:
                 assistant_msg["tool_calls"] = tool_calls
             self.messages.append(assistant_msg)
+            if events is not None:
+                events.emit("message", content=full_content, tool_calls=len(tool_calls))
 
             # If no tool calls, we are done
             if not tool_calls:
+                self._end_turn(turn_started, content=full_content, stopped=stopped is not None)
                 break
             
             # Execute tools
@@ -455,43 +765,63 @@ class Agent:
                 function_name = tool_call["function"]["name"]
                 arguments = tool_call["function"]["arguments"]
                 
-                # Fix common LLM hallucination where arguments are wrapped in an 'arguments' key
-                if isinstance(arguments, dict) and "arguments" in arguments and isinstance(arguments["arguments"], dict):
-                    # Unwrap the nested arguments
-                    if "code" in arguments["arguments"] and function_name == "python_repl":
-                         arguments = arguments["arguments"]
-                    # General case for other tools if needed, but be careful not to break valid args
-                    elif len(arguments) <= 2 and "function_name" in arguments: 
-                         # If it looks like {arguments: {...}, function_name: ...} pattern
-                         arguments = arguments["arguments"]
+                # Repair nesting, string-encoded JSON, wrong types and aliases; reject what can't be fixed
+                arguments, rejection = self._check_arguments(function_name, arguments)
+                if rejection is None:
+                    # Stop a model that keeps making the same call and getting the same answer
+                    rejection = self.budget.check_call(function_name, arguments)
 
-                
-                # Visual feedback for tool execution
-                console.print(Panel(
-                    Group(
-                        f"[bold blue]Tool:[/bold blue] {function_name}",
-                        f"[dim]Args:[/dim] {json.dumps(arguments, indent=2)}"
-                    ),
-                    title="Executing Tool",
-                    border_style="blue"
-                ))
-                
-                with console.status(f"[bold blue]Running {function_name}...[/bold blue]", spinner="bouncingBar"):
-                    if function_name in self.tools:
-                        try:
-                            result = self.tools[function_name](**arguments)
-                            content = str(result)
-                        except Exception as e:
-                            content = f"Error executing tool: {str(e)}"
-                    else:
-                        content = f"Error: Tool {function_name} not found"
+                # Visual feedback for tool execution (bounded preview; /last shows everything)
+                if events is not None:
+                    events.emit("tool_call", name=function_name, arguments=arguments)
+                else:
+                    with profiler.phase("ui.render"):
+                        self.console.print(render_tool_call(function_name, arguments))
+
+                running = f"[bold blue]Running {function_name}...[/bold blue]"
+                spinner = self.console.status(running, spinner="bouncingBar") if events is None else nullcontext()
+                with profiler.phase(f"tool.{function_name}"), spinner as status:
+                    if function_name == "run_command" and status is not None:
+                        # Tail command output live while it runs
+                        self.shell.listener = lambda tail: status.update(Group(
+                            running,
+                            Panel(Text(tail), title="Output (live)", border_style="dim")
+                        ))
+                    if status is not None:
+                        self.progress = lambda renderable: status.update(Group(running, renderable))
+                    try:
+                        if rejection is not None:
+                            result = ToolResult.failure(rejection)
+                        else:
+                            result = self._call_tool(function_name, arguments, message_index=len(self.messages))
+                    finally:
+                        self.shell.listener = None
+                        self.progress = None
+                # The one model-facing form of the result
+                content = serialize(result)
+                self.result_stats.record(function_name, arguments, result, content)
+                if rejection is None:
+                    self.budget.record_call(function_name, arguments, result.ok, content)
+                if self.recorder is not None:
+                    self.recorder.tool(function_name, arguments, content, result.seconds, ok=result.ok)
 
                 # Show tool output
-                console.print(Panel(
-                    str(content)[:500] + ("..." if len(str(content)) > 500 else ""),
-                    title=f"Output: {function_name}",
-                    border_style="green" if "Error" not in str(content) else "red"
-                ))
+                if events is not None:
+                    events.emit("tool_result", name=function_name, ok=result.ok, seconds=round(result.seconds, 4),
+                                summary=result.summary, truncated=result.truncated, content=content)
+                else:
+                    with profiler.phase("ui.render"):
+                        self.console.print(render_tool_result(function_name, result))
+                self.tool_history.append({"name": function_name, "arguments": arguments, "content": content})
+
+                if self.verifier is not None:
+                    path = arguments.get("path", "") if isinstance(arguments, dict) else ""
+                    if function_name in WRITE_TOOLS and str(path).endswith(".py") and result.ok:
+                        self.verifier.submit(path)
+                    feedback = self.verifier.collect()
+                    if feedback is not None:
+                        self._show_verification(feedback)
+                        content += "\n\n" + feedback.payload
 
                 self.messages.append({
                     "role": "tool",
@@ -499,6 +829,269 @@ class Agent:
                     "name": function_name
                 })
 
+            self.budget.record_round()
+            stopped = self.budget.exhausted()
+            if stopped is not None:
+                note = f"[budget] {stopped}. Tools are no longer available in this turn; answer now with what you have."
+                self._budget_notice(f"Budget: {stopped}, asking for a final answer")
+            else:
+                note = self.budget.wrap_up_notice()
+                if note is not None:
+                    self._budget_notice(note.replace("[budget] ", "Budget: ", 1))
+            if note is not None:
+                # Ride along with the last tool result, like verification feedback
+                self.messages[-1]["content"] += "\n\n" + note
+
+    def _check_arguments(self, function_name: str, arguments: Any,
+                         model: Optional[str] = None, record: bool = True) -> Tuple[Any, Optional[str]]:
+        """
+        Validate arguments against the tool's schema; returns (repaired arguments, rejection or None).
+
+        model is who made the call, for the stats (the agent's own model by default);
+        record=False leaves the stats alone, for calls that may never run.
+        """
+        model = model or self.model_name
+        validator = self.validators.get(function_name)
+        if validator is None:
+            # Unknown tools are reported by _call_tool
+            return arguments, None
+        try:
+            arguments, repairs = validator.validate(arguments)
+        except ArgumentError as e:
+            if record:
+                self.validation_stats.record(model, [], rejected=str(e))
+            return arguments, f"invalid arguments for {function_name}: {e}"
+        if record:
+            self.validation_stats.record(model, repairs)
+        return arguments, None
+
+    def _end_turn(self, turn_started: float, content: str = "", error: Optional[str] = None, stopped: bool = False):
+        seconds = time.perf_counter() - turn_started
+        self.budget.end_turn(stopped=stopped)
+        if self.recorder is not None:
+            self.recorder.turn_end(seconds)
+        if self.events is not None:
+            if error is not None:
+                self.events.emit("error", message=error)
+            self.events.emit("turn_end", content=content, seconds=round(seconds, 4), ok=error is None,
+                             stopped=stopped, usage=self.budget.turn.as_dict())
+            self.events.flush()
+
+    def _budget_notice(self, text: str):
+        if self.events is not None:
+            self.events.emit("notice", text=text)
+        else:
+            self.console.print(f"[yellow]{text}[/yellow]")
+
+    def close(self):
+        """Release what this agent owns; shared caches and the watcher stay up for other agents."""
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+        if self.verifier is not None:
+            self.verifier.shutdown()
+        self.shell.close()
+
+    def _candidate_models(self) -> List[ChatModel]:
+        """Models best-of candidates are spread over: one per --hosts entry, else the agent's own."""
+        if not self.hosts:
+            return [self.llm]
+        if not self._host_models or self._host_models[0].model != self.model_name:
+            # Kept across turns so each host's HTTP connection is reused
+            self._host_models = [
+                ChatModel(model=self.model_name, options=self.llm.options, host=h, gate=self.llm.gate) for h in self.hosts
+            ]
+        return self._host_models
+
+    def _delegate(self, tasks: List[str]) -> str:
+        model = self.subagent_model or self.model_name
+        options = getattr(self.llm, "options", None)
+        return delegate(lambda: ChatModel(model=model, options=options, gate=self.llm.gate), tasks,
+                        self._worker_tools(), self.tool_definitions,
+                        check_arguments=lambda name, arguments: self._check_arguments(name, arguments, model))
+
+    def _run_affected_tests(self, files: Optional[List[str]] = None, base: Optional[str] = None, shards: int = 1,
+                            timeout: int = 300, full: bool = False) -> ToolResult:
+        if self._import_graph is None:
+            self._import_graph = ImportGraph(os.getcwd(), watcher=self.watcher)
+        if files:
+            changed = {os.path.relpath(os.path.abspath(path)) for path in files}
+        else:
+            changed = set(self.changed_files)
+            try:
+                changed.update(vcs.changed_paths(base or "HEAD"))
+            except (vcs.GitError, OSError):
+                # Not a git repository (or no commits yet): session changes only
+                if base:
+                    raise
+        shards = max(1, min(shards, os.cpu_count() or 1))
+        return run_affected(self._import_graph, changed, shards=shards, timeout=timeout, full=full)
+
+    def _worker_tools(self) -> Dict[str, Any]:
+        """self.tools for sub-agent and plan worker threads, bound to this agent's shell."""
+        shell = self.shell
+
+        def bound(name, fn):
+            def call(**arguments):
+                bind_shell_session(shell)
+                if name == "read_file":
+                    # Workers don't track reads, so every read is already whole
+                    arguments.pop("full", None)
+                return fn(**arguments)
+
+            return call
+
+        return {name: bound(name, fn) for name, fn in self.tools.items()}
+
+    def _execute_plan(self, steps: List[Dict[str, Any]]) -> ToolResult:
+        try:
+            graph = parse_plan(steps)
+        except PlanError as e:
+            return ToolResult.failure(f"invalid plan: {e}")
+        model = self.model_name
+        options = getattr(self.llm, "options", None)
+
+        def show(executor):
+            if self.progress is not None:
+                self.progress(render_plan_progress(executor))
+
+        executor = PlanExecutor(graph, lambda: ChatModel(model=model, options=options, gate=self.llm.gate),
+                                self._worker_tools(), self.tool_definitions, on_update=show,
+                                check_arguments=lambda name, arguments: self._check_arguments(name, arguments, model))
+        report = executor.run()
+        self.console.print(render_plan_progress(executor))
+        if self.verifier is not None:
+            for path in sorted({f for step in graph for f in step.files if f.endswith(".py") and os.path.exists(f)}):
+                self.verifier.submit(path)
+        return ToolResult.success(report)
+
+    def _refresh_system_prompt(self):
+        """Put the current repository map in the system message (once per user turn)."""
+        if self.repo_map is None:
+            return
+        content = (
+            SYSTEM_PROMPT
+            + "\n\nREPOSITORY MAP (files with their key symbols, most referenced first; "
+            "use it to go straight to the relevant files instead of listing directories):\n"
+            + self.repo_map.render()
+        )
+        self.messages[0]["content"] = content
+
+    def _call_tool(
+        self, function_name: str, arguments: Dict[str, Any], message_index: Optional[int] = None
+    ) -> ToolResult:
+        """
+        Run one tool and return its typed result; exceptions become failures.
+
+        With message_index (where the result will sit in the conversation),
+        file reads are tracked and repeated reads answered with a diff or note.
+        """
+        full = False
+        if function_name == "read_file" and isinstance(arguments, dict) and "full" in arguments:
+            # Models sometimes send booleans as strings
+            full = arguments["full"] in (True, 1, "true", "True", "1")
+            arguments = {k: v for k, v in arguments.items() if k != "full"}
+        started = time.perf_counter()
+        try:
+            if function_name in self.tools:
+                try:
+                    result = ToolResult.wrap(self.tools[function_name](**arguments))
+                except Exception as e:
+                    result = ToolResult.failure(f"tool raised {type(e).__name__}: {e}")
+            else:
+                result = ToolResult.failure(f"no tool named {function_name}")
+        finally:
+            if function_name not in READ_ONLY_TOOLS:
+                vcs.invalidate_cache()
+        result.seconds = time.perf_counter() - started
+        if function_name in CHANGING_TOOLS and result.ok and isinstance(arguments, dict):
+            # A copy leaves its source as it was; a move removes it
+            keys = ("destination",) if function_name == "copy_file" else ("path", "source", "destination")
+            for key in keys:
+                if isinstance(arguments.get(key), str):
+                    self.changed_files.add(os.path.relpath(os.path.abspath(arguments[key])))
+                    if self.watcher is not None and not os.path.isdir(arguments[key]):
+                        # Subscribers such as the repository map hear of our own edits right away
+                        self.watcher.notify(arguments[key])
+        if function_name == "read_file" and message_index is not None and result.ok and not result.data.get("replayed"):
+            result.payload = self.read_tracker.filter(arguments.get("path", ""), result.payload, message_index, full=full)
+        return result
+
+    def run_tool(self, function_name: str, arguments: Dict[str, Any], add_to_context: bool = False) -> ToolResult:
+        """
+        Run a tool directly, without a model round trip (for slash commands).
+
+        Args:
+            function_name: Name of the tool in self.tools
+            arguments: Keyword arguments for the tool
+            add_to_context: Also record the call and its output in the conversation,
+                as if the model had made it, so the next reply can use it
+
+        Returns:
+            The tool's result
+        """
+        bind_shell_session(self.shell)
+        validator = self.validators.get(function_name)
+        if validator is not None:
+            try:
+                arguments, _ = validator.validate(arguments)
+            except ArgumentError as e:
+                return ToolResult.failure(f"invalid arguments for {function_name}: {e}")
+        # When shared, the tool result lands after the synthetic assistant message
+        result = self._call_tool(function_name, arguments, message_index=len(self.messages) + 1 if add_to_context else None)
+        content = serialize(result)
+        self.tool_history.append({"name": function_name, "arguments": arguments, "content": content})
+        if self.verifier is not None and function_name in WRITE_TOOLS:
+            path = str(arguments.get("path", ""))
+            if path.endswith(".py") and result.ok:
+                self.verifier.submit(path)
+        if add_to_context:
+            self.messages.append({
+                "role": "assistant",
+                "content": "",
+                "tool_calls": [{"function": {"name": function_name, "arguments": arguments}}],
+            })
+            self.result_stats.record(function_name, arguments, result, content)
+            self.messages.append({"role": "tool", "content": content, "name": function_name})
+        return result
+
+    def tool_parameters(self, function_name: str) -> Dict[str, Any]:
+        """JSON schema properties of a tool, required parameters first."""
+        for definition in self.tool_definitions:
+            function = definition["function"]
+            if function["name"] == function_name:
+                properties = function["parameters"]["properties"]
+                required = function["parameters"].get("required", [])
+                order = list(required) + [name for name in properties if name not in required]
+                return {name: properties[name] for name in order}
+        return {}
+
+    def _attach_verification(self, wait: float = 0):
+        """Add finished background verification reports to the conversation."""
+        if self.verifier is None:
+            return
+        feedback = self.verifier.collect(wait=wait)
+        if feedback is None:
+            return
+        self._show_verification(feedback)
+        if self.messages[-1]["role"] == "tool":
+            self.messages[-1]["content"] += "\n\n" + feedback.payload
+        else:
+            self.messages.append({"role": "system", "content": feedback.payload})
+
+    def _show_verification(self, feedback: ToolResult):
+        from rich.panel import Panel
+        from rich.text import Text
+
+        report = feedback.payload
+        if self.events is not None:
+            self.events.emit("verification", ok=feedback.ok, report=report)
+            return
+        self.console.print(Panel(
+            Text(report[:500] + ("..." if len(report) > 500 else "")),
+            title="Auto-verify",
+            border_style="green" if feedback.ok else "yellow"
+        ))
+
     def get_current_model(self) -> str:
         """Get the name of the currently active model."""
         return self.model_name
@@ -515,12 +1108,13 @@ class Agent:
         """
         try:
             # Test if the model exists by trying to use it
-            self.llm = ChatModel(model=model_name)
+            self.llm = ChatModel(model=model_name, options=self.llm.options, cache=self.llm.cache, host=self.llm.host,
+                                 gate=self.llm.gate)
             self.model_name = model_name
-            console.print(f"[bold green]✓ Switched to model: {model_name}[/bold green]")
+            self.console.print(f"[bold green]✓ Switched to model: {model_name}[/bold green]")
             return True
         except Exception as e:
-            console.print(f"[bold red]✗ Failed to switch model:[/bold red] {str(e)}")
+            self.console.print(f"[bold red]✗ Failed to switch model:[/bold red] {str(e)}")
             return False
     
     def list_available_models(self) -> List[Dict[str, Any]]:
@@ -531,6 +1125,8 @@ class Agent:
             List of model information dictionaries
         """
         try:
+            import ollama
+
             response = ollama.list()
             # Convert Model objects to dicts with proper field names
             models = []
@@ -542,7 +1138,7 @@ class Agent:
                 })
             return models
         except Exception as e:
-            console.print(f"[bold red]Error listing models:[/bold red] {str(e)}")
+            self.console.print(f"[bold red]Error listing models:[/bold red] {str(e)}")
             return []
 
 
@@ -0,0 +1,264 @@
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from .quality import verify_files
+from .subagents import _field
+from .watcher import IGNORED_DIRS
+
+# Tool calls whose effect on files can be replayed in a scratch copy
+CODE_WRITE_TOOLS = {"write_file", "edit_file", "append_to_file"}
+
+# Copied next to the edited files so ruff sees the project's configuration
+CONFIG_FILES = ("pyproject.toml", "ruff.toml", ".ruff.toml", "setup.cfg")
+
+# Temperature for extra candidates when the user's sampling is greedy
+CANDIDATE_TEMPERATURE = 0.7
+
+
+class Candidate:
+    """One sampled reply and how its proposed edits fared in a scratch copy."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.content = ""
+        self.tool_calls: List[Any] = []
+        self.error: Optional[str] = None
+        self.seconds = 0.0
+        self.prompt_tokens = 0
+        self.tokens = 0
+        self.edits: Dict[str, str] = {}  # relative path -> new content
+        self.problems: List[str] = []
+        self.syntax_errors = 0
+        self.lint_issues = 0
+        self.tests_passed: Optional[bool] = None
+
+    @property
+    def writes_code(self) -> bool:
+        return bool(self.edits) or any(
+            _field(_field(call, "function"), "name") in CODE_WRITE_TOOLS for call in self.tool_calls
+        )
+
+    @property
+    def passed(self) -> bool:
+        return not self.error and not self.problems and self.syntax_errors == 0 and self.tests_passed is not False
+
+    @property
+    def verdict(self) -> str:
+        if self.error or self.problems:
+            return self.error or "; ".join(self.problems)
+        if self.syntax_errors:
+            return f"{self.syntax_errors} syntax error(s)"
+        if self.tests_passed is False:
+            return "tests failed"
+        return f"ok, {self.lint_issues} lint" if self.lint_issues else "ok"
+
+    def rank(self) -> tuple:
+        return (not self.passed, bool(self.error or self.problems), self.syntax_errors,
+                self.tests_passed is False, self.lint_issues, self.index)
+
+
+class BestOfOutcome:
+    """The chosen candidate and what choosing saved."""
+
+    def __init__(self, chosen: Candidate, candidates: List[Candidate], seconds: float):
+        self.chosen = chosen
+        self.candidates = candidates
+        self.seconds = seconds
+        # A single-sample loop would have needed a feedback round per failing sample before the first passing one
+        self.saved_round_trips = 0
+        if chosen.passed and chosen.writes_code:
+            first_pass = min(c.index for c in candidates if c.writes_code and c.passed)
+            self.saved_round_trips = sum(1 for c in candidates[:first_pass] if not c.passed)
+        # Every candidate was paid for, not just the chosen one
+        self.prompt_tokens = sum(c.prompt_tokens for c in candidates)
+        self.tokens = sum(c.tokens for c in candidates)
+
+    def summary(self) -> str:
+        coding = [c for c in self.candidates if c.writes_code]
+        if not coding or not self.candidates[0].writes_code:
+            return f"best-of-{len(self.candidates)}: no code edits proposed, used candidate 1 ({self.seconds:.1f}s)"
+        verdicts = ", ".join(f"#{c.index + 1} {c.verdict}" for c in coding)
+        line = f"best-of-{len(self.candidates)}: chose #{self.chosen.index + 1} ({verdicts}) in {self.seconds:.1f}s"
+        if self.saved_round_trips:
+            line += f", saved ~{self.saved_round_trips} round trip(s) vs retrying one sample at a time"
+        elif not self.chosen.passed:
+            line += ", no candidate passed"
+        return line
+
+
+def _candidate_options(options: Optional[Dict], index: int) -> Optional[Dict]:
+    """Candidate 0 samples exactly like a normal turn; the rest get distinct seeds."""
+    if index == 0:
+        return options
+    options = dict(options or {})
+    options["seed"] = (options.get("seed") or 0) + index
+    if not options.get("temperature"):
+        options["temperature"] = CANDIDATE_TEMPERATURE
+    return options
+
+
+def _generate(model, messages, tools, options, index) -> Candidate:
+    candidate = Candidate(index)
+    started = time.perf_counter()
+    response = model.generate(messages, tools=tools, options=_candidate_options(options, index))
+    candidate.seconds = time.perf_counter() - started
+    if isinstance(response, dict) and "error" in response:
+        candidate.error = response["error"]
+        return candidate
+    candidate.prompt_tokens = _field(response, "prompt_eval_count") or 0
+    candidate.tokens = _field(response, "eval_count") or 0
+    message = _field(response, "message")
+    candidate.content = _field(message, "content") or ""
+    candidate.tool_calls = [
+        {"function": {"name": _field(_field(call, "function"), "name"),
+                      "arguments": _field(_field(call, "function"), "arguments") or {}}}
+        for call in _field(message, "tool_calls") or []
+    ]
+    return candidate
+
+
+def _propose_edits(candidate: Candidate, root: str, check_arguments: Optional[Callable] = None):
+    """
+    Work out the final content of every file the candidate writes, in memory.
+
+    check_arguments(name, arguments) -> (arguments, rejection or None) repairs each
+    write call the way the agent loop would; repaired arguments replace the
+    candidate's own so the chosen calls run as verified.
+    """
+    for call in candidate.tool_calls:
+        function = _field(call, "function")
+        name = _field(function, "name")
+        if name not in CODE_WRITE_TOOLS:
+            continue
+        arguments = _field(function, "arguments") or {}
+        if check_arguments is not None:
+            arguments, rejection = check_arguments(name, arguments)
+            if rejection:
+                candidate.problems.append(rejection)
+                continue
+            function["arguments"] = arguments
+        if not isinstance(arguments, dict):
+            candidate.problems.append(f"invalid arguments for {name}")
+            continue
+        path = arguments.get("path", "")
+        rel = os.path.relpath(os.path.join(root, path), root)
+        if rel.startswith(os.pardir):
+            candidate.problems.append(f"{path} is outside the workspace")
+            continue
+        if rel == os.curdir or os.path.isdir(os.path.join(root, rel)):
+            candidate.problems.append(f"{path or 'the workspace root'} is a directory")
+            continue
+        current = candidate.edits.get(rel)
+        if current is None and os.path.exists(os.path.join(root, rel)):
+            try:
+                with open(os.path.join(root, rel), encoding="utf-8", errors="replace") as f:
+                    current = f.read()
+            except OSError as e:
+                candidate.problems.append(f"cannot read {path}: {e.strerror or e}")
+                continue
+        if name == "write_file":
+            candidate.edits[rel] = arguments.get("content", "")
+        elif name == "append_to_file":
+            candidate.edits[rel] = (current or "") + arguments.get("content", "")
+        else:
+            old_text = arguments.get("old_text", "")
+            if current is None or not old_text or old_text not in current:
+                candidate.problems.append(f"edit does not apply to {path}")
+                continue
+            candidate.edits[rel] = current.replace(old_text, arguments.get("new_text", ""))
+
+
+def _link_or_copy(src: str, dst: str):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _verify(candidate: Candidate, root: str, test_command: Optional[str], test_timeout: int,
+            check_arguments: Optional[Callable] = None):
+    """Apply the candidate's edits in a scratch copy and run the quality checks there."""
+    _propose_edits(candidate, root, check_arguments)
+    if not candidate.edits or candidate.problems:
+        return
+    scratch = tempfile.mkdtemp(prefix="space-bestof-")
+    try:
+        if test_command:
+            # Tests need the whole tree; hard links keep the copy cheap
+            shutil.copytree(root, scratch, dirs_exist_ok=True, symlinks=True,
+                            ignore=shutil.ignore_patterns(*IGNORED_DIRS), copy_function=_link_or_copy)
+        else:
+            for name in CONFIG_FILES:
+                if os.path.exists(os.path.join(root, name)):
+                    shutil.copy2(os.path.join(root, name), os.path.join(scratch, name))
+        for rel, content in candidate.edits.items():
+            target = os.path.join(scratch, rel)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if os.path.exists(target):
+                # Never write through a hard link into the real workspace
+                os.unlink(target)
+            with open(target, "w", encoding="utf-8") as f:
+                f.write(content)
+
+        python_files = [os.path.join(scratch, rel) for rel in candidate.edits if rel.endswith(".py")]
+        if python_files:
+            report = verify_files(python_files, lint=True)
+            candidate.syntax_errors = len(report["syntax"])
+            candidate.lint_issues = sum(len(issues) for issues in report["lint"].values())
+        if test_command and not candidate.syntax_errors:
+            try:
+                result = subprocess.run(shlex.split(test_command), cwd=scratch, capture_output=True, timeout=test_timeout)
+                candidate.tests_passed = result.returncode == 0
+            except (subprocess.TimeoutExpired, OSError):
+                candidate.tests_passed = False
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def best_of(
+    models: List[Any],
+    messages: List[Dict],
+    tools: List[Dict],
+    n: int,
+    options: Optional[Dict] = None,
+    root: str = ".",
+    test_command: Optional[str] = None,
+    test_timeout: int = 120,
+    check_arguments: Optional[Callable] = None,
+) -> BestOfOutcome:
+    """
+    Sample n replies concurrently and pick the one whose edits verify best.
+
+    Args:
+        models: ChatModels to spread candidates over (e.g. one per Ollama host)
+        messages: Conversation so far
+        tools: Tool definitions
+        n: Number of candidates
+        options: The user's sampling options; candidate 0 uses them unchanged
+        root: Workspace the edits are relative to
+        test_command: Optional fast test command run in each candidate's scratch copy
+        check_arguments: Optional (name, arguments) -> (arguments, rejection) repairing write calls;
+            a candidate with a call it rejects fails verification
+    """
+    started = time.perf_counter()
+    root = os.path.abspath(root)
+    with ThreadPoolExecutor(max_workers=n, thread_name_prefix="space-bestof") as pool:
+        candidates = list(pool.map(
+            lambda i: _generate(models[i % len(models)], messages, tools, options, i), range(n)
+        ))
+        # Keep the model's usual behaviour on turns that don't write code
+        if candidates[0].writes_code:
+            list(pool.map(lambda c: _verify(c, root, test_command, test_timeout, check_arguments),
+                          [c for c in candidates if c.writes_code and not c.error]))
+
+    if candidates[0].writes_code:
+        chosen = min((c for c in candidates if c.writes_code and not c.error), key=Candidate.rank, default=candidates[0])
+    else:
+        chosen = candidates[0]
+    return BestOfOutcome(chosen, candidates, time.perf_counter() - started)
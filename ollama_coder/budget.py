@@ -0,0 +1,214 @@
+import hashlib
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Tool rounds per turn when no budget is given; a stuck model stops here instead of looping for hundreds
+DEFAULT_TURN_ITERATIONS = 25
+
+# The same call returning the same result this many times in a row is blocked until something changes
+MAX_REPEATS = 3
+
+# Share of a limit after which the model is told to wrap up
+WRAP_UP_AT = 0.8
+
+# Successful calls to these change the workspace, so earlier identical calls may now turn out differently
+CHANGING_TOOLS = {"write_file", "edit_file", "append_to_file", "delete_file", "move_file", "copy_file",
+                  "create_directory", "install_package"}
+
+LIMIT_NAMES = {
+    "iterations": "tool rounds",
+    "seconds": "seconds",
+    "tokens": "generated tokens",
+    "prompt_tokens": "prompt tokens",
+}
+
+
+class Limits:
+    """Caps for one scope (a turn or the whole session); 0 means no cap."""
+
+    def __init__(self, iterations: int = 0, seconds: float = 0, tokens: int = 0, prompt_tokens: int = 0):
+        self.iterations = iterations
+        self.seconds = seconds
+        self.tokens = tokens
+        self.prompt_tokens = prompt_tokens
+
+    @classmethod
+    def parse(cls, spec: Optional[str], **defaults) -> "Limits":
+        """
+        Parse "iterations=30,seconds=600,tokens=20000,prompt_tokens=500000".
+
+        Keys left out keep the given defaults. Raises ValueError on unknown keys
+        or values that are not non-negative numbers.
+        """
+        values = dict(defaults)
+        for part in (spec or "").split(","):
+            if not part.strip():
+                continue
+            key, sep, value = part.partition("=")
+            key = key.strip().replace("-", "_")
+            if not sep or key not in LIMIT_NAMES:
+                raise ValueError(f"expected key=value with key one of {', '.join(LIMIT_NAMES)}, got {part.strip()!r}")
+            number = float(value)
+            if number < 0:
+                raise ValueError(f"{key} must not be negative")
+            values[key] = number if key == "seconds" else int(number)
+        return cls(**values)
+
+    def items(self) -> List[Tuple[str, float]]:
+        return [(key, getattr(self, key)) for key in LIMIT_NAMES if getattr(self, key)]
+
+    def describe(self) -> str:
+        return ", ".join(f"{_format(value)} {LIMIT_NAMES[key]}" for key, value in self.items()) or "none"
+
+
+class Usage:
+    """What a turn or session has spent so far."""
+
+    def __init__(self):
+        self.iterations = 0
+        self.seconds = 0.0
+        self.tokens = 0
+        self.prompt_tokens = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {key: round(getattr(self, key), 2) if key == "seconds" else getattr(self, key) for key in LIMIT_NAMES}
+
+
+def _format(value: float) -> str:
+    if value >= 10000:
+        return f"{value / 1000:.0f}k"
+    return f"{value:.0f}"
+
+
+def _call_key(name: str, arguments: Any) -> str:
+    return name + ":" + json.dumps(arguments, sort_keys=True, default=str)
+
+
+class BudgetGovernor:
+    """
+    Enforces per-turn and per-session limits on the agent loop.
+
+    The agent calls start_turn() when a message arrives, record_generation()
+    after each model reply, record_round() after each round of tool calls and
+    end_turn() when the turn is over. exhausted() names the first limit that
+    is used up; the agent then asks for one final answer without tools.
+    wrap_up_notice() returns a one-time hint for the model once any limit is
+    WRAP_UP_AT used. Identical calls that keep returning identical results
+    are blocked by check_call() until a workspace-changing tool succeeds.
+    """
+
+    def __init__(self, turn: Optional[Limits] = None, session: Optional[Limits] = None,
+                 max_repeats: int = MAX_REPEATS, wrap_up_at: float = WRAP_UP_AT):
+        self.turn_limits = turn if turn is not None else Limits(iterations=DEFAULT_TURN_ITERATIONS)
+        self.session_limits = session or Limits()
+        self.max_repeats = max_repeats
+        self.wrap_up_at = wrap_up_at
+        self.turn = Usage()
+        self.session = Usage()
+        self.turns = 0
+        self.turns_stopped = 0
+        self.wrap_ups = 0
+        self.repeats_blocked = 0
+        self._turn_started: Optional[float] = None
+        self._warned = False
+        # call key -> (result digest, times in a row it came back the same)
+        self._results: Dict[str, Tuple[str, int]] = {}
+
+    def _current(self, scope: str, key: str) -> float:
+        usage = self.turn if scope == "turn" else self.session
+        value = getattr(usage, key)
+        if key == "seconds" and self._turn_started is not None:
+            elapsed = time.perf_counter() - self._turn_started
+            value = elapsed if scope == "turn" else value + elapsed
+        return value
+
+    def _scopes(self):
+        return (("turn", self.turn_limits), ("session", self.session_limits))
+
+    def start_turn(self):
+        self.turn = Usage()
+        self._turn_started = time.perf_counter()
+        self._warned = False
+        self._results.clear()
+
+    def end_turn(self, stopped: bool = False):
+        if self._turn_started is None:
+            return
+        self.turn.seconds = time.perf_counter() - self._turn_started
+        self.session.seconds += self.turn.seconds
+        self._turn_started = None
+        self.turns += 1
+        self.turns_stopped += stopped
+
+    def record_generation(self, prompt_tokens: Optional[int], tokens: Optional[int]):
+        for usage in (self.turn, self.session):
+            usage.prompt_tokens += prompt_tokens or 0
+            usage.tokens += tokens or 0
+
+    def record_round(self):
+        self.turn.iterations += 1
+        self.session.iterations += 1
+
+    def session_exhausted(self) -> Optional[str]:
+        """The session limit already used up before a turn starts, if any."""
+        for key, limit in self.session_limits.items():
+            if getattr(self.session, key) >= limit:
+                return f"session limit of {_format(limit)} {LIMIT_NAMES[key]} reached"
+        return None
+
+    def exhausted(self) -> Optional[str]:
+        """Describe the first used-up limit, or None while there is budget left."""
+        for scope, limits in self._scopes():
+            for key, limit in limits.items():
+                if self._current(scope, key) >= limit:
+                    return f"{scope} limit of {_format(limit)} {LIMIT_NAMES[key]} reached"
+        return None
+
+    def wrap_up_notice(self) -> Optional[str]:
+        """A hint to finish up, once per turn, when any limit is nearly used."""
+        if self._warned:
+            return None
+        for scope, limits in self._scopes():
+            for key, limit in limits.items():
+                used = self._current(scope, key)
+                threshold = limit * self.wrap_up_at
+                if key == "iterations":
+                    # With only a few rounds allowed, still leave one for acting on the notice
+                    threshold = min(threshold, limit - 1)
+                if threshold <= used < limit:
+                    self._warned = True
+                    self.wrap_ups += 1
+                    left = limit - used
+                    return (f"[budget] {_format(left)} of {_format(limit)} {LIMIT_NAMES[key]} left for this {scope}. "
+                            "Wrap up: finish the current step, stop exploring and give your answer.")
+        return None
+
+    def check_call(self, name: str, arguments: Any) -> Optional[str]:
+        """Return a rejection when this exact call keeps producing the same result."""
+        seen = self._results.get(_call_key(name, arguments))
+        if seen is not None and seen[1] >= self.max_repeats:
+            self.repeats_blocked += 1
+            return (f"{name} was already called {seen[1]} times with these arguments and returned the same result "
+                    "each time; change something before calling it again, or answer with what you have")
+        return None
+
+    def record_call(self, name: str, arguments: Any, ok: bool, content: str):
+        if ok and name in CHANGING_TOOLS:
+            # The workspace changed; earlier results may no longer hold
+            self._results.clear()
+        key = _call_key(name, arguments)
+        digest = hashlib.blake2b(content.encode("utf-8", "replace"), digest_size=16).hexdigest()
+        previous = self._results.get(key)
+        count = previous[1] + 1 if previous is not None and previous[0] == digest else 1
+        self._results[key] = (digest, count)
+
+    def summary(self) -> List[str]:
+        usage = self.session
+        lines = [f"{self.turns} turns, {usage.iterations} tool rounds, {usage.seconds:.0f}s, "
+                 f"~{usage.tokens} generated and ~{usage.prompt_tokens} prompt tokens"]
+        lines.append(f"limits per turn: {self.turn_limits.describe()}; per session: {self.session_limits.describe()}")
+        if self.turns_stopped or self.wrap_ups or self.repeats_blocked:
+            lines.append(f"{self.turns_stopped} turn(s) stopped at a limit, {self.wrap_ups} wrap-up notice(s), "
+                         f"{self.repeats_blocked} repeated call(s) blocked")
+        return lines
@@ -0,0 +1,82 @@
+import json
+import sys
+import threading
+import time
+from typing import Any, BinaryIO, Optional
+
+# Buffered events are written at least this often, so a driving program sees tokens promptly
+FLUSH_INTERVAL = 0.02
+# ... or as soon as this many bytes are waiting
+MAX_BUFFER = 64 * 1024
+
+
+class EventWriter:
+    """
+    Writes typed agent events as JSON lines, batching writes.
+
+    Every event is one JSON object with "type" and "t" (seconds since the
+    writer was created). Events are buffered and written in one syscall per
+    batch: when FLUSH_INTERVAL passes, when MAX_BUFFER bytes are waiting,
+    or when flush() is called (the agent flushes at the end of each turn).
+
+    Types: ready, turn_start, token, timing, tool_call, tool_result,
+    verification, notice, message, error, turn_end.
+    """
+
+    def __init__(self, stream: Optional[BinaryIO] = None, flush_interval: float = FLUSH_INTERVAL,
+                 max_buffer: int = MAX_BUFFER):
+        self.stream = stream or sys.stdout.buffer
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.started = time.perf_counter()
+        self.events = 0
+        self.writes = 0
+        self._buffer = []
+        self._size = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._flusher = threading.Thread(target=self._run, name="space-events", daemon=True)
+        self._flusher.start()
+
+    def emit(self, type: str, **fields: Any):
+        event = {"type": type, "t": round(time.perf_counter() - self.started, 4)}
+        event.update(fields)
+        line = (json.dumps(event, ensure_ascii=False, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+        with self._lock:
+            self._buffer.append(line)
+            self._size += len(line)
+            self.events += 1
+            full = self._size >= self.max_buffer
+        if full:
+            self.flush()
+        else:
+            self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            if not self._buffer:
+                return
+            data = b"".join(self._buffer)
+            self._buffer = []
+            self._size = 0
+            try:
+                self.stream.write(data)
+                self.stream.flush()
+            except (OSError, ValueError):
+                # The reader went away; drop events instead of failing the turn
+                pass
+            self.writes += 1
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait()
+            self._wake.clear()
+            # Let a burst of token events collect before writing
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self.flush()
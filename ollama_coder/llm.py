@@ -1,20 +1,83 @@
-import ollama
-from typing import List, Dict, Any, Generator
+from contextlib import nullcontext
+from typing import List, Dict, Any, Callable, Generator, Optional
+
+from .response_cache import is_deterministic
+
+# ollama (and its httpx/pydantic stack) is imported on first use to keep CLI startup fast
+
 
 class ChatModel:
-    def __init__(self, model: str = "llama3"):
+    def __init__(
+        self,
+        model: str = "llama3",
+        options: Optional[Dict[str, Any]] = None,
+        cache=None,
+        host: Optional[str] = None,
+        gate: Optional[Callable[[], Any]] = None,
+    ):
         self.model = model
+        # Ollama server to use; None means the default (OLLAMA_HOST or localhost)
+        self.host = host
+        self._host_client = None
+        # Sampling options passed to Ollama (temperature, seed, ...)
+        self.options = options
+        # Optional ResponseCache; only consulted when sampling is deterministic
+        self.cache = cache
+        # Returns a context manager held for each Ollama request (space serve's fair scheduler)
+        self.gate = gate or nullcontext
+
+    def _client(self):
+        import ollama
+
+        if self.host is None:
+            return ollama
+        if self._host_client is None:
+            # One client per model object so its connection pool is reused
+            self._host_client = ollama.Client(host=self.host)
+        return self._host_client
 
-    def generate(self, messages: List[Dict[str, str]], tools: List[Dict[str, Any]] = None) -> Any:
+    def probe(self) -> Optional[str]:
+        """
+        Check that Ollama is reachable and has this model.
+
+        Returns:
+            None if the model is available, otherwise a short problem description.
+        """
+        try:
+            names = {m.model for m in self._client().list().models}
+        except Exception as e:
+            return f"Cannot reach Ollama: {e}"
+        if self.model not in names and f"{self.model}:latest" not in names:
+            return f"Model '{self.model}' is not pulled (run: ollama pull {self.model})"
+        return None
+
+    def warm_up(self):
+        """Ask Ollama to load the model into memory so the first reply starts sooner."""
+        try:
+            self._client().generate(model=self.model, prompt="")
+        except Exception:
+            pass
+
+    def generate(
+        self,
+        messages: List[Dict[str, str]],
+        tools: List[Dict[str, Any]] = None,
+        options: Optional[Dict[str, Any]] = None,
+    ) -> Any:
         """
         Generate a response from the model.
+
+        Args:
+            options: Sampling options for this call instead of self.options
         """
         try:
-            response = ollama.chat(
-                model=self.model,
-                messages=messages,
-                tools=tools,
-            )
+            with self.gate():
+                response = self._client().chat(
+                    model=self.model,
+                    messages=messages,
+                    tools=tools,
+                    options=options if options is not None else self.options,
+                )
             return response
         except Exception as e:
             return {"error": str(e)}
@@ -22,15 +85,36 @@ class ChatModel:
     def generate_stream(self, messages: List[Dict[str, str]], tools: List[Dict[str, Any]] = None) -> Generator:
         """
         Generate a streaming response from the model.
+
+        With a response cache and deterministic sampling, a repeated request is
+        answered by replaying the cached chunks instead of calling Ollama.
         """
+        key = None
+        if self.cache is not None and is_deterministic(self.options):
+            key = self.cache.key(self.model, self.options, tools, messages)
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield from cached
+                return
+
+        chunks = []
         try:
-            stream = ollama.chat(
-                model=self.model,
-                messages=messages,
-                tools=tools,
-                stream=True,
-            )
-            for chunk in stream:
-                yield chunk
+            with self.gate():
+                stream = self._client().chat(
+                    model=self.model,
+                    messages=messages,
+                    tools=tools,
+                    stream=True,
+                    options=self.options,
+                )
+                for chunk in stream:
+                    if key is not None:
+                        chunks.append(chunk.model_dump(exclude_none=True) if hasattr(chunk, "model_dump") else dict(chunk))
+                    yield chunk
         except Exception as e:
             yield {"error": str(e)}
+            return
+
+        # Only complete responses are worth replaying
+        if key is not None and chunks and chunks[-1].get("done"):
+            self.cache.put(key, chunks)
@@ -1,7 +1,9 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import typer
 from rich.console import Console
-from .agent import Agent
-from .ui import print_banner, startup_animation
 
 app = typer.Typer()
 console = Console()
@@ -14,17 +16,237 @@ def callback():
     """
 
 
+def _create_agent(model: str, verify: bool, verify_cmd: str, options=None, cache: bool = False, map_tokens: int = 1024,
+                  subagent_model: str = None, best_of: int = 1, hosts=None, events=None, budget=None):
+    from .agent import Agent
+
+    response_cache = None
+    if cache:
+        from .response_cache import ResponseCache
+
+        response_cache = ResponseCache()
+    return Agent(model_name=model, verify=verify, verify_command=verify_cmd, options=options,
+                 response_cache=response_cache, map_tokens=map_tokens, subagent_model=subagent_model,
+                 best_of=best_of, hosts=hosts, events=events, budget=budget)
+
+
+def _parse_budget(turn: str, session: str):
+    """Turn and session Limits from --budget / --session-budget specs."""
+    from .budget import DEFAULT_TURN_ITERATIONS, Limits
+
+    try:
+        return Limits.parse(turn, iterations=DEFAULT_TURN_ITERATIONS), Limits.parse(session)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+
+
+def _probe_model(model: str):
+    """Check Ollama and start loading the model; returns a warning message or None."""
+    from .llm import ChatModel
+
+    llm = ChatModel(model=model)
+    problem = llm.probe()
+    if problem is None:
+        # Loading can take a while; don't hold up the prompt for it
+        threading.Thread(target=llm.warm_up, daemon=True).start()
+    return problem
+
+
+def _wait_for_workspace(agent, timeout: float = 2.0):
+    """Give the workspace watcher a moment to finish its initial scan."""
+    if agent.watcher is not None:
+        agent.watcher.ready.wait(timeout)
+
+
+# Slash commands that call a tool directly; a trailing "!" also shares the output with the model
+DIRECT_TOOL_COMMANDS = {"/tool", "/read", "/grep", "/diff", "/run"}
+
+
+def _parse_tool_args(agent, name: str, text: str) -> dict:
+    """
+    Parse "/tool" arguments: a JSON object, or shell-style words where
+    key=value sets a parameter and bare words fill parameters in order.
+    """
+    import json
+    import shlex
+
+    text = text.strip()
+    if text.startswith("{"):
+        return json.loads(text)
+
+    parameters = agent.tool_parameters(name)
+    arguments = {}
+    positional = iter(parameters)
+    for word in shlex.split(text):
+        key, sep, value = word.partition("=")
+        if not (sep and key in parameters):
+            key = next((p for p in positional if p not in arguments), None)
+            if key is None:
+                raise ValueError(f"too many arguments for {name} (parameters: {', '.join(parameters)})")
+            value = word
+        kind = parameters[key].get("type")
+        if kind == "integer":
+            value = int(value)
+        elif kind == "boolean":
+            value = value.lower() in ("1", "true", "yes", "on")
+        elif kind == "array":
+            value = [item for item in value.split(",") if item]
+        arguments[key] = value
+    return arguments
+
+
+def _direct_tool(agent, command: str, text: str):
+    """Handle /tool and its shorthands without a model round trip."""
+    import shlex
+
+    from .ui import render_tool_result
+
+    share = command.endswith("!")
+    command = command.rstrip("!")
+    try:
+        if command == "/tool":
+            name, _, text = text.strip().partition(" ")
+            if name not in agent.tools:
+                console.print(f"[yellow]Usage: /tool <name> <args>. Tools: {', '.join(sorted(agent.tools))}[/yellow]")
+                return
+            arguments = _parse_tool_args(agent, name, text)
+        elif command == "/read":
+            name, arguments = "read_file", {"path": text.strip()}
+        elif command == "/run":
+            name, arguments = "run_command", {"command": text.strip()}
+        elif command == "/diff":
+            words = shlex.split(text)
+            name = "git_diff"
+            arguments = {"staged": "--staged" in words}
+            paths = [w for w in words if w != "--staged"]
+            if paths:
+                arguments["file_path"] = paths[0]
+        else:  # /grep <pattern> [directory] [file_pattern]
+            words = shlex.split(text)
+            name = "grep_search"
+            arguments = {"pattern": words[0], "directory": words[1] if len(words) > 1 else "."}
+            if len(words) > 2:
+                arguments["file_pattern"] = words[2]
+    except (ValueError, IndexError) as e:
+        console.print(f"[yellow]Could not parse arguments: {e or 'missing argument'}[/yellow]")
+        return
+
+    if name in ("read_file", "run_command") and not next(iter(arguments.values())):
+        console.print(f"[yellow]Usage: {command} <{'path' if name == 'read_file' else 'command'}>[/yellow]")
+        return
+
+    with console.status(f"[bold blue]Running {name}...[/bold blue]", spinner="bouncingBar"):
+        result = agent.run_tool(name, arguments, add_to_context=share)
+    console.print(render_tool_result(name, result))
+    if share:
+        console.print("[dim]Output added to the conversation[/dim]")
+
+
+def _stop_profile(agent):
+    """Stop profiling, print the hottest phases and where the report went."""
+    from rich.table import Table
+
+    summary = agent.profiler.summary()
+    path = agent.profiler.stop(agent.messages)
+    if path is None:
+        console.print("[yellow]Profiling is not running. Use /profile start [cpu] [mem][/yellow]")
+        return
+
+    table = Table(title="Hot phases", show_header=True, header_style="bold magenta")
+    table.add_column("Phase", style="cyan")
+    table.add_column("Calls", justify="right")
+    table.add_column("Total", justify="right", style="green")
+    table.add_column("Mean", justify="right")
+    table.add_column("Max", justify="right", style="yellow")
+    for name, count, total, mean, peak in summary:
+        table.add_row(name, str(count), f"{total:.2f}s", f"{mean * 1000:.0f}ms", f"{peak * 1000:.0f}ms")
+    console.print(table)
+    console.print(f"[dim]Full profile report: {path}[/dim]")
+
+
 @app.command()
-def start(model: str = "qwen3:4b"):
+def start(
+    model: str = "qwen3:4b",
+    verify: bool = typer.Option(True, help="Verify edited Python files in the background"),
+    verify_cmd: str = typer.Option(None, help="Fast test command to run after edits (or set SPACE_VERIFY_CMD)"),
+    no_banner: bool = typer.Option(False, "--no-banner", help="Skip the banner and startup animation (or set SPACE_FAST=1)"),
+    profile: bool = typer.Option(False, "--profile", help="Time agent loop phases and write a report on exit"),
+    profile_detail: bool = typer.Option(False, "--profile-detail", help="With --profile, also capture cProfile and tracemalloc (slower)"),
+    record: str = typer.Option(None, "--record", help="Record model chunks and tool I/O to a trace file (.jsonl or .jsonl.gz)"),
+    temperature: float = typer.Option(None, help="Sampling temperature (0 for deterministic output)"),
+    seed: int = typer.Option(None, help="Sampling seed for reproducible output"),
+    cache: bool = typer.Option(False, "--cache", help="Reuse cached responses for identical requests (needs --temperature 0 or --seed)"),
+    map_tokens: int = typer.Option(1024, help="Token budget for the repository map in the system prompt (0 disables it)"),
+    subagent_model: str = typer.Option(None, help="Model for read-only delegate sub-agents (default: the main model)"),
+    best_of: int = typer.Option(1, "--best-of", help="Sample N candidates per turn and keep the one whose edits verify"),
+    hosts: str = typer.Option(None, help="Comma-separated Ollama hosts to spread --best-of candidates over"),
+    server: str = typer.Option(None, envvar="SPACE_SERVER", help="Attach to a running `space serve` (unix:PATH or host:port)"),
+    output: str = typer.Option("text", help="text for the interactive UI, jsonl for a typed event stream on stdout"),
+    budget: str = typer.Option(None, help="Per-turn limits, e.g. iterations=25,seconds=600,tokens=8000,prompt_tokens=200000"),
+    session_budget: str = typer.Option(None, help="Limits for the whole session, same keys as --budget"),
+):
     """
     Start the Space assistant.
     """
-    print_banner()
-    startup_animation()
+    global console
+    if output not in ("text", "jsonl"):
+        raise typer.BadParameter("--output must be text or jsonl")
+    events = None
+    if output == "jsonl":
+        from .events import EventWriter
+
+        # stdout carries only events; warnings and exit summaries go to stderr
+        events = EventWriter()
+        console = Console(stderr=True)
+    fast = no_banner or output == "jsonl" or os.environ.get("SPACE_FAST") == "1"
+    turn_limits, session_limits = _parse_budget(budget, session_budget)
+    options = {k: v for k, v in {"temperature": temperature, "seed": seed}.items() if v is not None} or None
+    if server:
+        _attach(server, model, options, best_of, subagent_model)
+        return
+    if cache and temperature != 0 and seed is None:
+        console.print("[yellow]Warning:[/yellow] --cache only applies with --temperature 0 or --seed")
+
+    # Start the real startup work right away; the animation only waits on it
+    pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="space-startup")
+    host_list = [h.strip() for h in hosts.split(",") if h.strip()] if hosts else None
+    from .budget import BudgetGovernor
+
+    agent_future = pool.submit(_create_agent, model, verify, verify_cmd, options, cache, map_tokens, subagent_model,
+                               best_of, host_list, events, BudgetGovernor(turn_limits, session_limits))
+    probe_future = pool.submit(_probe_model, model)
+
+    if not fast:
+        from .ui import print_banner, startup_animation
+
+        print_banner()
+        startup_animation([
+            agent_future.result,
+            lambda: _wait_for_workspace(agent_future.result()),
+            probe_future.result,
+            None,
+        ])
+
+    agent = agent_future.result()
+    if probe_future.done() and probe_future.result():
+        console.print(f"[yellow]Warning:[/yellow] {probe_future.result()}")
+    pool.shutdown(wait=False)
+
+    if profile:
+        agent.profiler.start(cpu=profile_detail, memory=profile_detail)
+    if record:
+        from .trace import TraceRecorder
+
+        agent.recorder = TraceRecorder(record, model=model)
+
+    if events is not None:
+        _run_jsonl(agent, events)
+        _finish_session(agent)
+        events.close()
+        return
 
     console.print(f"[bold green]Starting Space with model: {model}[/bold green]")
     console.print("[dim]Type /help for available commands[/dim]\n")
-    agent = Agent(model_name=model)
 
     from prompt_toolkit import PromptSession
     from prompt_toolkit.history import InMemoryHistory
@@ -104,6 +326,37 @@ def start(model: str = "qwen3:4b"):
                     console.print(f"[bold cyan]Current model:[/bold cyan] {current}")
                     continue
 
+                elif command == "/last":
+                    # Full arguments and output of a recent tool call, in a pager
+                    from .ui import render_tool_detail
+
+                    arg = command_parts[1].strip() if len(command_parts) > 1 else "1"
+                    if not arg.isdigit() or not 1 <= int(arg) <= len(agent.tool_history):
+                        console.print(f"[yellow]Usage: /last [n] (1-{len(agent.tool_history)} recent tool calls)[/yellow]")
+                    else:
+                        with console.pager(styles=True):
+                            console.print(render_tool_detail(agent.tool_history[-int(arg)]))
+                    continue
+
+                elif command == "/profile":
+                    # Phase timers, optionally with cProfile ("cpu") and tracemalloc ("mem")
+                    args = command_parts[1].split() if len(command_parts) > 1 else []
+                    if args[:1] == ["start"]:
+                        if agent.profiler.enabled:
+                            console.print("[yellow]Profiling is already running[/yellow]")
+                        else:
+                            agent.profiler.start(cpu="cpu" in args, memory="mem" in args)
+                            console.print("[bold green]✓ Profiling started[/bold green]")
+                    elif args[:1] == ["stop"]:
+                        _stop_profile(agent)
+                    else:
+                        console.print("[yellow]Usage: /profile start [cpu] [mem] | /profile stop[/yellow]")
+                    continue
+
+                elif command.rstrip("!") in DIRECT_TOOL_COMMANDS:
+                    _direct_tool(agent, command, command_parts[1] if len(command_parts) > 1 else "")
+                    continue
+
                 elif command == "/help":
                     # Show help for special commands
                     from rich.panel import Panel
@@ -112,6 +365,14 @@ def start(model: str = "qwen3:4b"):
                                     [cyan]/models[/cyan]          - List all available Ollama models
                                     [cyan]/model <name>[/cyan]   - Switch to a different model
                                     [cyan]/current[/cyan]        - Show the currently active model
+                                    [cyan]/last [n][/cyan]       - Show full arguments and output of the nth most recent tool call
+                                    [cyan]/tool <name> <args>[/cyan] - Run a tool directly (args: JSON or key=value/positional)
+                                    [cyan]/read <path>[/cyan]    - Read a file without asking the model
+                                    [cyan]/grep <pattern> [dir] [glob][/cyan] - Search files directly
+                                    [cyan]/diff [file] [--staged][/cyan] - Show git changes directly
+                                    [cyan]/run <command>[/cyan]  - Run a shell command directly
+                                    [dim]Add ! (e.g. /read! main.py) to share the output with the model[/dim]
+                                    [cyan]/profile start|stop[/cyan] - Time agent phases (add cpu/mem for cProfile/tracemalloc)
                                     [cyan]/help[/cyan]           - Show this help message
                                     [cyan]exit, quit[/cyan]      - Exit the application"""
                     console.print(Panel(help_text, title="Help", border_style="blue"))
@@ -125,6 +386,191 @@ def start(model: str = "qwen3:4b"):
         except Exception as e:
             console.print(f"[red]Error:[/red] {e}")
 
+    _finish_session(agent)
+
+
+def _finish_session(agent):
+    if agent.profiler.enabled:
+        _stop_profile(agent)
+    if agent.llm.cache is not None:
+        console.print(f"[dim]Response cache: {agent.llm.cache.hits} hits, {agent.llm.cache.misses} misses[/dim]")
+    for line in agent.validation_stats.summary():
+        console.print(f"[dim]Tool arguments, {line}[/dim]")
+    if agent.result_stats.calls:
+        console.print(f"[dim]Tool results: {agent.result_stats.summary()}[/dim]")
+    if agent.budget.turns:
+        for line in agent.budget.summary():
+            console.print(f"[dim]Budget: {line}[/dim]")
+    if agent.best_of > 1:
+        console.print(f"[dim]Best-of-{agent.best_of}: saved ~{agent.round_trips_saved} round trip(s)[/dim]")
+    if agent.recorder is not None:
+        agent.recorder.close()
+        console.print(f"[dim]Trace written to {agent.recorder.path}[/dim]")
+
+
+def _run_jsonl(agent, events):
+    """Read one message per stdin line (plain text or {"message": ...}) until EOF."""
+    import json
+    import sys
+
+    events.emit("ready", model=agent.model_name, cwd=os.getcwd())
+    events.flush()
+    for line in sys.stdin:
+        message = line.strip()
+        if not message:
+            continue
+        if message.startswith("{"):
+            try:
+                message = json.loads(message).get("message", "")
+            except (ValueError, AttributeError):
+                pass
+        if not isinstance(message, str) or not message.strip():
+            # Still answer the line, so a driver waiting for turn_end doesn't hang
+            events.emit("error", message='expected a non-empty "message" string')
+            events.emit("turn_end", content="", seconds=0.0, ok=False)
+            events.flush()
+            continue
+        if message in ("exit", "quit"):
+            break
+        try:
+            agent.chat(message)
+        except Exception as e:
+            events.emit("error", message=str(e))
+            events.emit("turn_end", content="", seconds=0.0, ok=False)
+            events.flush()
+
+
+def _attach(address: str, model: str, options, best_of: int, subagent_model: str):
+    """Thin client: each message is run by the daemon, which streams back the rendered turn."""
+    import sys
+
+    from prompt_toolkit import PromptSession
+    from prompt_toolkit.history import InMemoryHistory
+    from prompt_toolkit.styles import Style
+
+    from .server import ServerClient, ServerError
+
+    client = ServerClient(address)
+    try:
+        session_id = client.create_session(model=model, options=options, best_of=best_of,
+                                           subagent_model=subagent_model)
+    except ServerError as e:
+        console.print(f"[red]Error:[/red] {e}")
+        raise typer.Exit(1)
+    console.print(f"[bold green]Attached to {address} (session {session_id}, model: {model})[/bold green]")
+    console.print("[dim]/new starts a fresh session, /model <name> switches model, /stats shows the server[/dim]\n")
+
+    prompt = PromptSession(history=InMemoryHistory())
+    style = Style.from_dict({"prompt": "bold yellow"})
+    try:
+        while True:
+            try:
+                user_input = prompt.prompt([("class:prompt", "You: ")], style=style)
+                command = user_input.strip().split(maxsplit=1)
+                if user_input.lower() in ["exit", "quit"]:
+                    break
+                if not command:
+                    continue
+                if command[0] == "/new":
+                    client.close_session(session_id)
+                    session_id = client.create_session(model=model, options=options, best_of=best_of,
+                                                       subagent_model=subagent_model)
+                    console.print(f"[dim]New session {session_id}[/dim]")
+                elif command[0] == "/model" and len(command) > 1:
+                    model = client.switch_model(session_id, command[1].strip())["model"]
+                    console.print(f"[bold green]✓ Switched to model: {model}[/bold green]")
+                elif command[0] == "/stats":
+                    console.print_json(data=client.stats())
+                elif command[0].startswith("/"):
+                    console.print("[yellow]Attached sessions support /new, /model, /stats and exit[/yellow]")
+                else:
+                    for data in client.chat(session_id, user_input, width=console.width,
+                                            color_system=console.color_system):
+                        sys.stdout.buffer.write(data)
+                        sys.stdout.flush()
+            except ServerError as e:
+                console.print(f"[red]Error:[/red] {e}")
+    except KeyboardInterrupt:
+        console.print("\n[bold red]Exiting...[/bold red]")
+    finally:
+        try:
+            client.close_session(session_id)
+        except ServerError:
+            pass
+
+
+@app.command()
+def serve(
+    socket: str = typer.Option(None, help="Unix socket to listen on (default .space/serve.sock)"),
+    port: int = typer.Option(None, help="Listen on this TCP port instead of a Unix socket"),
+    bind: str = typer.Option("127.0.0.1", help="Address to bind with --port"),
+    allow_remote: bool = typer.Option(False, "--allow-remote",
+                                      help="Allow --bind to a non-loopback address (clients still need the token)"),
+    model: str = typer.Option("qwen3:4b", help="Default model for new sessions"),
+    verify: bool = typer.Option(True, help="Verify edited Python files in the background"),
+    verify_cmd: str = typer.Option(None, help="Fast test command to run after edits (or set SPACE_VERIFY_CMD)"),
+    map_tokens: int = typer.Option(1024, help="Token budget for the repository map (0 disables it)"),
+    cache: bool = typer.Option(False, "--cache", help="Share a response cache between sessions"),
+    slots: int = typer.Option(None, help="Model requests in flight across sessions (default OLLAMA_NUM_PARALLEL or 2)"),
+    session_slots: int = typer.Option(2, help="Model requests in flight per session"),
+    budget: str = typer.Option(None, help="Per-turn limits for every session, e.g. iterations=25,seconds=600"),
+    session_budget: str = typer.Option(None, help="Limits for each whole session, same keys as --budget"),
+):
+    """
+    Run a daemon that hosts many chat sessions over this workspace with shared caches.
+    """
+    from .server import DEFAULT_SLOTS, DEFAULT_SOCKET, DEFAULT_TOKEN_FILE, SpaceServer, is_loopback
+    from .server import serve as run_server
+
+    address = f"{bind}:{port}" if port else f"unix:{socket or DEFAULT_SOCKET}"
+    if port and not is_loopback(bind) and not allow_remote:
+        console.print(f"[red]Error:[/red] {bind} is reachable from other machines and sessions run tools as you; "
+                      "pass --allow-remote to bind it anyway")
+        raise typer.Exit(1)
+    turn_limits, session_limits = _parse_budget(budget, session_budget)
+    space = SpaceServer(model=model, verify=verify, verify_command=verify_cmd, map_tokens=map_tokens, cache=cache,
+                        slots=slots or DEFAULT_SLOTS, session_slots=session_slots, budget=turn_limits,
+                        session_budget=session_limits)
+    console.print(f"[bold green]Space server on {address}[/bold green] "
+                  f"({space.scheduler.slots} model slots, {space.scheduler.per_session} per session)")
+    console.print(f"[dim]Attach with: python -m ollama_coder.main start --server {address}[/dim]")
+    if port:
+        console.print(f"[dim]Clients must send the bearer token in {DEFAULT_TOKEN_FILE} "
+                      "(read from there, or from SPACE_SERVER_TOKEN)[/dim]")
+    try:
+        run_server(space, address, allow_remote=allow_remote)
+    except KeyboardInterrupt:
+        console.print("\n[bold red]Server stopped[/bold red]")
+
+
+@app.command()
+def replay(
+    trace: str = typer.Argument(..., help="Trace file written with start --record"),
+    execute: bool = typer.Option(False, "--execute", help="Re-run the real tools instead of using recorded results"),
+    realtime: bool = typer.Option(False, "--realtime", help="Reproduce recorded model and tool latency"),
+    show: bool = typer.Option(False, "--show", help="Render the session to the terminal"),
+):
+    """
+    Replay a recorded session without Ollama and compare turn timings.
+    """
+    from rich.table import Table
+
+    from .trace import replay_trace
+
+    results = replay_trace(trace, execute_tools=execute, realtime=realtime, quiet=not show)
+
+    table = Table(title=f"Replay of {trace}", show_header=True, header_style="bold magenta")
+    table.add_column("#", justify="right")
+    table.add_column("Prompt", style="cyan", max_width=50, no_wrap=True)
+    table.add_column("Recorded", justify="right")
+    table.add_column("Replayed", justify="right", style="green")
+    for number, turn in enumerate(results, 1):
+        recorded = f"{turn['recorded']:.2f}s" if turn["recorded"] is not None else "-"
+        table.add_row(str(number), turn["content"], recorded, f"{turn['replayed']:.3f}s")
+    table.add_row("", "[bold]total[/bold]", f"{sum(t['recorded'] or 0 for t in results):.2f}s",
+                  f"{sum(t['replayed'] for t in results):.3f}s")
+    console.print(table)
+
 
 if __name__ == "__main__":
     app()
@@ -0,0 +1,141 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from .watcher import walk_files
+
+# @path, @path:10-80 or @dir/ at the start of input or after whitespace (so emails don't match)
+MENTION_RE = re.compile(r"(?<!\S)@([^\s:@]+)(?::(\d+)-(\d+))?")
+
+MAX_FILE_BYTES = 24_000
+MAX_TOTAL_BYTES = 96_000
+MAX_DIR_ENTRIES = 200
+
+
+class Mention:
+    """One resolved @-mention and the context block it expands to."""
+
+    def __init__(self, token: str, path: str, start: Optional[int] = None, end: Optional[int] = None):
+        self.token = token
+        self.path = path
+        self.start = start
+        self.end = end
+        self.block = ""
+        self.summary = ""
+
+
+def find_mentions(text: str, root: str = ".") -> List[Mention]:
+    """@-mentions in text that name an existing file or directory under root."""
+    mentions = []
+    seen = set()
+    for match in MENTION_RE.finditer(text):
+        path = match.group(1).rstrip(".,;!?)")
+        full = os.path.join(root, path)
+        if not os.path.exists(full):
+            continue
+        start = int(match.group(2)) if match.group(2) else None
+        end = int(match.group(3)) if match.group(3) else None
+        key = (os.path.normpath(path), start, end)
+        if key in seen:
+            continue
+        seen.add(key)
+        mentions.append(Mention(match.group(0), path, start, end))
+    return mentions
+
+
+def _read_file(mention: Mention, root: str, max_bytes: int):
+    full = os.path.join(root, mention.path)
+    try:
+        with open(full, "rb") as f:
+            data = f.read(max_bytes + 1 if mention.start is None else -1)
+    except OSError as e:
+        mention.block = f'<file path="{mention.path}">\nError reading file: {e}\n</file>'
+        mention.summary = f"{mention.path} (unreadable)"
+        return
+    if b"\0" in data[:8192]:
+        mention.block = f'<file path="{mention.path}">\n[binary file, {os.path.getsize(full)} bytes]\n</file>'
+        mention.summary = f"{mention.path} (binary)"
+        return
+
+    text = data.decode("utf-8", errors="replace")
+    attrs = f'path="{mention.path}"'
+    if mention.start is not None:
+        lines = text.splitlines(keepends=True)
+        start = max(mention.start, 1)
+        end = min(max(mention.end, start), len(lines))
+        text = "".join(lines[start - 1:end])
+        attrs += f' lines="{start}-{end}" total_lines="{len(lines)}"'
+    note = ""
+    if len(text.encode("utf-8")) > max_bytes:
+        text = text.encode("utf-8")[:max_bytes].decode("utf-8", errors="ignore")
+        text = text[:text.rfind("\n") + 1] or text
+        note = f"[truncated at {max_bytes} bytes; use read_file or @{mention.path}:<start>-<end> for the rest]\n"
+    if text and not text.endswith("\n"):
+        text += "\n"
+    mention.block = f"<file {attrs}>\n{text}{note}</file>"
+    mention.summary = f"{mention.path}" + (f":{mention.start}-{mention.end}" if mention.start is not None else "") + \
+        f" ({text.count(chr(10))} lines{', truncated' if note else ''})"
+
+
+def _list_dir(mention: Mention, root: str, files: Optional[Callable[[], Iterable[str]]], max_entries: int):
+    prefix = os.path.normpath(mention.path)
+    if files is not None:
+        # The watcher's manifest is relative to root and already skips ignored dirs
+        entries = sorted(p for p in files() if prefix == "." or p.startswith(prefix + os.sep))
+    else:
+        entries = sorted(os.path.normpath(os.path.join(prefix, p)) for p in walk_files(os.path.join(root, prefix)))
+    shown = entries[:max_entries]
+    more = f"[{len(entries) - len(shown)} more files not shown]\n" if len(entries) > len(shown) else ""
+    listing = "".join(p + "\n" for p in shown)
+    mention.block = f'<directory path="{mention.path}" files="{len(entries)}">\n{listing}{more}</directory>'
+    mention.summary = f"{mention.path} ({len(entries)} files)"
+
+
+def expand_mentions(
+    text: str,
+    root: str = ".",
+    files: Optional[Callable[[], Iterable[str]]] = None,
+    max_file_bytes: int = MAX_FILE_BYTES,
+    max_total_bytes: int = MAX_TOTAL_BYTES,
+    max_dir_entries: int = MAX_DIR_ENTRIES,
+) -> Tuple[str, List[Mention]]:
+    """
+    Append the files and directories mentioned with @ to the user's message.
+
+    Files are read concurrently and framed as <file> blocks, line ranges
+    (@path:10-80) are honoured, and directories (@dir/) expand to a file
+    listing. Each block and the total are size-bounded.
+
+    Args:
+        text: The user input
+        root: Directory mentions are resolved against
+        files: Optional callable returning all workspace files (relative to root), used for directory listings
+
+    Returns:
+        (message with context blocks appended, mentions that were expanded)
+    """
+    mentions = find_mentions(text, root)
+    if not mentions:
+        return text, []
+
+    def expand(mention):
+        if os.path.isdir(os.path.join(root, mention.path)):
+            _list_dir(mention, root, files, max_dir_entries)
+        else:
+            _read_file(mention, root, max_file_bytes)
+
+    with ThreadPoolExecutor(max_workers=min(8, len(mentions))) as pool:
+        list(pool.map(expand, mentions))
+
+    blocks = []
+    used = 0
+    for mention in mentions:
+        size = len(mention.block)
+        if used + size > max_total_bytes:
+            blocks.append(f'<file path="{mention.path}">\n[omitted: context limit reached; use read_file]\n</file>')
+            mention.summary += " (omitted, context limit)"
+        else:
+            blocks.append(mention.block)
+            used += size
+    return text + "\n\nReferenced context:\n" + "\n".join(blocks), mentions
@@ -0,0 +1,271 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .subagents import MAX_TURNS, run_subagent
+
+# Tools a step worker may not use: the shared shell, test runs, git history, installs and nested orchestration
+WORKER_EXCLUDED_TOOLS = {
+    "run_command", "read_command_log", "run_affected_tests", "git_add", "git_commit", "install_package", "delegate",
+    "execute_plan",
+}
+MAX_PARALLEL_STEPS = 4
+
+WORKER_PROMPT = """You are carrying out ONE step of a plan the user already approved; other steps run in parallel.
+Do only this step and touch only the files it names, unless it cannot be done otherwise.
+Use the tools to make the change. When you are done, reply WITHOUT calling tools with a short summary
+(at most about 100 words) of what you changed and anything that went wrong."""
+
+
+class PlanError(ValueError):
+    """The plan is not a valid task graph."""
+
+
+class PlanStep:
+    """One node of the task graph."""
+
+    def __init__(self, step_id: str, description: str, files: List[str], depends_on: List[str]):
+        self.id = step_id
+        self.description = description
+        self.files = files
+        self.depends_on = depends_on
+        # Dependencies added because an earlier step touches the same file
+        self.file_deps: List[str] = []
+        self.status = "pending"  # pending, running, done, failed, skipped
+        self.summary = ""
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.tokens = 0
+
+    @property
+    def seconds(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def all_deps(self) -> List[str]:
+        return self.depends_on + [d for d in self.file_deps if d not in self.depends_on]
+
+
+def parse_plan(steps: List[Dict[str, Any]]) -> List[PlanStep]:
+    """
+    Build and validate the task graph from the model's step list.
+
+    Each step is {"id", "description", "files": [...], "depends_on": [...]}.
+    Steps that share a file and are not already ordered get an edge from the
+    earlier to the later step, so they never run at the same time.
+
+    Raises:
+        PlanError: on missing fields, unknown or duplicate ids, or cycles
+    """
+    if not isinstance(steps, list) or not steps:
+        raise PlanError("the plan needs a non-empty list of steps")
+
+    parsed = []
+    for number, raw in enumerate(steps, 1):
+        if not isinstance(raw, dict) or not raw.get("description"):
+            raise PlanError(f"step {number} needs a description")
+        files = raw.get("files") or []
+        depends = raw.get("depends_on") or []
+        if isinstance(files, str):
+            files = [files]
+        if isinstance(depends, (str, int)):
+            depends = [depends]
+        parsed.append(PlanStep(
+            str(raw.get("id", number)),
+            raw["description"],
+            [os.path.normpath(f) for f in files],
+            [str(d) for d in depends],
+        ))
+
+    by_id = {}
+    for step in parsed:
+        if step.id in by_id:
+            raise PlanError(f"duplicate step id {step.id!r}")
+        by_id[step.id] = step
+    for step in parsed:
+        for dep in step.depends_on:
+            if dep not in by_id:
+                raise PlanError(f"step {step.id!r} depends on unknown step {dep!r}")
+
+    order = _topological_order(parsed, by_id)
+    position = {step.id: i for i, step in enumerate(order)}
+    ancestors = {}
+    for step in order:
+        ancestors[step.id] = set()
+        for dep in step.depends_on:
+            ancestors[step.id] |= ancestors[dep] | {dep}
+
+    # Serialize steps that touch the same file, following the plan's order
+    last_writer: Dict[str, PlanStep] = {}
+    for step in sorted(parsed, key=lambda s: position[s.id]):
+        for path in step.files:
+            earlier = last_writer.get(path)
+            if earlier is not None and earlier.id not in ancestors[step.id] and earlier.id not in step.file_deps:
+                step.file_deps.append(earlier.id)
+                ancestors[step.id] |= ancestors[earlier.id] | {earlier.id}
+            last_writer[path] = step
+    return parsed
+
+
+def _topological_order(steps: List[PlanStep], by_id: Dict[str, PlanStep]) -> List[PlanStep]:
+    order = []
+    state: Dict[str, int] = {}  # 1 = visiting, 2 = done
+
+    def visit(step: PlanStep, path: List[str]):
+        if state.get(step.id) == 2:
+            return
+        if state.get(step.id) == 1:
+            raise PlanError("dependency cycle: " + " -> ".join(path + [step.id]))
+        state[step.id] = 1
+        for dep in step.depends_on:
+            visit(by_id[dep], path + [step.id])
+        state[step.id] = 2
+        order.append(step)
+
+    for step in steps:
+        visit(step, [])
+    return order
+
+
+def critical_path(steps: List[PlanStep]) -> List[PlanStep]:
+    """Longest chain of dependent steps by measured duration."""
+    by_id = {step.id: step for step in steps}
+    best: Dict[str, tuple] = {}
+
+    def longest(step: PlanStep) -> tuple:
+        if step.id not in best:
+            chains = [longest(by_id[dep]) for dep in step.all_deps]
+            total, chain = max(chains, key=lambda c: c[0], default=(0.0, []))
+            best[step.id] = (total + step.seconds, chain + [step])
+        return best[step.id]
+
+    return max((longest(step) for step in steps), key=lambda c: c[0], default=(0.0, []))[1]
+
+
+class PlanExecutor:
+    """
+    Runs a task graph with one bounded worker agent per step.
+
+    Steps whose dependencies are done run concurrently (up to max_workers);
+    a failed step causes its dependents to be skipped. on_update is called
+    from the scheduler thread whenever a step changes state.
+    """
+
+    def __init__(
+        self,
+        steps: List[PlanStep],
+        llm_factory: Callable[[], Any],
+        tools: Dict[str, Callable],
+        tool_definitions: List[Dict],
+        max_workers: int = MAX_PARALLEL_STEPS,
+        on_update: Optional[Callable[["PlanExecutor"], None]] = None,
+        check_arguments: Optional[Callable[[str, Any], Tuple[Any, Optional[str]]]] = None,
+    ):
+        self.steps = steps
+        self.llm_factory = llm_factory
+        self.tools = {name: fn for name, fn in tools.items() if name not in WORKER_EXCLUDED_TOOLS}
+        self.tool_definitions = [d for d in tool_definitions if d["function"]["name"] not in WORKER_EXCLUDED_TOOLS]
+        self.max_workers = max_workers
+        self.on_update = on_update or (lambda executor: None)
+        # Schema validation and repair for worker tool calls (Agent._check_arguments)
+        self.check_arguments = check_arguments
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    @property
+    def wall(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def _brief(self, step: PlanStep) -> str:
+        by_id = {s.id: s for s in self.steps}
+        overview = "\n".join(f"- [{s.id}] {s.description}" for s in self.steps)
+        done = "\n".join(f"- [{d}] {by_id[d].summary}" for d in step.all_deps if by_id[d].summary)
+        brief = f"Plan overview:\n{overview}\n\nYour step [{step.id}]: {step.description}"
+        if step.files:
+            brief += "\nFiles: " + ", ".join(step.files)
+        if done:
+            brief += f"\n\nResults of the steps this one depends on:\n{done}"
+        return brief
+
+    def _run_step(self, step: PlanStep):
+        result = run_subagent(
+            self.llm_factory(), self._brief(step), self.tools, self.tool_definitions,
+            max_turns=MAX_TURNS, system_prompt=WORKER_PROMPT, check_arguments=self.check_arguments,
+        )
+        step.summary = result.findings or result.error or "(no summary)"
+        step.tokens = result.prompt_tokens + result.output_tokens
+        return result
+
+    def run(self) -> str:
+        """Execute every step and return a report for the model."""
+        self.started = time.perf_counter()
+        by_id = {step.id: step for step in self.steps}
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="space-plan") as pool:
+            while True:
+                changed = False
+                for step in self.steps:
+                    if step.status != "pending":
+                        continue
+                    deps = [by_id[d] for d in step.all_deps]
+                    if any(d.status in ("failed", "skipped") for d in deps):
+                        step.status = "skipped"
+                        step.summary = "skipped: a step it depends on did not finish"
+                        changed = True
+                        self.on_update(self)
+                    elif all(d.status == "done" for d in deps) and len(running) < self.max_workers:
+                        step.status = "running"
+                        step.started = time.perf_counter()
+                        running[pool.submit(self._run_step, step)] = step
+                        self.on_update(self)
+                if not running:
+                    if changed:
+                        continue
+                    break
+                finished, _ = wait(running, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    step = running.pop(future)
+                    step.finished = time.perf_counter()
+                    try:
+                        result = future.result()
+                        step.status = "failed" if result.error else "done"
+                    except Exception as e:
+                        step.status = "failed"
+                        step.summary = f"Error: {e}"
+                    self.on_update(self)
+                if not finished:
+                    self.on_update(self)
+        self.finished = time.perf_counter()
+        self.on_update(self)
+        return self.report()
+
+    def stats(self) -> Dict[str, Any]:
+        serial = sum(step.seconds for step in self.steps)
+        path = critical_path(self.steps)
+        return {
+            "wall": self.wall,
+            "serial": serial,
+            "saved": max(serial - self.wall, 0.0),
+            "critical_path": [step.id for step in path],
+            "critical_seconds": sum(step.seconds for step in path),
+        }
+
+    def report(self) -> str:
+        stats = self.stats()
+        counts = {}
+        for step in self.steps:
+            counts[step.status] = counts.get(step.status, 0) + 1
+        lines = [
+            f"[plan: {len(self.steps)} steps ({', '.join(f'{n} {s}' for s, n in counts.items())}), "
+            f"{stats['wall']:.1f}s wall vs {stats['serial']:.1f}s in order, saved {stats['saved']:.1f}s; "
+            f"critical path {' -> '.join(stats['critical_path'])} ({stats['critical_seconds']:.1f}s)]"
+        ]
+        for step in self.steps:
+            lines.append(f"\n[{step.id}] {step.status}, {step.seconds:.1f}s: {step.description}")
+            lines.append(step.summary)
+        return "\n".join(lines)
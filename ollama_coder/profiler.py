@@ -0,0 +1,166 @@
+import io
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+
+class _NullPhase:
+    """Shared no-op context used while profiling is off."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class Profiler:
+    """
+    Low-overhead phase timers for the agent loop, with optional cProfile and
+    tracemalloc capture.
+
+    Phases are named like "model.stream" or "tool.read_file". While stopped,
+    `phase()` returns a shared no-op context manager, so instrumented code
+    costs one attribute check.
+    """
+
+    def __init__(self, report_dir: str = os.path.join(".space", "profiles")):
+        self.report_dir = report_dir
+        self.enabled = False
+        # name -> [count, total seconds, max seconds]
+        self.phases: Dict[str, List[float]] = {}
+        self.started_at: Optional[float] = None
+        self._cprofile = None
+        self._tracemalloc = False
+        self._memory_start = None
+
+    def start(self, cpu: bool = False, memory: bool = False):
+        """Start timing phases; optionally run cProfile and tracemalloc too."""
+        if self.enabled:
+            return
+        self.phases = {}
+        self.started_at = time.perf_counter()
+        self.enabled = True
+        if cpu:
+            import cProfile
+
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        if memory:
+            import tracemalloc
+
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(10)
+                self._tracemalloc = True
+            self._memory_start = tracemalloc.take_snapshot()
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return _NULL_PHASE
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name: str, seconds: float):
+        """Add a measurement taken elsewhere (e.g. time to first token)."""
+        if not self.enabled:
+            return
+        stats = self.phases.get(name)
+        if stats is None:
+            self.phases[name] = [1, seconds, seconds]
+        else:
+            stats[0] += 1
+            stats[1] += seconds
+            if seconds > stats[2]:
+                stats[2] = seconds
+
+    def stop(self, messages: Optional[List[Dict]] = None) -> Optional[str]:
+        """
+        Stop profiling and write the session report.
+
+        Args:
+            messages: Conversation history to rank by retained size
+
+        Returns:
+            Path of the written report, or None if profiling was not running.
+        """
+        if not self.enabled:
+            return None
+        self.enabled = False
+        wall = time.perf_counter() - self.started_at
+
+        sections = [self._phase_table(wall)]
+        if messages is not None:
+            sections.append(self._message_table(messages))
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            sections.append(self._cpu_table())
+            self._cprofile = None
+        if self._memory_start is not None:
+            sections.append(self._memory_table())
+            self._memory_start = None
+
+        os.makedirs(self.report_dir, exist_ok=True)
+        path = os.path.join(self.report_dir, time.strftime("session-%Y%m%d-%H%M%S.txt"))
+        with open(path, "w") as f:
+            f.write("\n\n".join(sections) + "\n")
+        return path
+
+    def summary(self, limit: int = 8) -> List[tuple]:
+        """Hot phases as (name, count, total, mean, max), by total time."""
+        ranked = sorted(self.phases.items(), key=lambda item: item[1][1], reverse=True)
+        return [(name, int(c), total, total / c, peak) for name, (c, total, peak) in ranked[:limit]]
+
+    def _phase_table(self, wall: float) -> str:
+        lines = [f"== Phases (wall {wall:.2f}s) ==", f"{'phase':<28}{'calls':>7}{'total s':>10}{'mean ms':>10}{'max ms':>10}{'% wall':>8}"]
+        for name, count, total, mean, peak in self.summary(limit=len(self.phases)):
+            lines.append(
+                f"{name:<28}{count:>7}{total:>10.3f}{mean * 1000:>10.1f}{peak * 1000:>10.1f}{total / wall * 100 if wall else 0:>7.1f}%"
+            )
+        return "\n".join(lines)
+
+    def _message_table(self, messages: List[Dict], limit: int = 10) -> str:
+        sizes = []
+        for index, message in enumerate(messages):
+            size = len(json.dumps(message, default=str))
+            sizes.append((size, index, message.get("role", "?"), message.get("name", "")))
+        total = sum(size for size, *_ in sizes)
+        lines = [
+            f"== Largest retained messages ({len(messages)} messages, {total} bytes, ~{total // 4} tokens) ==",
+            f"{'#':>5}  {'role':<10}{'tool':<20}{'bytes':>10}{'% history':>11}",
+        ]
+        for size, index, role, name in sorted(sizes, reverse=True)[:limit]:
+            lines.append(f"{index:>5}  {role:<10}{name:<20}{size:>10}{size / total * 100 if total else 0:>10.1f}%")
+        return "\n".join(lines)
+
+    def _cpu_table(self, limit: int = 25) -> str:
+        import pstats
+
+        out = io.StringIO()
+        stats = pstats.Stats(self._cprofile, stream=out)
+        stats.sort_stats("cumulative").print_stats(limit)
+        return "== cProfile (top by cumulative time) ==\n" + out.getvalue().strip()
+
+    def _memory_table(self, limit: int = 15) -> str:
+        import tracemalloc
+
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"== Memory (current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB) ==", "Growth since start by line:"]
+        for stat in snapshot.compare_to(self._memory_start, "lineno")[:limit]:
+            lines.append(f"  {stat}")
+        if self._tracemalloc:
+            tracemalloc.stop()
+            self._tracemalloc = False
+        return "\n".join(lines)
@@ -0,0 +1,231 @@
+import ast
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+# Syntax results keyed by sha256 of the file content: None if it parses, else the error
+_syntax_cache: Dict[str, Optional[Dict]] = {}
+_syntax_cache_lock = threading.Lock()
+_SYNTAX_CACHE_MAX = 4096
+
+# Ruff rule codes that just restate a syntax error ast already reported
+_SYNTAX_RULES = {None, "", "E999", "syntax-error"}
+
+
+def expand_targets(paths: Union[str, List[str]]) -> List[str]:
+    """
+    Expand paths, globs and directories into a deduplicated list of Python files.
+
+    Args:
+        paths: A path/glob, a whitespace- or comma-separated string of them, or a list.
+               Directories are searched recursively for *.py files.
+    """
+    if isinstance(paths, str):
+        paths = [p for p in paths.replace(",", " ").split() if p]
+
+    seen = set()
+    targets = []
+    for pattern in paths:
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern, recursive=True))
+        else:
+            matches = [pattern]
+        for match in matches:
+            if os.path.isdir(match):
+                candidates = sorted(str(p) for p in Path(match).rglob("*.py"))
+            else:
+                candidates = [match]
+            for candidate in candidates:
+                key = os.path.normpath(candidate)
+                if key not in seen:
+                    seen.add(key)
+                    targets.append(key)
+    return targets
+
+
+def _file_hash(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def check_syntax_cached(path: str) -> Optional[Dict]:
+    """
+    Parse a file with ast, reusing earlier results for identical content.
+
+    Returns:
+        None if the file parses, otherwise {"line", "msg", "text"} describing the error.
+    """
+    with open(path, "rb") as f:
+        source = f.read()
+    digest = hashlib.sha256(source).hexdigest()
+    with _syntax_cache_lock:
+        if digest in _syntax_cache:
+            return _syntax_cache[digest]
+
+    try:
+        ast.parse(source, filename=path)
+        error = None
+    except SyntaxError as e:
+        error = {"line": e.lineno, "msg": e.msg, "text": (e.text or "").strip()}
+
+    with _syntax_cache_lock:
+        if len(_syntax_cache) >= _SYNTAX_CACHE_MAX:
+            _syntax_cache.clear()
+        _syntax_cache[digest] = error
+    return error
+
+
+def check_syntax_many(paths: List[str], max_workers: int = 8) -> Dict[str, Optional[Dict]]:
+    """Check syntax of many files in parallel. Missing files map to a read error."""
+
+    def check(path):
+        try:
+            return check_syntax_cached(path)
+        except OSError as e:
+            return {"line": None, "msg": f"cannot read file: {e.strerror}", "text": ""}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return dict(zip(paths, pool.map(check, paths)))
+
+
+def ruff_check(paths: List[str], fix: bool = False, timeout: int = 120) -> Dict[str, List[Dict]]:
+    """
+    Lint all paths with one `ruff check --output-format json` run.
+
+    Returns:
+        Issues grouped by the given path, each {"code", "line", "col", "msg", "fixable"}.
+    """
+    if not paths:
+        return {}
+    cmd = ["ruff", "check", "--output-format", "json"]
+    if fix:
+        cmd.append("--fix")
+    result = subprocess.run(cmd + ["--"] + paths, capture_output=True, text=True, timeout=timeout)
+    if result.returncode not in (0, 1):
+        raise RuntimeError((result.stderr or result.stdout).strip() or f"ruff exited with {result.returncode}")
+
+    by_abspath = {os.path.abspath(path): path for path in paths}
+    issues: Dict[str, List[Dict]] = {}
+    for item in json.loads(result.stdout or "[]"):
+        path = by_abspath.get(os.path.abspath(item["filename"]), item["filename"])
+        location = item.get("location") or {}
+        issues.setdefault(path, []).append({
+            "code": item.get("code"),
+            "line": location.get("row"),
+            "col": location.get("column"),
+            "msg": item.get("message", ""),
+            "fixable": bool(item.get("fix")),
+        })
+    return issues
+
+
+def ruff_format(paths: List[str], timeout: int = 120) -> List[str]:
+    """
+    Format all paths with one `ruff format` run.
+
+    Returns:
+        The paths whose content changed.
+    """
+    if not paths:
+        return []
+    before = {path: _file_hash(path) for path in paths}
+    result = subprocess.run(
+        ["ruff", "format", "--"] + paths, capture_output=True, text=True, timeout=timeout
+    )
+    if result.returncode != 0:
+        raise RuntimeError((result.stderr or result.stdout).strip() or f"ruff exited with {result.returncode}")
+    return [path for path in paths if _file_hash(path) != before[path]]
+
+
+def verify_files(
+    paths: Union[str, List[str]],
+    lint: bool = True,
+    fix: bool = False,
+    format: bool = False,
+) -> Dict:
+    """
+    Run the syntax/lint/format pipeline over many files in one pass.
+
+    Files with syntax errors are skipped by ruff, and ruff's own syntax
+    diagnostics are dropped so each problem is reported once.
+
+    Returns:
+        {"files": [...], "syntax": {path: error}, "lint": {path: [issues]},
+         "formatted": [paths], "errors": [messages]}
+    """
+    files = expand_targets(paths)
+    report = {"files": files, "syntax": {}, "lint": {}, "formatted": [], "errors": []}
+    if not files:
+        return report
+
+    syntax = check_syntax_many(files)
+    report["syntax"] = {path: error for path, error in syntax.items() if error}
+    valid = [path for path in files if path not in report["syntax"]]
+
+    try:
+        if format:
+            report["formatted"] = ruff_format(valid)
+        if lint:
+            for path, issues in ruff_check(valid, fix=fix).items():
+                unique = []
+                seen = set()
+                for issue in issues:
+                    key = (issue["code"], issue["line"], issue["col"], issue["msg"])
+                    if issue["code"] in _SYNTAX_RULES or key in seen:
+                        continue
+                    seen.add(key)
+                    unique.append(issue)
+                if unique:
+                    report["lint"][path] = sorted(unique, key=lambda i: (i["line"] or 0, i["col"] or 0))
+    except FileNotFoundError:
+        report["errors"].append("ruff is not installed; lint/format skipped (pip install ruff)")
+    except subprocess.TimeoutExpired:
+        report["errors"].append("ruff timed out; lint/format results incomplete")
+    except Exception as e:
+        report["errors"].append(f"ruff failed: {e}")
+
+    return report
+
+
+def format_report(report: Dict) -> str:
+    """Render a verify_files report compactly, one line per problem grouped by file."""
+    files = report["files"]
+    if not files:
+        return "No Python files matched"
+
+    lines = []
+    for path in files:
+        problems = []
+        error = report["syntax"].get(path)
+        if error:
+            where = f"{error['line']}: " if error["line"] else ""
+            problems.append(f"  {where}SyntaxError: {error['msg']}" + (f" | {error['text']}" if error["text"] else ""))
+        for issue in report["lint"].get(path, []):
+            fixable = " [fixable]" if issue["fixable"] else ""
+            problems.append(f"  {issue['line']}:{issue['col']}: {issue['code']} {issue['msg']}{fixable}")
+        if problems:
+            lines.append(path)
+            lines.extend(problems)
+
+    n_syntax = len(report["syntax"])
+    n_lint = sum(len(issues) for issues in report["lint"].values())
+    summary = f"{len(files)} files checked: {n_syntax} with syntax errors, {n_lint} lint issues"
+    if report["formatted"]:
+        summary += f", {len(report['formatted'])} reformatted"
+    if not lines and not report["errors"]:
+        summary = "✓ " + summary
+    lines.insert(0, summary)
+    if report["formatted"]:
+        lines.append("Reformatted: " + ", ".join(report["formatted"]))
+    for error in report["errors"]:
+        lines.append(f"Error: {error}")
+    return "\n".join(lines)
@@ -0,0 +1,103 @@
+import difflib
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Optional
+
+# Send a diff only when it is clearly smaller than the file itself
+DIFF_RATIO = 0.6
+
+
+class _Seen:
+    __slots__ = ("digest", "content", "message_index", "full_index")
+
+    def __init__(self, digest: str, content: str, message_index: int, full_index: int):
+        self.digest = digest
+        self.content = content
+        # Where the model last got this version, and where it last got a whole copy of the file
+        self.message_index = message_index
+        self.full_index = full_index
+
+
+class ReadTracker:
+    """
+    Remembers which version of each file the model has already been shown.
+
+    Re-reading an unchanged file returns a short note pointing at the
+    message that holds it; re-reading a changed file returns a unified diff
+    against the version the model saw, when that is smaller than the file.
+    The least recently read files are forgotten past max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.saved_bytes = 0
+        self._seen: "OrderedDict[str, _Seen]" = OrderedDict()
+        self._size = 0
+
+    def filter(self, path: str, content: str, message_index: int, full: bool = False) -> str:
+        """
+        Decide what to send for a read of path.
+
+        Args:
+            path: File path as given to read_file
+            content: Current file content
+            message_index: Index the tool result will have in the conversation
+            full: Always send the whole file
+
+        Returns:
+            The content, a diff, or an "unchanged" note.
+        """
+        key = os.path.abspath(path)
+        digest = hashlib.blake2b(content.encode("utf-8", errors="replace"), digest_size=16).hexdigest()
+        previous = self._seen.get(key)
+
+        if full or previous is None:
+            self._remember(key, digest, content, message_index, message_index)
+            return content
+
+        if previous.digest == digest:
+            self._seen.move_to_end(key)
+            if previous.message_index == previous.full_index:
+                where = f"since message {previous.message_index}, where its content already is"
+            else:
+                where = (f"since your last read (diff in message {previous.message_index} "
+                         f"against the full copy in message {previous.full_index})")
+            note = (
+                f"[{path} is unchanged {where}. "
+                "Call read_file with full=true only if you really need it again.]"
+            )
+            self.saved_bytes += len(content) - len(note)
+            return note
+
+        diff = "".join(difflib.unified_diff(
+            previous.content.splitlines(keepends=True),
+            content.splitlines(keepends=True),
+            fromfile=f"{path} (message {previous.message_index})",
+            tofile=f"{path} (now)",
+        ))
+        if len(diff) > len(content) * DIFF_RATIO:
+            self._remember(key, digest, content, message_index, message_index)
+            return content
+        self._remember(key, digest, content, message_index, previous.full_index)
+        header = (
+            f"[{path} changed since message {previous.message_index}. Diff against that version below; "
+            "call read_file with full=true for the whole file.]\n"
+        )
+        self.saved_bytes += len(content) - len(diff) - len(header)
+        return header + diff
+
+    def last_seen(self, path: str) -> Optional[int]:
+        """Message index where the model last received path, if it has."""
+        seen = self._seen.get(os.path.abspath(path))
+        return seen.message_index if seen else None
+
+    def _remember(self, key: str, digest: str, content: str, message_index: int, full_index: int):
+        old = self._seen.pop(key, None)
+        if old is not None:
+            self._size -= len(old.content)
+        self._seen[key] = _Seen(digest, content, message_index, full_index)
+        self._size += len(content)
+        while self._size > self.max_bytes and len(self._seen) > 1:
+            _, dropped = self._seen.popitem(last=False)
+            self._size -= len(dropped.content)
@@ -0,0 +1,248 @@
+import ast
+import builtins
+import json
+import os
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from .watcher import walk_files
+
+CACHE_VERSION = 2
+DEFAULT_TOKENS = 1024
+MAX_PARSE_BYTES = 512 * 1024
+# Symbols listed per file, most referenced first
+MAX_SYMBOLS_PER_FILE = 12
+
+# Names too common to say anything about which file another file depends on
+_COMMON_NAMES = {"main", "run", "start", "stop", "setup", "test", "self", "cls", "log", "status"}
+_COMMON_NAMES.update(dir(builtins), dir(dict), dir(list), dir(str), dir(set))
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4
+
+
+def _signature(node) -> str:
+    args = [a.arg for a in node.args.posonlyargs + node.args.args if a.arg not in ("self", "cls")]
+    if node.args.vararg:
+        args.append("*" + node.args.vararg.arg)
+    args += [a.arg for a in node.args.kwonlyargs]
+    if node.args.kwarg:
+        args.append("**" + node.args.kwarg.arg)
+    return f"{node.name}({', '.join(args)})"
+
+
+def parse_python(source: str) -> Dict:
+    """
+    Top-level symbols a file defines and the names it uses.
+
+    Returns:
+        {"symbols": [[name, line], ...], "refs": {name: count}}, where each
+        line is the rendered form shown in the map.
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return {"symbols": [], "refs": {}}
+
+    symbols = []
+    for node in tree.body:
+        if getattr(node, "name", "").startswith("_"):
+            continue
+        if isinstance(node, ast.ClassDef):
+            methods = [
+                item.name for item in node.body
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))
+                and (not item.name.startswith("_") or item.name == "__init__")
+            ]
+            line = f"class {node.name}" + (f": {', '.join(methods)}" if methods else "")
+            symbols.append([node.name, line])
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            symbols.append([node.name, "def " + _signature(node)])
+        elif isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name) and target.id.isupper() and not target.id.startswith("_"):
+                    symbols.append([target.id, target.id])
+
+    refs = Counter()
+    defined = {name for name, _ in symbols}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            name = node.id
+        elif isinstance(node, ast.Attribute):
+            name = node.attr
+        elif isinstance(node, ast.alias):
+            name = node.name.rsplit(".", 1)[-1]
+        else:
+            continue
+        if name not in defined and name not in _COMMON_NAMES:
+            refs[name] += 1
+    return {"symbols": symbols, "refs": dict(refs)}
+
+
+class RepoMap:
+    """
+    A compact map of the repository for the system prompt: file paths with
+    their key symbols, ranked by how much the rest of the code refers to them
+    and trimmed to a token budget.
+
+    Parsed files are cached on disk by (size, mtime) and only changed files
+    are parsed again. With a watcher, changes mark the map stale so the next
+    render picks them up.
+    """
+
+    def __init__(self, root: str = ".", max_tokens: int = DEFAULT_TOKENS, watcher=None, cache_path: Optional[str] = None):
+        self.root = os.path.abspath(root)
+        self.max_tokens = max_tokens
+        self.watcher = watcher
+        self.cache_path = cache_path or os.path.join(self.root, ".space", "repomap.json")
+        # rel path -> {"stat": [size, mtime_ns], "symbols": [...], "refs": {...}}
+        self.entries: Dict[str, Dict] = {}
+        self._text: Optional[str] = None
+        # Bumped on every change so a render racing with an edit isn't cached
+        self._generation = 0
+        # How many references each symbol name gets across the repo, set by rank()
+        self.name_refs: Counter = Counter()
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._load_cache()
+        if watcher is not None:
+            watcher.subscribe(self._on_change)
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == CACHE_VERSION:
+            self.entries = data.get("files", {})
+
+    def _save_cache(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp = self.cache_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"version": CACHE_VERSION, "files": self.entries}, f, separators=(",", ":"))
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            pass
+
+    def _on_change(self, events):
+        with self._lock:
+            self._text = None
+            self._generation += 1
+
+    def _current_files(self) -> Dict[str, Tuple[int, int]]:
+        if self.watcher is not None and self.watcher.ready.is_set():
+            return self.watcher.snapshot()
+        return walk_files(self.root)
+
+    def refresh(self) -> int:
+        """Bring entries up to date with the tree; returns how many files were parsed."""
+        files = self._current_files()
+        parsed = 0
+        entries = {}
+        for path, (size, mtime) in files.items():
+            stat = [size, mtime]
+            entry = self.entries.get(path)
+            if entry is None or entry["stat"] != stat:
+                entry = {"stat": stat, "symbols": [], "refs": {}}
+                if path.endswith(".py") and size <= MAX_PARSE_BYTES:
+                    try:
+                        with open(os.path.join(self.root, path), encoding="utf-8", errors="replace") as f:
+                            entry.update(parse_python(f.read()))
+                    except OSError:
+                        continue
+                parsed += 1
+            entries[path] = entry
+        changed = parsed or len(entries) != len(self.entries)
+        self.entries = entries
+        if changed:
+            self._save_cache()
+        return parsed
+
+    def rank(self) -> List[Tuple[str, float]]:
+        """Files by PageRank over the "uses a symbol defined in" graph, highest first."""
+        definers = defaultdict(list)
+        for path, entry in self.entries.items():
+            for name, _ in entry["symbols"]:
+                definers[name].append(path)
+
+        edges = defaultdict(Counter)
+        name_refs = Counter()
+        for path, entry in self.entries.items():
+            for name, count in entry["refs"].items():
+                targets = definers.get(name)
+                if targets:
+                    name_refs[name] += count
+                # A name defined in many files says little about which one is meant
+                if not targets or len(targets) > 5:
+                    continue
+                for target in targets:
+                    if target != path:
+                        edges[path][target] += count / len(targets)
+
+        self.name_refs = name_refs
+        paths = list(self.entries)
+        if not paths:
+            return []
+        n = len(paths)
+        rank = dict.fromkeys(paths, 1.0 / n)
+        for _ in range(20):
+            incoming = dict.fromkeys(paths, 0.0)
+            dangling = 0.0
+            for path in paths:
+                out = edges.get(path)
+                if not out:
+                    dangling += rank[path]
+                    continue
+                total = sum(out.values())
+                for target, weight in out.items():
+                    incoming[target] += rank[path] * weight / total
+            rank = {p: 0.15 / n + 0.85 * (incoming[p] + dangling / n) for p in paths}
+        # Files with symbols first: they are what the map is for
+        return sorted(rank.items(), key=lambda item: (bool(self.entries[item[0]]["symbols"]), item[1]), reverse=True)
+
+    def render(self, max_tokens: Optional[int] = None) -> str:
+        """The map text, rebuilt only if files changed since the last render."""
+        max_tokens = self.max_tokens if max_tokens is None else max_tokens
+        with self._lock:
+            if self._text is not None and max_tokens == self.max_tokens:
+                return self._text
+            generation = self._generation
+        with self._build_lock:
+            self.refresh()
+            ranked = self.rank()
+
+        blocks = {}
+        used = 0
+        omitted = []
+        for path, _ in ranked:
+            block = path + "\n"
+            symbols = self.entries[path]["symbols"]
+            if symbols:
+                # Constants only make the cut when other files use them
+                candidates = [(n, line) for n, line in symbols if line != n or self.name_refs[n]]
+                keep = sorted(candidates, key=lambda symbol: self.name_refs[symbol[0]], reverse=True)[:MAX_SYMBOLS_PER_FILE]
+                keep = {name for name, _ in keep}
+                block = path + ":\n" + "".join(f"  {line}\n" for name, line in symbols if name in keep)
+            cost = estimate_tokens(block)
+            if used + cost > max_tokens:
+                # Out of room for symbols; the path alone still helps navigation
+                block = path + "\n"
+                cost = estimate_tokens(block)
+                if used + cost > max_tokens:
+                    omitted.append(path)
+                    continue
+            blocks[path] = block
+            used += cost
+        text = "".join(blocks[path] for path in sorted(blocks))
+        if omitted:
+            text += f"({len(omitted)} more files not shown)\n"
+        if max_tokens == self.max_tokens:
+            with self._lock:
+                if generation == self._generation:
+                    self._text = text
+        return text
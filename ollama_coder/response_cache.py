@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional
+
+
+def _normalize(value: Any) -> Any:
+    """Plain, key-sorted JSON data with None fields dropped, so equal histories hash equally."""
+    if hasattr(value, "model_dump"):
+        value = value.model_dump(exclude_none=True)
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in sorted(value.items()) if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def _digest(value: Any) -> str:
+    data = json.dumps(_normalize(value), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def is_deterministic(options: Optional[Dict]) -> bool:
+    """Greedy decoding (temperature 0) or a fixed seed gives repeatable output."""
+    if not options:
+        return False
+    return options.get("temperature") == 0 or options.get("seed") is not None
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache of streamed model responses.
+
+    Entries are keyed by model, options, tool definitions and the message
+    history. Reads refresh an entry's mtime; when the directory grows past
+    max_bytes the least recently used entries are deleted.
+    """
+
+    def __init__(self, directory: str = os.path.join(".space", "llm-cache"), max_bytes: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._sizes = {}
+        for entry in os.scandir(directory):
+            if entry.name.endswith(".json"):
+                self._sizes[entry.path] = entry.stat().st_size
+
+    def key(self, model: str, options: Optional[Dict], tools: Optional[List[Dict]], messages: List[Dict]) -> str:
+        return _digest({
+            "model": model,
+            "options": options or {},
+            "tools": _digest(tools or []),
+            "messages": _digest(messages),
+        })
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        """Recorded chunks for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                chunks = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return chunks
+
+    def put(self, key: str, chunks: List[Dict]):
+        data = json.dumps(chunks, separators=(",", ":"), default=str)
+        path = self._path(key)
+        # Write then rename so a concurrent reader never sees half an entry
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._sizes[path] = len(data)
+            self._evict()
+
+    def _evict(self):
+        total = sum(self._sizes.values())
+        if total <= self.max_bytes:
+            return
+        by_age = []
+        for path in self._sizes:
+            try:
+                by_age.append((os.path.getmtime(path), path))
+            except OSError:
+                by_age.append((0, path))
+        for _, path in sorted(by_age):
+            if total <= self.max_bytes:
+                break
+            total -= self._sizes.pop(path)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
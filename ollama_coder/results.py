@@ -0,0 +1,158 @@
+from typing import Any, Dict
+
+
+class ToolResult:
+    """
+    Typed outcome of a tool call.
+
+    status is "ok" or "error". payload is the data the tool produced (file
+    text, matches, command output), summary a short note on what happened
+    ("wrote 12 lines"), truncated the number of payload items left out, and
+    data any structured extras (exit code, match count). seconds is filled
+    in by the agent when it runs the tool.
+
+    serialize() gives the compact text the model sees and view() the fuller
+    text shown to people; str() is the model form, so callers that expect a
+    string keep working.
+    """
+
+    def __init__(self, status: str = "ok", payload: str = "", summary: str = "", truncated: int = 0,
+                 data: Dict[str, Any] = None):
+        self.status = status
+        self.payload = payload
+        self.summary = summary
+        self.truncated = truncated
+        self.data = data or {}
+        self.seconds = 0.0
+
+    @classmethod
+    def success(cls, payload: str = "", summary: str = "", truncated: int = 0, **data) -> "ToolResult":
+        return cls("ok", payload, summary, truncated, data)
+
+    @classmethod
+    def failure(cls, summary: str, payload: str = "", **data) -> "ToolResult":
+        return cls("error", payload, summary, 0, data)
+
+    @classmethod
+    def wrap(cls, value: Any) -> "ToolResult":
+        """Treat a plain return value (e.g. a report string) as a successful payload."""
+        if isinstance(value, ToolResult):
+            return value
+        return cls.success(payload="" if value is None else str(value))
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+    def __str__(self) -> str:
+        return serialize(self)
+
+    def __repr__(self) -> str:
+        return f"ToolResult({self.status!r}, summary={self.summary!r}, payload={len(self.payload)} chars)"
+
+
+def _truncation_note(result: ToolResult) -> str:
+    unit = result.data.get("unit", "items")
+    return f"[{result.truncated} more {unit} not shown]"
+
+
+def serialize(result: ToolResult) -> str:
+    """Compact model-facing text: the payload alone when there is one, no status prose."""
+    if not result.ok:
+        text = f"error: {result.summary}"
+        if result.payload:
+            text += "\n" + result.payload
+    elif result.payload:
+        text = result.payload
+    else:
+        text = result.summary or "ok"
+    if result.truncated:
+        text += "\n" + _truncation_note(result)
+    return text
+
+
+def view(result: ToolResult) -> str:
+    """Text for the terminal: a status line with the summary, then the payload."""
+    lines = []
+    if result.summary or not result.payload:
+        line = f"{'✓' if result.ok else '✗'} {result.summary or ('done' if result.ok else 'failed')}"
+        if result.data.get("path"):
+            line += f" ({result.data['path']})"
+        lines.append(line)
+    if result.payload:
+        lines.append(result.payload)
+    if result.truncated:
+        lines.append(_truncation_note(result))
+    return "\n".join(lines)
+
+
+# What tools without a payload used to return as prose, before ToolResult; filled in from the call's arguments
+LEGACY_MESSAGES = {
+    "list_files": "",
+    "read_file": "",
+    "write_file": "Successfully wrote to {path}",
+    "edit_file": "Successfully edited {path}",
+    "append_to_file": "Successfully appended to {path}",
+    "delete_file": "Successfully deleted {path}",
+    "create_directory": "Successfully created directory {path}",
+    "move_file": "Successfully moved {source} to {destination}",
+    "copy_file": "Successfully copied {source} to {destination}",
+    "check_syntax": "✓ Syntax check passed for {path}",
+    "lint_file": "✓ No linting issues found in {path}",
+    "format_file": "✓ Successfully formatted {path}",
+    "search_file": "No matches found for '{pattern}' in {path}",
+    "grep_search": "No matches found for '{pattern}' in {directory}",
+    "find_files": "No files found matching '{name_pattern}' in {directory}",
+    "run_command": "Command completed with exit code 0 (no output)",
+}
+
+
+class _Blank(dict):
+    def __missing__(self, key):
+        return ""
+
+
+def legacy(name: str, arguments: Any, result: ToolResult) -> str:
+    """Estimate the free-form prose the tool returned for this result before ToolResult."""
+    if not result.ok:
+        text = f"Error: {result.summary}"
+        if result.payload:
+            text += "\n" + result.payload
+    elif result.payload:
+        text = result.payload
+    else:
+        template = LEGACY_MESSAGES.get(name)
+        fields = _Blank(arguments if isinstance(arguments, dict) else {})
+        text = template.format_map(fields) if template is not None else result.summary
+    if result.truncated:
+        text += "\n" + _truncation_note(result)
+    return text
+
+
+def estimate_tokens(text: str) -> int:
+    # Same ~4 characters per token rule as the repository map
+    return len(text) // 4
+
+
+class ResultStats:
+    """Running token totals of serialized tool results against the legacy prose they replaced."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.model_tokens = 0
+        self.legacy_tokens = 0
+
+    def record(self, name: str, arguments: Any, result: ToolResult, text: str):
+        self.calls += 1
+        self.errors += not result.ok
+        self.model_tokens += estimate_tokens(text)
+        self.legacy_tokens += estimate_tokens(legacy(name, arguments, result))
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(self.legacy_tokens - self.model_tokens, 0)
+
+    def summary(self) -> str:
+        return (f"{self.calls} tool results ({self.errors} errors), ~{self.model_tokens} tokens sent to the model, "
+                f"~{self.saved_tokens} fewer than the old prose results")
@@ -0,0 +1,588 @@
+import hmac
+import http.client
+import ipaddress
+import json
+import os
+import secrets
+import socket
+import socketserver
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+DEFAULT_SOCKET = os.path.join(".space", "serve.sock")
+# Bearer token a TCP server requires; written owner-only next to the socket
+DEFAULT_TOKEN_FILE = os.path.join(".space", "serve.token")
+# Model requests in flight across all sessions; match Ollama's OLLAMA_NUM_PARALLEL
+DEFAULT_SLOTS = int(os.environ.get("OLLAMA_NUM_PARALLEL") or 2)
+# Model requests in flight per session (sub-agents, plan steps and best-of fan out)
+DEFAULT_SESSION_SLOTS = 2
+MAX_SESSIONS = 32
+
+
+class ServerError(Exception):
+    """An API request failed; status is the HTTP status code."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class ModelScheduler:
+    """
+    Hands out model request slots to sessions.
+
+    At most `slots` requests run at once and at most `per_session` per
+    session. When a slot frees up, sessions with waiting requests take
+    turns, so one session fanning out sub-agents cannot starve the others.
+    """
+
+    def __init__(self, slots: int = DEFAULT_SLOTS, per_session: int = DEFAULT_SESSION_SLOTS):
+        self.slots = max(1, slots)
+        self.per_session = max(1, per_session)
+        self._cond = threading.Condition()
+        self._waiting: Dict[str, deque] = {}  # session -> tickets in arrival order
+        self._order: deque = deque()  # sessions with waiting tickets, next in line first
+        self._active: Dict[str, int] = {}
+        self._granted = set()
+        self.in_flight = 0
+        self.requests = 0
+        self.wait_seconds = 0.0
+
+    @contextmanager
+    def slot(self, session_id: str):
+        ticket = object()
+        queued = time.perf_counter()
+        with self._cond:
+            self._waiting.setdefault(session_id, deque()).append(ticket)
+            if session_id not in self._order:
+                self._order.append(session_id)
+            self._dispatch()
+            while ticket not in self._granted:
+                self._cond.wait()
+            self._granted.discard(ticket)
+            self.requests += 1
+            self.wait_seconds += time.perf_counter() - queued
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active[session_id] -= 1
+                if not self._active[session_id]:
+                    del self._active[session_id]
+                self.in_flight -= 1
+                self._dispatch()
+
+    def _dispatch(self):
+        granted = False
+        while self.in_flight < self.slots:
+            for _ in range(len(self._order)):
+                session_id = self._order[0]
+                self._order.rotate(-1)
+                if self._active.get(session_id, 0) < self.per_session:
+                    break
+            else:
+                break
+            queue = self._waiting[session_id]
+            self._granted.add(queue.popleft())
+            self._active[session_id] = self._active.get(session_id, 0) + 1
+            self.in_flight += 1
+            granted = True
+            if not queue:
+                del self._waiting[session_id]
+                self._order.remove(session_id)
+        if granted:
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "slots": self.slots,
+                "per_session": self.per_session,
+                "in_flight": self.in_flight,
+                "waiting": sum(len(q) for q in self._waiting.values()),
+                "requests": self.requests,
+                "avg_wait": self.wait_seconds / self.requests if self.requests else 0.0,
+            }
+
+
+class Session:
+    """One isolated conversation: its own agent, history, shell and read tracker."""
+
+    def __init__(self, session_id: str, agent):
+        self.id = session_id
+        self.agent = agent
+        # One turn at a time per session
+        self.lock = threading.Lock()
+        self.created = time.time()
+        self.last_active = self.created
+        self.turns = 0
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "model": self.agent.model_name,
+            "turns": self.turns,
+            "messages": len(self.agent.messages),
+            "busy": self.lock.locked(),
+            "idle": round(time.time() - self.last_active, 1),
+            "usage": self.agent.budget.session.as_dict(),
+        }
+
+
+class _ChunkedWriter:
+    """File-like target for a rich Console that sends each write as an HTTP chunk."""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def write(self, text: str) -> int:
+        data = text.encode("utf-8")
+        with self._lock:
+            if data and not self.closed:
+                try:
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                    self.wfile.flush()
+                except OSError:
+                    # The client went away; the turn still finishes and stays in history
+                    self.closed = True
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self) -> bool:
+        return True
+
+    def finish(self):
+        with self._lock:
+            if not self.closed:
+                try:
+                    self.wfile.write(b"0\r\n\r\n")
+                    self.wfile.flush()
+                except OSError:
+                    pass
+                self.closed = True
+
+
+class SpaceServer:
+    """
+    Hosts many chat sessions over one workspace.
+
+    Sessions are isolated (history, shell, read tracker, verifier) but share
+    what is expensive to rebuild: the workspace watcher and its file index,
+    the repository map, the git status cache, the response cache and the
+    Ollama client's connection pool. Model requests from all sessions go
+    through one ModelScheduler.
+    """
+
+    def __init__(
+        self,
+        model: str = "qwen3:4b",
+        verify: bool = True,
+        verify_command: Optional[str] = None,
+        map_tokens: int = 1024,
+        cache: bool = False,
+        slots: int = DEFAULT_SLOTS,
+        session_slots: int = DEFAULT_SESSION_SLOTS,
+        max_sessions: int = MAX_SESSIONS,
+        budget=None,
+        session_budget=None,
+    ):
+        from .repomap import RepoMap
+        from .watcher import get_watcher
+
+        self.model = model
+        self.verify = verify
+        self.verify_command = verify_command
+        self.map_tokens = map_tokens
+        self.max_sessions = max_sessions
+        # Limits applied to every session's agent (budget.Limits); None keeps the defaults
+        self.budget = budget
+        self.session_budget = session_budget
+        self.scheduler = ModelScheduler(slots, session_slots)
+        self.response_cache = None
+        if cache:
+            from .response_cache import ResponseCache
+
+            self.response_cache = ResponseCache()
+        self.watcher = get_watcher(os.getcwd())
+        self.repo_map = None
+        if map_tokens > 0:
+            self.repo_map = RepoMap(os.getcwd(), max_tokens=map_tokens, watcher=self.watcher)
+            threading.Thread(target=self.repo_map.render, name="space-repomap", daemon=True).start()
+        self.sessions: Dict[str, Session] = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def create_session(
+        self,
+        model: Optional[str] = None,
+        options: Optional[Dict[str, Any]] = None,
+        best_of: int = 1,
+        subagent_model: Optional[str] = None,
+    ) -> Session:
+        from rich.console import Console
+
+        from .agent import Agent
+        from .budget import BudgetGovernor
+
+        with self._lock:
+            if len(self.sessions) >= self.max_sessions:
+                raise ServerError(503, f"session limit reached ({self.max_sessions})")
+            session_id = uuid.uuid4().hex[:12]
+            # Reserve the id so concurrent creates count against the limit
+            self.sessions[session_id] = None
+        try:
+            agent = Agent(
+                model_name=model or self.model,
+                verify=self.verify,
+                verify_command=self.verify_command,
+                options=options,
+                response_cache=self.response_cache,
+                map_tokens=self.map_tokens,
+                subagent_model=subagent_model,
+                best_of=best_of,
+                gate=lambda: self.scheduler.slot(session_id),
+                repo_map=self.repo_map,
+                output=Console(file=open(os.devnull, "w")),
+                budget=BudgetGovernor(self.budget, self.session_budget),
+            )
+        except Exception:
+            with self._lock:
+                del self.sessions[session_id]
+            raise
+        session = Session(session_id, agent)
+        with self._lock:
+            self.sessions[session_id] = session
+        return session
+
+    def get_session(self, session_id: str) -> Session:
+        with self._lock:
+            session = self.sessions.get(session_id)
+        if session is None:
+            raise ServerError(404, f"no session {session_id!r}")
+        return session
+
+    def close_session(self, session_id: str):
+        session = self.get_session(session_id)
+        with self._lock:
+            self.sessions.pop(session_id, None)
+        session.agent.close()
+
+    def chat(self, session_id: str, message: str, out, width: int = 100, color_system: Optional[str] = "truecolor"):
+        """Run one turn, rendering to out as the local CLI would render to the terminal."""
+        from rich.console import Console
+
+        session = self.get_session(session_id)
+        if not session.lock.acquire(blocking=False):
+            raise ServerError(409, "session is busy with another message")
+        try:
+            agent = session.agent
+            agent.console = Console(file=out, force_terminal=True, width=width, color_system=color_system)
+            try:
+                agent.chat(message)
+            except Exception as e:
+                agent.console.print(f"[red]Error:[/red] {e}")
+            session.turns += 1
+        finally:
+            session.last_active = time.time()
+            session.lock.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions = [s.info() for s in self.sessions.values() if s is not None]
+        stats = {
+            "uptime": round(time.time() - self.started, 1),
+            "workspace": os.getcwd(),
+            "sessions": sessions,
+            "scheduler": self.scheduler.stats(),
+            "watched_files": len(self.watcher.files()) if self.watcher.ready.is_set() else None,
+        }
+        if self.response_cache is not None:
+            stats["response_cache"] = {"hits": self.response_cache.hits, "misses": self.response_cache.misses}
+        return stats
+
+    def close(self):
+        for session_id in list(self.sessions):
+            try:
+                self.close_session(session_id)
+            except ServerError:
+                pass
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "space-serve"
+
+    @property
+    def space(self) -> SpaceServer:
+        return self.server.space
+
+    def address_string(self) -> str:
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: Any):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise ServerError(400, "request body is not valid JSON")
+        if not isinstance(body, dict):
+            raise ServerError(400, "request body must be a JSON object")
+        return body
+
+    def _authorized(self) -> bool:
+        token = getattr(self.server, "token", None)
+        if token is None:
+            return True
+        return hmac.compare_digest(self.headers.get("Authorization") or "", f"Bearer {token}")
+
+    def _route(self, method: str):
+        parts = [p for p in self.path.split("?")[0].split("/") if p]
+        if not self._authorized():
+            # The body was not read, so the connection can't be reused
+            self.close_connection = True
+            self._send_json(401, {"error": "missing or wrong bearer token"})
+            return
+        try:
+            if method == "GET" and parts == ["stats"]:
+                self._send_json(200, self.space.stats())
+            elif method == "GET" and parts == ["sessions"]:
+                self._send_json(200, self.space.stats()["sessions"])
+            elif method == "POST" and parts == ["sessions"]:
+                body = self._read_json()
+                session = self.space.create_session(
+                    model=body.get("model"),
+                    options=body.get("options"),
+                    best_of=int(body.get("best_of") or 1),
+                    subagent_model=body.get("subagent_model"),
+                )
+                self._send_json(201, session.info())
+            elif method == "DELETE" and len(parts) == 2 and parts[0] == "sessions":
+                self.space.close_session(parts[1])
+                self._send_json(200, {"closed": parts[1]})
+            elif method == "POST" and len(parts) == 3 and parts[0] == "sessions" and parts[2] == "model":
+                session = self.space.get_session(parts[1])
+                if not session.agent.switch_model(self._read_json().get("model") or session.agent.model_name):
+                    raise ServerError(400, "could not switch model")
+                self._send_json(200, session.info())
+            elif method == "POST" and len(parts) == 3 and parts[0] == "sessions" and parts[2] == "chat":
+                self._chat(parts[1], self._read_json())
+            else:
+                self._send_json(404, {"error": f"no route for {method} {self.path}"})
+        except ServerError as e:
+            self._send_json(e.status, {"error": str(e)})
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+
+    def _chat(self, session_id: str, body: Dict[str, Any]):
+        message = body.get("message")
+        if not isinstance(message, str) or not message.strip():
+            raise ServerError(400, "chat needs a non-empty message")
+        session = self.space.get_session(session_id)
+        if session.lock.locked():
+            raise ServerError(409, "session is busy with another message")
+        # Headers go out before the turn so the client starts rendering right away
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        out = _ChunkedWriter(self.wfile)
+        try:
+            self.space.chat(session_id, message, out, width=int(body.get("width") or 100),
+                            color_system=body.get("color_system", "truecolor"))
+        except ServerError as e:
+            out.write(f"Error: {e}\n")
+        finally:
+            out.finish()
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_DELETE(self):
+        self._route("DELETE")
+
+
+class _UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        # A socket file left behind by a crashed daemon would make bind fail
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+        # Sessions run tools as the daemon's user, so only that user may connect
+        os.chmod(self.server_address, 0o600)
+
+
+def parse_address(address: str) -> Tuple[str, Any]:
+    """("unix", path) for unix:PATH or a *.sock path, else ("tcp", (host, port)) for [http://]host:port."""
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    if address.endswith(".sock") or os.sep in address and ":" not in address:
+        return "unix", address
+    address = address.split("://", 1)[-1].rstrip("/")
+    host, _, port = address.rpartition(":")
+    if not port.isdigit():
+        raise ValueError(f"not a server address: {address!r} (use unix:PATH or host:port)")
+    return "tcp", (host or "127.0.0.1", int(port))
+
+
+def is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def write_token(path: str = DEFAULT_TOKEN_FILE) -> str:
+    """Generate a fresh bearer token and store it readable by the owner only."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    token = secrets.token_urlsafe(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        # O_CREAT's mode does not apply to a file that already existed
+        os.fchmod(f.fileno(), 0o600)
+        f.write(token + "\n")
+    return token
+
+
+def read_token(path: str = DEFAULT_TOKEN_FILE) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def serve(space: SpaceServer, address: str = DEFAULT_SOCKET, allow_remote: bool = False,
+          token_file: str = DEFAULT_TOKEN_FILE):
+    """
+    Serve the API on address until interrupted.
+
+    A Unix socket is protected by its file mode. Over TCP every request needs
+    the bearer token written to token_file, and binding anything other than a
+    loopback address needs allow_remote, since sessions run tools as this user.
+    """
+    kind, target = parse_address(address)
+    if kind == "unix":
+        os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+        httpd = _UnixHTTPServer(target, _Handler)
+        httpd.token = None
+    else:
+        if not is_loopback(target[0]) and not allow_remote:
+            raise ValueError(f"refusing to listen on {target[0]}, which is reachable from other machines; "
+                             "bind a loopback address or allow remote clients explicitly")
+        httpd = ThreadingHTTPServer(target, _Handler)
+        httpd.token = write_token(token_file)
+    httpd.space = space
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
+        space.close()
+        if kind == "unix" and os.path.exists(target):
+            os.unlink(target)
+        if httpd.token is not None and read_token(token_file) == httpd.token:
+            os.unlink(token_file)
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class ServerClient:
+    """Thin client for a running `space serve`."""
+
+    def __init__(self, address: str = DEFAULT_SOCKET, token: Optional[str] = None):
+        """
+        Over TCP the bearer token is token, else SPACE_SERVER_TOKEN, else the
+        one a server in this workspace wrote to .space/serve.token.
+        """
+        self.address = address
+        self.kind, self.target = parse_address(address)
+        self.token = None
+        if self.kind == "tcp":
+            self.token = token or os.environ.get("SPACE_SERVER_TOKEN") or read_token()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self.kind == "unix":
+            return _UnixConnection(self.target)
+        return http.client.HTTPConnection(*self.target)
+
+    def _request(self, method: str, path: str, body: Optional[Dict] = None) -> http.client.HTTPResponse:
+        connection = self._connection()
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        try:
+            connection.request(method, path, body=data, headers=headers)
+            response = connection.getresponse()
+        except OSError as e:
+            raise ServerError(0, f"cannot reach space serve at {self.address}: {e}")
+        if response.status >= 400:
+            try:
+                message = json.loads(response.read()).get("error", response.reason)
+            except ValueError:
+                message = response.reason
+            raise ServerError(response.status, message)
+        return response
+
+    def _json(self, method: str, path: str, body: Optional[Dict] = None) -> Any:
+        return json.loads(self._request(method, path, body).read())
+
+    def create_session(self, **params) -> str:
+        return self._json("POST", "/sessions", {k: v for k, v in params.items() if v is not None})["id"]
+
+    def close_session(self, session_id: str):
+        self._json("DELETE", f"/sessions/{session_id}")
+
+    def switch_model(self, session_id: str, model: str) -> Dict[str, Any]:
+        return self._json("POST", f"/sessions/{session_id}/model", {"model": model})
+
+    def stats(self) -> Dict[str, Any]:
+        return self._json("GET", "/stats")
+
+    def chat(self, session_id: str, message: str, width: int = 100, color_system: Optional[str] = "truecolor") -> Iterator[bytes]:
+        """Yield the turn's rendered terminal output as it arrives."""
+        response = self._request("POST", f"/sessions/{session_id}/chat",
+                                 {"message": message, "width": width, "color_system": color_system})
+        while True:
+            data = response.read1(65536)
+            if not data:
+                break
+            yield data
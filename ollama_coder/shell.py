@@ -0,0 +1,379 @@
+import os
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Dict, Optional
+
+
+class OutputCapture:
+    """
+    Bounded capture of one output stream.
+
+    Keeps the first `head_bytes` and a ring buffer of the last `tail_bytes`;
+    everything in between only goes to the command's log file.
+    """
+
+    def __init__(self, head_bytes: int = 4096, tail_bytes: int = 8192):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.head = bytearray()
+        self.tail = deque()
+        self.tail_size = 0
+        self.total = 0
+
+    def write(self, data: bytes):
+        self.total += len(data)
+        if len(self.head) < self.head_bytes:
+            self.head += data[: self.head_bytes - len(self.head)]
+        self.tail.append(data)
+        self.tail_size += len(data)
+        while self.tail and self.tail_size - len(self.tail[0]) >= self.tail_bytes:
+            self.tail_size -= len(self.tail.popleft())
+
+    @property
+    def truncated(self) -> bool:
+        return self.total > self.head_bytes + self.tail_bytes
+
+    def tail_text(self, max_lines: int = 10) -> str:
+        """The last few lines written, for live display."""
+        data = b"".join(self.tail)[-self.tail_bytes:]
+        return "\n".join(_decode(data).splitlines()[-max_lines:])
+
+    def summary(self) -> str:
+        """Head and tail of the stream, with the size of the omitted middle."""
+        tail = b"".join(self.tail)
+        if self.total <= len(self.head):
+            return _decode(bytes(self.head))
+        if not self.truncated:
+            return _decode(bytes(self.head) + tail[len(tail) - (self.total - len(self.head)):])
+        tail = tail[-self.tail_bytes:]
+        omitted = self.total - len(self.head) - len(tail)
+        return (
+            _decode(bytes(self.head))
+            + f"\n... [{omitted} bytes omitted] ...\n"
+            + _decode(tail)
+        )
+
+
+class CommandResult:
+    """Outcome of a command run in a ShellSession."""
+
+    def __init__(self, log_id: str, log_path: str):
+        self.log_id = log_id
+        self.log_path = log_path
+        self.stdout = OutputCapture()
+        self.stderr = OutputCapture()
+        self.exit_code: Optional[int] = None
+        self.timed_out = False
+        self.restarted = False
+        self.elapsed = 0.0
+
+    @property
+    def truncated(self) -> bool:
+        return self.stdout.truncated or self.stderr.truncated
+
+    @property
+    def total_bytes(self) -> int:
+        return self.stdout.total + self.stderr.total
+
+
+class ShellSession:
+    """
+    A long-lived bash process that keeps cwd and exported variables between commands.
+
+    Each command is written to a script file and sourced by the session, followed by
+    a sentinel line on stdout and stderr carrying the exit code. Output is streamed
+    into bounded captures and a per-command log file as it arrives, so long-running
+    commands can be tailed live and nothing is lost on timeout.
+    """
+
+    # Grace period between interrupt escalation steps on timeout
+    INTERRUPT_GRACE = 2.0
+    # Number of command logs kept on disk
+    MAX_LOGS = 50
+    # Minimum seconds between listener calls
+    LISTENER_INTERVAL = 0.1
+
+    def __init__(self, executable: str = "/bin/bash", cwd: Optional[str] = None):
+        self.executable = executable
+        self.initial_cwd = cwd
+        self.process: Optional[subprocess.Popen] = None
+        # Called with the latest output tail while a command runs
+        self.listener: Optional[Callable[[str], None]] = None
+        self._lock = threading.Lock()
+        self._token = f"__SPACE_{uuid.uuid4().hex}__".encode()
+        self._script_dir = tempfile.mkdtemp(prefix="space-shell-")
+        self._cond = threading.Condition()
+        self._streams: Dict[str, dict] = {}
+        self._current: Optional[CommandResult] = None
+        self._log_file = None
+        self._logs = deque()
+        self._counter = 0
+        self._last_notify = 0.0
+
+    def start(self):
+        """Start the bash process if it is not already running."""
+        if self.is_alive():
+            return
+        self.process = subprocess.Popen(
+            [self.executable, "--noprofile", "--norc"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=self.initial_cwd,
+            start_new_session=True,  # Own process group so timeouts can signal it
+        )
+        self._streams = streams = {
+            "stdout": {"pending": b"", "done": False},
+            "stderr": {"pending": b"", "done": False},
+        }
+        for name in ("stdout", "stderr"):
+            threading.Thread(
+                target=self._pump,
+                args=(getattr(self.process, name), name, streams),
+                daemon=True,
+            ).start()
+        # Children get default handlers back, so only the session survives an interrupt.
+        # While a command runs, an interrupt aborts the rest of its script.
+        self._write(
+            "trap ':' INT TERM\n"
+            "__space_run() {\n"
+            "  trap 'trap : INT TERM; return 130' INT TERM\n"
+            "  . \"$1\" < /dev/null\n"
+            "  local rc=$?\n"
+            "  trap : INT TERM\n"
+            "  return $rc\n"
+            "}\n"
+        )
+
+    @property
+    def cwd(self) -> str:
+        """Current working directory of the shell (follows `cd` in earlier commands)."""
+        if self.is_alive():
+            try:
+                return os.readlink(f"/proc/{self.process.pid}/cwd")
+            except OSError:
+                pass
+        return self.initial_cwd or os.getcwd()
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def close(self):
+        """Terminate the bash process."""
+        if self.process is None:
+            return
+        if self.is_alive():
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=1)
+            except Exception:
+                self._signal(signal.SIGKILL)
+        self.process = None
+
+    def run(self, command: str, cwd: Optional[str] = None, timeout: float = 60) -> CommandResult:
+        """
+        Run a command in the session.
+
+        Args:
+            command: Bash source to execute
+            cwd: Optional working directory for this command only
+            timeout: Seconds to wait before interrupting the command
+
+        Returns:
+            A CommandResult with bounded stdout/stderr captures and the id of the full log.
+        """
+        with self._lock:
+            self.start()
+            script = os.path.join(self._script_dir, "cmd.sh")
+            with open(script, "w") as f:
+                f.write(command)
+                f.write("\n")
+
+            result = self._begin(command)
+            started = time.monotonic()
+
+            frame = f"__space_run {_quote(script)}"
+            if cwd:
+                frame = f"builtin pushd {_quote(cwd)} > /dev/null && {{ {frame}; }}"
+            lines = [frame, "__space_rc=$?"]
+            if cwd:
+                lines.append("builtin popd > /dev/null 2>&1")
+            token = self._token.decode()
+            lines.append(f"printf '\\n{token} %d\\n' \"$__space_rc\"")
+            lines.append(f"printf '\\n{token}\\n' >&2")
+            self._write("\n".join(lines) + "\n")
+
+            try:
+                if not self._wait_for_sentinel(timeout):
+                    result.timed_out = True
+                    for sig in (signal.SIGINT, signal.SIGTERM):
+                        self._signal(sig)
+                        if self._wait_for_sentinel(self.INTERRUPT_GRACE):
+                            break
+                    else:
+                        result.restarted = True
+                        self._restart()
+
+                if not result.restarted and not self.is_alive():
+                    # The command exited the shell (e.g. `exit`)
+                    self.process.wait()
+                    self._flush_pending()
+                    result.exit_code = self.process.returncode
+                    result.restarted = True
+                    self.process = None
+            finally:
+                result.elapsed = time.monotonic() - started
+                self._finish()
+            return result
+
+    def log_path(self, log_id: str) -> Optional[str]:
+        """Return the path of a command log kept by this session, if it still exists."""
+        for entry_id, path in self._logs:
+            if entry_id == log_id and os.path.exists(path):
+                return path
+        return None
+
+    def _begin(self, command: str) -> CommandResult:
+        self._counter += 1
+        log_id = f"cmd-{self._counter}"
+        log_path = os.path.join(self._script_dir, f"{log_id}.log")
+        result = CommandResult(log_id, log_path)
+        self._log_file = open(log_path, "wb")
+        self._log_file.write(f"$ {command}\n".encode())
+        self._logs.append((log_id, log_path))
+        while len(self._logs) > self.MAX_LOGS:
+            _, old = self._logs.popleft()
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+        with self._cond:
+            self._current = result
+            # Anything that arrived between commands (e.g. background jobs) goes to this one
+            for name, state in self._streams.items():
+                state["done"] = False
+                self._consume(name, state)
+        return result
+
+    def _finish(self):
+        with self._cond:
+            self._current = None
+        self._log_file.close()
+        self._log_file = None
+
+    def _write(self, data: str):
+        self.process.stdin.write(data.encode())
+        self.process.stdin.flush()
+
+    def _signal(self, sig):
+        try:
+            os.killpg(self.process.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def _restart(self):
+        self._signal(signal.SIGKILL)
+        try:
+            self.process.wait(timeout=1)
+        except Exception:
+            pass
+        self._flush_pending()
+        self.process = None
+        self.start()
+
+    def _flush_pending(self):
+        """Record output held back while looking for a sentinel that will never come."""
+        with self._cond:
+            for name, state in self._streams.items():
+                if not state["done"]:
+                    self._record(name, state["pending"])
+                state["pending"] = b""
+
+    def _pump(self, stream, name: str, streams: dict):
+        state = streams[name]
+        while True:
+            chunk = os.read(stream.fileno(), 65536)
+            with self._cond:
+                if not chunk:
+                    self._cond.notify_all()
+                    return
+                if self._streams is not streams:
+                    return  # Session was restarted; drop output of the old process
+                state["pending"] += chunk
+                if self._current is not None:
+                    self._consume(name, state)
+                self._cond.notify_all()
+
+    def _consume(self, name: str, state: dict):
+        """Move pending bytes into the current capture, stopping at the sentinel."""
+        if state["done"]:
+            return
+        marker = b"\n" + self._token
+        pending = state["pending"]
+        index = pending.find(marker)
+        if index == -1:
+            # Hold back a possible partial marker at the end of the buffer
+            keep = len(marker) - 1
+            if len(pending) > keep:
+                self._record(name, pending[:-keep])
+                state["pending"] = pending[-keep:]
+            return
+        rest = pending[index + len(marker):]
+        if b"\n" not in rest:
+            # Wait for the rest of the sentinel line
+            self._record(name, pending[:index])
+            state["pending"] = pending[index:]
+            return
+        line, _, rest = rest.partition(b"\n")
+        if name == "stdout":
+            try:
+                self._current.exit_code = int(line.strip())
+            except ValueError:
+                self._current.exit_code = -1
+        self._record(name, pending[:index])
+        state["pending"] = rest
+        state["done"] = True
+
+    def _record(self, name: str, data: bytes):
+        result = self._current
+        if not data or result is None:
+            return
+        getattr(result, name).write(data)
+        if self._log_file is not None:
+            self._log_file.write(data)
+            self._log_file.flush()
+        now = time.monotonic()
+        if self.listener is not None and now - self._last_notify >= self.LISTENER_INTERVAL:
+            self._last_notify = now
+            try:
+                self.listener(result.stdout.tail_text() or result.stderr.tail_text())
+            except Exception:
+                pass
+
+    def _frame_complete(self) -> bool:
+        return all(state["done"] for state in self._streams.values())
+
+    def _wait_for_sentinel(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._frame_complete():
+                if not self.is_alive():
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(min(remaining, 0.5))
+            return True
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "'\\''") + "'"
+
+
+def _decode(data: bytes) -> str:
+    return data.decode(errors="replace")
@@ -0,0 +1,164 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Tools a sub-agent may use: reading and searching only, nothing that changes files or runs commands
+SUBAGENT_TOOLS = {
+    "list_files", "read_file", "search_file", "grep_search", "find_files",
+    "get_file_info", "git_status", "git_diff", "git_log",
+}
+
+MAX_SUBAGENTS = 4
+MAX_TURNS = 8
+# Tool output kept in a sub-agent's own history; findings are what the parent sees
+MAX_TOOL_OUTPUT = 6000
+
+SUBAGENT_PROMPT = """You are a read-only research assistant working for another coding agent.
+Investigate the task below in the current repository using the tools you have (you cannot modify anything).
+Be efficient: search first, then read only the relevant parts.
+When you know the answer, reply WITHOUT calling tools, with concise findings (at most about 200 words):
+the facts, the file paths and symbols involved, and anything uncertain. No preamble."""
+
+WRAP_UP = "Stop investigating now and reply with your findings so far, without calling tools."
+
+
+class SubagentResult:
+    """Condensed outcome of one sub-agent run, with its cost."""
+
+    def __init__(self, task: str):
+        self.task = task
+        self.findings = ""
+        self.turns = 0
+        self.tool_calls = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.seconds = 0.0
+        self.error: Optional[str] = None
+
+
+def _field(obj: Any, name: str, default=None):
+    """Read a field from an ollama response object or a plain dict."""
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+def run_subagent(
+    llm,
+    task: str,
+    tools: Dict[str, Callable],
+    tool_definitions: List[Dict],
+    max_turns: int = MAX_TURNS,
+    system_prompt: str = SUBAGENT_PROMPT,
+    check_arguments: Optional[Callable[[str, Any], Tuple[Any, Optional[str]]]] = None,
+) -> SubagentResult:
+    """
+    Run one headless agent loop on task and return its final reply.
+
+    Args:
+        llm: ChatModel (or compatible) used for this sub-agent
+        task: The question to investigate (or step to carry out)
+        tools: Tool functions the sub-agent may call
+        tool_definitions: Schemas for those tools
+        max_turns: Model calls before the sub-agent is told to wrap up
+        system_prompt: Instructions for the sub-agent (read-only research by default)
+        check_arguments: Validates and repairs a call's arguments, returning (arguments, rejection or None)
+    """
+    result = SubagentResult(task)
+    started = time.perf_counter()
+    messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": task}]
+
+    for turn in range(max_turns + 1):
+        wrap_up = turn == max_turns
+        if wrap_up:
+            messages.append({"role": "user", "content": WRAP_UP})
+        response = llm.generate(messages, tools=None if wrap_up else tool_definitions)
+        result.turns += 1
+        if isinstance(response, dict) and "error" in response:
+            result.error = response["error"]
+            break
+        result.prompt_tokens += _field(response, "prompt_eval_count") or 0
+        result.output_tokens += _field(response, "eval_count") or 0
+
+        message = _field(response, "message")
+        content = _field(message, "content") or ""
+        tool_calls = _field(message, "tool_calls") or []
+        messages.append({"role": "assistant", "content": content, "tool_calls": tool_calls} if tool_calls
+                        else {"role": "assistant", "content": content})
+        if not tool_calls:
+            result.findings = content.strip()
+            break
+
+        for call in tool_calls:
+            function = _field(call, "function")
+            name = _field(function, "name")
+            arguments = _field(function, "arguments") or {}
+            result.tool_calls += 1
+            rejection = None
+            if name in tools and check_arguments is not None:
+                arguments, rejection = check_arguments(name, arguments)
+            if name not in tools:
+                output = f"Error: {name} is not available to you"
+            elif rejection is not None:
+                output = f"Error: {rejection}"
+            else:
+                try:
+                    output = str(tools[name](**arguments))
+                except Exception as e:
+                    output = f"Error executing tool: {e}"
+            if len(output) > MAX_TOOL_OUTPUT:
+                output = output[:MAX_TOOL_OUTPUT] + f"\n... [{len(output) - MAX_TOOL_OUTPUT} more characters cut]"
+            messages.append({"role": "tool", "content": output, "name": name})
+
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def delegate(
+    llm_factory: Callable[[], Any],
+    tasks: List[str],
+    tools: Dict[str, Callable],
+    tool_definitions: List[Dict],
+    max_workers: int = MAX_SUBAGENTS,
+    check_arguments: Optional[Callable[[str, Any], Tuple[Any, Optional[str]]]] = None,
+) -> str:
+    """
+    Run one sub-agent per task concurrently and report their condensed findings.
+
+    Args:
+        llm_factory: Returns a fresh ChatModel for each sub-agent
+        tasks: Independent questions to investigate
+        tools: The parent's tool functions (filtered to SUBAGENT_TOOLS)
+        tool_definitions: The parent's tool schemas (filtered likewise)
+        check_arguments: Passed to each run_subagent
+    """
+    if isinstance(tasks, str):
+        tasks = [tasks]
+    tasks = [t.strip() for t in tasks if t and t.strip()]
+    if not tasks:
+        raise ValueError("delegate needs at least one task")
+
+    allowed = {name: fn for name, fn in tools.items() if name in SUBAGENT_TOOLS}
+    definitions = [d for d in tool_definitions if d["function"]["name"] in SUBAGENT_TOOLS]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks)), thread_name_prefix="space-subagent") as pool:
+        results = list(pool.map(lambda task: run_subagent(llm_factory(), task, allowed, definitions,
+                                                          check_arguments=check_arguments), tasks))
+    wall = time.perf_counter() - started
+
+    busy = sum(r.seconds for r in results)
+    prompt = sum(r.prompt_tokens for r in results)
+    output = sum(r.output_tokens for r in results)
+    lines = [
+        f"[delegate: {len(results)} sub-agent(s), {wall:.1f}s wall for {busy:.1f}s of work, "
+        f"{prompt} prompt + {output} output tokens]"
+    ]
+    for number, r in enumerate(results, 1):
+        lines.append(f"\n## {number}. {r.task}")
+        lines.append(f"({r.turns} turns, {r.tool_calls} tool calls, {r.seconds:.1f}s, "
+                     f"{r.prompt_tokens} prompt + {r.output_tokens} output tokens)")
+        if r.error:
+            lines.append(f"Error: {r.error}")
+        lines.append(r.findings or "(no findings)")
+    return "\n".join(lines)
@@ -0,0 +1,413 @@
+import ast
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .repomap import MAX_PARSE_BYTES
+from .results import ToolResult
+from .watcher import IGNORED_DIRS, walk_files
+
+CACHE_VERSION = 1
+
+# A change to any of these can affect every test, so the whole suite runs
+SUITE_FILES = {"pyproject.toml", "setup.py", "setup.cfg", "tox.ini", "pytest.ini", "noxfile.py", "Pipfile.lock",
+               "poetry.lock", "uv.lock"}
+
+# Changed files with these suffixes never affect tests
+DOC_SUFFIXES = (".md", ".rst", ".png", ".jpg", ".jpeg", ".gif", ".svg")
+
+# Lines of a failing shard's output passed back to the model
+MAX_FAILURE_LINES = 60
+
+_PYTEST_COUNTS = re.compile(r"(\d+) (passed|failed|errors?|skipped|xfailed|xpassed)")
+
+
+def is_test_file(path: str) -> bool:
+    """pytest's default test file patterns: test_*.py and *_test.py."""
+    name = os.path.basename(path)
+    return name.endswith(".py") and (name.startswith("test_") or name.endswith("_test.py"))
+
+
+def module_name(path: str) -> str:
+    """Dotted module name of a workspace-relative .py path ("pkg/__init__.py" -> "pkg")."""
+    parts = path[:-3].split("/")
+    if parts[-1] == "__init__":
+        parts.pop()
+    return ".".join(parts)
+
+
+def parse_imports(source: str, path: str) -> Dict:
+    """
+    Modules a file imports, as absolute dotted names.
+
+    "from pkg import name" is recorded as "pkg.name", since name may be a
+    submodule; resolution falls back to "pkg" when it is not. Relative
+    imports are resolved against the file's own package.
+
+    Returns:
+        {"imports": [names], "dynamic": bool}, where dynamic marks files that
+        call importlib.import_module or __import__ and so may import anything.
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return {"imports": [], "dynamic": False}
+
+    package = module_name(path).split(".")
+    if not path.endswith("__init__.py"):
+        package = package[:-1]
+    imports = set()
+    dynamic = False
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = package[:len(package) - node.level + 1] if node.level > 1 else package
+                base = ".".join(base + ([node.module] if node.module else []))
+            else:
+                base = node.module or ""
+            for alias in node.names:
+                imports.add(base if alias.name == "*" else f"{base}.{alias.name}".lstrip("."))
+        elif isinstance(node, ast.Call):
+            func = node.func
+            name = func.attr if isinstance(func, ast.Attribute) else getattr(func, "id", "")
+            if name in ("import_module", "__import__"):
+                dynamic = True
+    imports.discard("")
+    return {"imports": sorted(imports), "dynamic": dynamic}
+
+
+class Selection:
+    """Test files chosen for a set of changed files, or the reason the full suite is needed."""
+
+    def __init__(self, changed: List[str]):
+        self.changed = changed
+        self.tests: List[str] = []
+        self.full_suite: Optional[str] = None
+        self.total_tests = 0
+        # Changed files that cannot affect tests (docs, images)
+        self.ignored: List[str] = []
+
+
+class ShardResult:
+    """Outcome of one pytest process."""
+
+    def __init__(self, index: int, tests: List[str]):
+        self.index = index
+        self.tests = tests
+        self.exit_code: Optional[int] = None
+        self.output = ""
+        self.seconds = 0.0
+        self.timed_out = False
+
+    @property
+    def ok(self) -> bool:
+        # 5 is pytest's "no tests collected"
+        return not self.timed_out and self.exit_code in (0, 5)
+
+    def counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        lines = [line for line in self.output.splitlines() if line.strip()]
+        for line in reversed(lines[-3:]):
+            found = _PYTEST_COUNTS.findall(line)
+            if found:
+                for number, kind in found:
+                    kind = "errors" if kind.startswith("error") else kind
+                    counts[kind] = counts.get(kind, 0) + int(number)
+                break
+        return counts
+
+
+class ImportGraph:
+    """
+    Import dependencies between the workspace's Python files, for picking
+    the tests a change can affect.
+
+    Like RepoMap, parsed files are cached on disk by (size, mtime) and only
+    changed files are parsed again; with a watcher, the file list comes from
+    its snapshot instead of a walk. Import names are resolved to files when
+    the reverse graph is built, so a new module is picked up by the files
+    that already import it without re-parsing them.
+    """
+
+    def __init__(self, root: str = ".", watcher=None, cache_path: Optional[str] = None):
+        self.root = os.path.abspath(root)
+        self.watcher = watcher
+        self.cache_path = cache_path or os.path.join(self.root, ".space", "imports.json")
+        # rel path -> {"stat": [size, mtime_ns], "imports": [...], "dynamic": bool}
+        self.entries: Dict[str, Dict] = {}
+        # rel path -> files that import it, rebuilt when entries change
+        self._dependents: Optional[Dict[str, Set[str]]] = None
+        self._lock = threading.Lock()
+        self._load_cache()
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == CACHE_VERSION:
+            self.entries = data.get("files", {})
+
+    def _save_cache(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp = self.cache_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"version": CACHE_VERSION, "files": self.entries}, f, separators=(",", ":"))
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            pass
+
+    def _current_files(self) -> Dict[str, Tuple[int, int]]:
+        if self.watcher is not None and self.watcher.ready.is_set():
+            return self.watcher.snapshot()
+        return walk_files(self.root)
+
+    def refresh(self) -> int:
+        """Bring entries up to date with the tree; returns how many files were parsed."""
+        with self._lock:
+            parsed = 0
+            entries = {}
+            for path, (size, mtime) in self._current_files().items():
+                if not path.endswith(".py"):
+                    continue
+                stat = [size, mtime]
+                entry = self.entries.get(path)
+                if entry is None or entry["stat"] != stat:
+                    entry = {"stat": stat, "imports": [], "dynamic": False}
+                    if size <= MAX_PARSE_BYTES:
+                        try:
+                            with open(os.path.join(self.root, path), encoding="utf-8", errors="replace") as f:
+                                entry.update(parse_imports(f.read(), path))
+                        except OSError:
+                            continue
+                    parsed += 1
+                entries[path] = entry
+            if parsed or entries.keys() != self.entries.keys():
+                self.entries = entries
+                self._dependents = None
+                self._save_cache()
+            return parsed
+
+    def _index(self) -> Dict[str, str]:
+        """Module name -> file, with src-layout packages also under their import name."""
+        index = {}
+        for path in self.entries:
+            name = module_name(path)
+            index[name] = path
+            if name.startswith("src."):
+                index.setdefault(name[4:], path)
+        return index
+
+    def _resolve(self, name: str, importer: str, index: Dict[str, str]) -> List[str]:
+        """Files an import of name loads: the module and its parent packages' __init__."""
+        # Absolute first, then next to the importer (pytest puts test directories on sys.path)
+        directory = os.path.dirname(importer).replace("/", ".")
+        for candidate in (name, f"{directory}.{name}" if directory else None):
+            if candidate is None:
+                continue
+            parts = candidate.split(".")
+            for end in range(len(parts), 0, -1):
+                target = index.get(".".join(parts[:end]))
+                if target is not None:
+                    files = [target]
+                    files += [index[p] for p in (".".join(parts[:i]) for i in range(1, end)) if p in index]
+                    return files
+        return []
+
+    def dependents(self) -> Dict[str, Set[str]]:
+        with self._lock:
+            if self._dependents is None:
+                index = self._index()
+                dependents = defaultdict(set)
+                for path, entry in self.entries.items():
+                    for name in entry["imports"]:
+                        for target in self._resolve(name, path, index):
+                            if target != path:
+                                dependents[target].add(path)
+                self._dependents = dependents
+            return self._dependents
+
+    def _importers_of(self, path: str) -> List[str]:
+        """Files whose imports name the module at path, for modules no longer in the graph."""
+        module = module_name(path)
+        names = {module, module[4:] if module.startswith("src.") else module}
+        directory = os.path.dirname(path)
+        importers = []
+        for importer, entry in self.entries.items():
+            # Files next to the module can import it by its bare name
+            candidates = names | {module.rsplit(".", 1)[-1]} if os.path.dirname(importer) == directory else names
+            prefixes = tuple(c + "." for c in candidates)
+            if any(n in candidates or n.startswith(prefixes) for n in entry["imports"]):
+                importers.append(importer)
+        return importers
+
+    def test_files(self) -> List[str]:
+        return sorted(path for path in self.entries if is_test_file(path))
+
+    def select(self, changed: Iterable[str]) -> Selection:
+        """Work out which test files the changed (workspace-relative) files can affect."""
+        self.refresh()
+        selection = Selection(sorted(set(changed)))
+        all_tests = self.test_files()
+        selection.total_tests = len(all_tests)
+        if not all_tests:
+            selection.full_suite = "no test_*.py or *_test.py files found"
+            return selection
+
+        changed_py = []
+        for path in selection.changed:
+            name = os.path.basename(path)
+            if path.startswith(os.pardir) or IGNORED_DIRS.intersection(path.split("/")[:-1]):
+                selection.ignored.append(path)
+            elif path.endswith(".py") and path not in self.entries:
+                # A deleted module breaks the files that still import it
+                importers = self._importers_of(path)
+                if not importers:
+                    selection.ignored.append(path)
+                changed_py.extend(importers)
+            elif path.endswith(".py"):
+                changed_py.append(path)
+            elif name in SUITE_FILES or name.startswith("requirements"):
+                selection.full_suite = f"{path} affects the whole suite"
+                return selection
+            elif path.endswith(DOC_SUFFIXES):
+                selection.ignored.append(path)
+            else:
+                # Data and config files can be read by any test
+                selection.full_suite = f"{path} is not Python, so its users are unknown"
+                return selection
+        if not changed_py:
+            return selection
+
+        dependents = self.dependents()
+        affected = set(changed_py)
+        queue = deque(changed_py)
+        while queue:
+            for dependent in dependents.get(queue.popleft(), ()):
+                if dependent not in affected:
+                    affected.add(dependent)
+                    queue.append(dependent)
+
+        tests = {path for path in affected if is_test_file(path)}
+        for path in affected:
+            if os.path.basename(path) == "conftest.py":
+                # Fixtures apply to every test at or below the conftest's directory
+                prefix = os.path.dirname(path)
+                tests.update(t for t in all_tests if not prefix or t.startswith(prefix + "/"))
+        # Tests that import modules by name at runtime may depend on anything
+        tests.update(t for t in all_tests if self.entries[t]["dynamic"])
+        selection.tests = sorted(tests)
+        return selection
+
+
+def shard(tests: List[str], shards: int, root: str) -> List[List[str]]:
+    """Split test files into shards of similar total size, largest files first."""
+    def size(path):
+        try:
+            return os.path.getsize(os.path.join(root, path))
+        except OSError:
+            return 0
+
+    shards = max(1, min(shards, len(tests)))
+    buckets: List[List[str]] = [[] for _ in range(shards)]
+    loads = [0] * shards
+    for path in sorted(tests, key=size, reverse=True):
+        lightest = loads.index(min(loads))
+        buckets[lightest].append(path)
+        loads[lightest] += size(path) or 1
+    return buckets
+
+
+def _run_shard(result: ShardResult, root: str, timeout: int) -> ShardResult:
+    command = [sys.executable, "-m", "pytest", "-q", "-rfE", "--tb=short"] + result.tests
+    started = time.perf_counter()
+    try:
+        process = subprocess.run(command, cwd=root, capture_output=True, text=True, errors="replace", timeout=timeout)
+        result.exit_code = process.returncode
+        result.output = process.stdout + process.stderr
+    except subprocess.TimeoutExpired as e:
+        result.timed_out = True
+        output = e.stdout or ""
+        result.output = output.decode(errors="replace") if isinstance(output, bytes) else output
+    except OSError as e:
+        result.exit_code = -1
+        result.output = str(e)
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def run_tests(tests: List[str], root: str = ".", shards: int = 1, timeout: int = 300) -> List[ShardResult]:
+    """
+    Run pytest over the test files, split across parallel processes.
+
+    An empty list runs pytest's own discovery in one process. Each shard gets
+    the full timeout.
+    """
+    root = os.path.abspath(root)
+    groups = shard(tests, shards, root) if tests else [[]]
+    results = [ShardResult(i, group) for i, group in enumerate(groups)]
+    if len(results) == 1:
+        return [_run_shard(results[0], root, timeout)]
+    with ThreadPoolExecutor(max_workers=len(results), thread_name_prefix="space-tests") as pool:
+        return list(pool.map(lambda r: _run_shard(r, root, timeout), results))
+
+
+def run_affected(graph: ImportGraph, changed: Iterable[str], shards: int = 1, timeout: int = 300,
+                 full: bool = False) -> ToolResult:
+    """Select the tests the changed files can affect, run them and report the outcome."""
+    started = time.perf_counter()
+    selection = graph.select(changed)
+    if full:
+        selection.full_suite = "requested"
+    if selection.full_suite is None and not selection.tests:
+        changed_text = ", ".join(selection.changed) or "none"
+        # serialize() sends the payload alone, so it carries the verdict too
+        return ToolResult.success(f"no tests affected by the changes (changed: {changed_text})",
+                                  summary="no tests affected by the changes", selected=0, total=selection.total_tests)
+
+    if selection.full_suite is not None:
+        # Shard over every known test file; without any, let pytest discover the suite
+        tests = graph.test_files() if shards > 1 else []
+        header = f"Full suite ({selection.full_suite})"
+    else:
+        tests = selection.tests
+        header = (f"{len(tests)} of {selection.total_tests} test files affected by "
+                  f"{', '.join(selection.changed)}: {', '.join(tests)}")
+    results = run_tests(tests, graph.root, shards=shards, timeout=timeout)
+
+    totals: Dict[str, int] = {}
+    for result in results:
+        for kind, number in result.counts().items():
+            totals[kind] = totals.get(kind, 0) + number
+    lines = [header]
+    for result in results:
+        if result.ok:
+            continue
+        output = result.output.splitlines()[-MAX_FAILURE_LINES:]
+        status = f"timed out after {timeout}s" if result.timed_out else f"exit code {result.exit_code}"
+        if len(results) > 1:
+            lines.append(f"--- shard {result.index + 1} ({status}): {', '.join(result.tests)}")
+        else:
+            lines.append(f"--- {status}")
+        lines.extend(output)
+
+    counts = ", ".join(f"{number} {kind}" for kind, number in totals.items()) or "no results"
+    seconds = time.perf_counter() - started
+    scope = "full suite" if selection.full_suite is not None else f"{len(tests)} of {selection.total_tests} test files"
+    summary = f"{counts} ({scope}, {seconds:.1f}s" + (f", {len(results)} shards)" if len(results) > 1 else ")")
+    data = {"selected": len(tests) if selection.full_suite is None else selection.total_tests,
+            "total": selection.total_tests, "full_suite": selection.full_suite}
+    if all(result.ok for result in results):
+        return ToolResult.success(f"{summary}\n{header}", summary=summary, **data)
+    return ToolResult.failure(summary, "\n".join(lines), **data)
@@ -1,29 +1,44 @@
 import os
 import subprocess
 import re
+import shlex
 import shutil
+import threading
 from pathlib import Path
+from typing import Optional
 
+from . import vcs
+from .quality import verify_files, format_report
+from .results import ToolResult
+from .shell import ShellSession
 
-def list_files(path: str = ".") -> str:
+
+def _lines(text: str) -> int:
+    return text.count("\n") + (1 if text and not text.endswith("\n") else 0)
+
+
+def list_files(path: str = ".") -> ToolResult:
     """List files in a directory."""
     try:
         files = os.listdir(path)
-        return "\n".join(files)
+        if not files:
+            return ToolResult.success(summary="empty directory")
+        return ToolResult.success("\n".join(files), count=len(files))
     except Exception as e:
-        return f"Error listing files: {e}"
+        return ToolResult.failure(f"cannot list {path}: {e}")
 
 
-def read_file(path: str) -> str:
+def read_file(path: str) -> ToolResult:
     """Read the content of a file."""
     try:
         with open(path, "r") as f:
-            return f.read()
+            content = f.read()
+        return ToolResult.success(content, summary="" if content else "empty file", lines=_lines(content))
     except Exception as e:
-        return f"Error reading file: {e}"
+        return ToolResult.failure(f"cannot read {path}: {e}")
 
 
-def write_file(path: str, content: str) -> str:
+def write_file(path: str, content: str) -> ToolResult:
     """
     Write content to a file, creating parent directories if needed.
     
@@ -39,15 +54,15 @@ def write_file(path: str, content: str) -> str:
         
         with open(path, "w") as f:
             f.write(content)
-        return f"Successfully wrote to {path}"
+        return ToolResult.success(summary=f"wrote {_lines(content)} lines", path=path)
     except PermissionError:
-        return f"Error: Permission denied writing to {path}"
+        return ToolResult.failure(f"permission denied writing {path}")
     except Exception as e:
-        return f"Error writing file: {e}"
+        return ToolResult.failure(f"cannot write {path}: {e}")
 
 
 
-def edit_file(path: str, old_text: str, new_text: str) -> str:
+def edit_file(path: str, old_text: str, new_text: str) -> ToolResult:
     """
     Replace old_text with new_text in a file.
     
@@ -59,72 +74,132 @@ def edit_file(path: str, old_text: str, new_text: str) -> str:
     try:
         # Check if file exists
         if not os.path.exists(path):
-            return f"Error: File '{path}' does not exist"
+            return ToolResult.failure(f"{path} does not exist")
         
         # Check if file is readable
         if not os.access(path, os.R_OK):
-            return f"Error: No read permission for '{path}'"
+            return ToolResult.failure(f"no read permission for {path}")
         
         with open(path, "r") as f:
             content = f.read()
 
-        if old_text not in content:
-            return f"Error: old_text not found in file. Make sure the text matches exactly."
+        count = content.count(old_text) if old_text else 0
+        if not count:
+            return ToolResult.failure("old_text not found in file; it must match exactly")
 
         new_content = content.replace(old_text, new_text)
 
         with open(path, "w") as f:
             f.write(new_content)
 
-        return f"Successfully edited {path}"
+        return ToolResult.success(summary=f"replaced {count} occurrence{'s' if count > 1 else ''}", path=path)
     except PermissionError:
-        return f"Error: Permission denied editing '{path}'"
+        return ToolResult.failure(f"permission denied editing {path}")
     except Exception as e:
-        return f"Error editing file: {e}"
+        return ToolResult.failure(f"cannot edit {path}: {e}")
+
+
+_shell_session = None
+# Per-thread override, so server sessions chatting in parallel each use their own shell
+_thread_shell = threading.local()
+
+
+def get_shell_session() -> ShellSession:
+    """Return the shell session used by run_command, starting one if needed."""
+    global _shell_session
+    bound = getattr(_thread_shell, "session", None)
+    if bound is not None:
+        return bound
+    if _shell_session is None:
+        _shell_session = ShellSession()
+    return _shell_session
+
 
+def set_shell_session(session: ShellSession):
+    """Make run_command (and the git/pip helpers) use the given shell session."""
+    global _shell_session
+    _shell_session = session
 
-def run_command(command: str, cwd: str = None) -> str:
+
+def bind_shell_session(session: Optional[ShellSession]):
+    """Use session for tool calls made from the current thread (None to unbind)."""
+    _thread_shell.session = session
+
+
+def run_command(command: str, cwd: str = None, timeout: int = 60) -> ToolResult:
     """
-    Run a shell command using bash.
-    
+    Run a shell command in a persistent bash session.
+
+    The session keeps its working directory, exported variables and activated
+    virtualenvs between calls. Output is captured incrementally; large outputs
+    are summarized as head and tail, with the full log available through
+    read_command_log.
+
     Args:
         command: The shell command to execute
-        cwd: Optional working directory (defaults to current directory)
+        cwd: Optional working directory for this command only
+        timeout: Seconds before the command is interrupted (the session survives)
     """
     try:
         # Validate working directory if provided
         if cwd and not os.path.isdir(cwd):
-            return f"Error: Working directory '{cwd}' does not exist"
-        
-        result = subprocess.run(
-            command,
-            shell=True,
-            executable='/bin/bash',  # Use bash instead of sh
-            capture_output=True,
-            text=True,
-            timeout=60,
-            cwd=cwd
-        )
-        
+            return ToolResult.failure(f"working directory {cwd} does not exist")
+
+        result = get_shell_session().run(command, cwd=cwd, timeout=timeout)
+
         output = ""
-        if result.stdout:
-            output += result.stdout
-        if result.stderr:
-            output += f"\nStderr: {result.stderr}"
-        
-        if not output.strip():
-            return f"Command completed with exit code {result.returncode} (no output)"
-        
-        return output
-    except subprocess.TimeoutExpired:
-        return "Error: Command timed out after 60 seconds"
+        if result.stdout.total:
+            output += result.stdout.summary()
+        if result.stderr.total:
+            output += f"\nStderr: {result.stderr.summary()}"
+
+        if result.timed_out or result.truncated:
+            output += (
+                f"\n[{result.elapsed:.1f}s, {result.total_bytes} bytes of output; full log: "
+                f"read_command_log(log_id=\"{result.log_id}\")]"
+            )
+        output = output.lstrip("\n")
+        data = {"exit_code": result.exit_code, "log_id": result.log_id}
+        if result.timed_out:
+            restarted = " (shell session was restarted)" if result.restarted else ""
+            return ToolResult.failure(f"timed out after {timeout}s and was interrupted{restarted}", output, **data)
+        if result.exit_code:
+            return ToolResult.failure(f"exit code {result.exit_code}", output, **data)
+        return ToolResult.success(output, summary="" if output.strip() else "no output", **data)
     except Exception as e:
-        return f"Error running command: {e}"
+        return ToolResult.failure(f"cannot run command: {e}")
+
+
+def read_command_log(log_id: str, start_line: int = 1, num_lines: int = 200) -> ToolResult:
+    """
+    Read part of the full output log of an earlier run_command call.
 
+    Args:
+        log_id: Log handle reported by run_command (e.g. "cmd-3")
+        start_line: First line to return (1-based; negative counts from the end)
+        num_lines: Maximum number of lines to return
+    """
+    try:
+        path = get_shell_session().log_path(log_id)
+        if path is None:
+            return ToolResult.failure(f"no command log {log_id!r} (logs are kept for the last {ShellSession.MAX_LOGS} commands)")
+
+        with open(path, "r", errors="replace") as f:
+            lines = f.read().splitlines()
+
+        if start_line < 0:
+            start_line = max(len(lines) + start_line + 1, 1)
+        start_line = max(start_line, 1)
+        chunk = lines[start_line - 1:start_line - 1 + num_lines]
+        end_line = start_line + len(chunk) - 1
+        header = f"[{log_id}: lines {start_line}-{end_line} of {len(lines)}]"
+        return ToolResult.success(header + "\n" + "\n".join(chunk))
+    except Exception as e:
+        return ToolResult.failure(f"cannot read command log: {e}")
 
 
 # Search and Analysis Tools
-def search_file(path: str, pattern: str, use_regex: bool = False) -> str:
+def search_file(path: str, pattern: str, use_regex: bool = False) -> ToolResult:
     """Search for a pattern in a file."""
     try:
         with open(path, "r") as f:
@@ -136,20 +211,24 @@ def search_file(path: str, pattern: str, use_regex: bool = False) -> str:
         for i, line in enumerate(lines, 1):
             if use_regex:
                 if re.search(pattern, line):
-                    matches.append(f"Line {i}: {line}")
+                    matches.append(f"{i}: {line}")
             else:
                 if pattern in line:
-                    matches.append(f"Line {i}: {line}")
+                    matches.append(f"{i}: {line}")
 
         if matches:
-            return "\n".join(matches)
+            return ToolResult.success("\n".join(matches), count=len(matches))
         else:
-            return f"No matches found for '{pattern}' in {path}"
+            return ToolResult.success(summary="no matches", count=0)
     except Exception as e:
-        return f"Error searching file: {e}"
+        return ToolResult.failure(f"cannot search {path}: {e}")
+
+
+# Matches grep_search returns; the rest are counted in the result
+MAX_GREP_MATCHES = 50
 
 
-def grep_search(directory: str, pattern: str, file_pattern: str = "*") -> str:
+def grep_search(directory: str, pattern: str, file_pattern: str = "*") -> ToolResult:
     """Search for a pattern across multiple files in a directory."""
     try:
         matches = []
@@ -166,14 +245,16 @@ def grep_search(directory: str, pattern: str, file_pattern: str = "*") -> str:
                     continue
 
         if matches:
-            return "\n".join(matches[:50])  # Limit to 50 matches
+            return ToolResult.success("\n".join(matches[:MAX_GREP_MATCHES]),
+                                      truncated=max(len(matches) - MAX_GREP_MATCHES, 0),
+                                      unit="matches", count=len(matches))
         else:
-            return f"No matches found for '{pattern}' in {directory}"
+            return ToolResult.success(summary="no matches", count=0)
     except Exception as e:
-        return f"Error searching directory: {e}"
+        return ToolResult.failure(f"cannot search {directory}: {e}")
 
 
-def find_files(directory: str, name_pattern: str) -> str:
+def find_files(directory: str, name_pattern: str) -> ToolResult:
     """Find files by name pattern."""
     try:
         search_path = Path(directory)
@@ -183,114 +264,210 @@ def find_files(directory: str, name_pattern: str) -> str:
             matches.append(str(file_path))
 
         if matches:
-            return "\n".join(matches)
+            return ToolResult.success("\n".join(matches), count=len(matches))
         else:
-            return f"No files found matching '{name_pattern}' in {directory}"
+            return ToolResult.success(summary="no files found", count=0)
     except Exception as e:
-        return f"Error finding files: {e}"
+        return ToolResult.failure(f"cannot search {directory}: {e}")
 
 
 # Advanced File Operations
-def delete_file(path: str) -> str:
+def delete_file(path: str) -> ToolResult:
     """Delete a file."""
     try:
         os.remove(path)
-        return f"Successfully deleted {path}"
+        return ToolResult.success(summary="deleted", path=path)
     except Exception as e:
-        return f"Error deleting file: {e}"
+        return ToolResult.failure(f"cannot delete {path}: {e}")
 
 
-def create_directory(path: str) -> str:
+def create_directory(path: str) -> ToolResult:
     """Create a new directory."""
     try:
         os.makedirs(path, exist_ok=True)
-        return f"Successfully created directory {path}"
+        return ToolResult.success(summary="created", path=path)
     except Exception as e:
-        return f"Error creating directory: {e}"
+        return ToolResult.failure(f"cannot create {path}: {e}")
 
 
-def move_file(source: str, destination: str) -> str:
+def move_file(source: str, destination: str) -> ToolResult:
     """Move or rename a file."""
     try:
         shutil.move(source, destination)
-        return f"Successfully moved {source} to {destination}"
+        return ToolResult.success(summary="moved", path=destination)
     except Exception as e:
-        return f"Error moving file: {e}"
+        return ToolResult.failure(f"cannot move {source}: {e}")
 
 
-def copy_file(source: str, destination: str) -> str:
+def copy_file(source: str, destination: str) -> ToolResult:
     """Copy a file."""
     try:
         shutil.copy2(source, destination)
-        return f"Successfully copied {source} to {destination}"
+        return ToolResult.success(summary="copied", path=destination)
     except Exception as e:
-        return f"Error copying file: {e}"
+        return ToolResult.failure(f"cannot copy {source}: {e}")
 
 
-def append_to_file(path: str, content: str) -> str:
+def append_to_file(path: str, content: str) -> ToolResult:
     """Append content to a file."""
     try:
         with open(path, "a") as f:
             f.write(content)
-        return f"Successfully appended to {path}"
+        return ToolResult.success(summary=f"appended {_lines(content)} lines", path=path)
     except Exception as e:
-        return f"Error appending to file: {e}"
+        return ToolResult.failure(f"cannot append to {path}: {e}")
 
 
-def get_file_info(path: str) -> str:
+def get_file_info(path: str) -> ToolResult:
     """Get file metadata."""
     try:
+        import datetime
+
         stat = os.stat(path)
-        info = f"Path: {path}\n"
-        info += f"Size: {stat.st_size} bytes\n"
-        info += f"Modified: {stat.st_mtime}\n"
-        info += f"Is Directory: {os.path.isdir(path)}\n"
-        return info
+        kind = "directory" if os.path.isdir(path) else "file"
+        modified = datetime.datetime.fromtimestamp(stat.st_mtime).isoformat(timespec="seconds")
+        return ToolResult.success(f"{kind}, {stat.st_size} bytes, modified {modified}",
+                                  size=stat.st_size, mtime=stat.st_mtime, is_dir=kind == "directory")
     except Exception as e:
-        return f"Error getting file info: {e}"
+        return ToolResult.failure(f"cannot stat {path}: {e}")
 
 
 # Git Integration
-def git_status() -> str:
-    """Get git status."""
-    return run_command("git status")
+def _git_cwd() -> str:
+    # Git runs where the shell session is, so `cd` in run_command carries over
+    return get_shell_session().cwd
 
 
-def git_diff(file_path: str = "") -> str:
-    """Show git diff."""
-    if file_path:
-        return run_command(f"git diff {file_path}")
-    return run_command("git diff")
+def git_status() -> ToolResult:
+    """Get git status (branch, staged, unstaged, untracked and conflicted files)."""
+    try:
+        info = vcs.status(cwd=_git_cwd())
+
+        branch = f"On branch {info['branch']}"
+        if info["upstream"]:
+            branch += f" (upstream {info['upstream']}, ahead {info['ahead']}, behind {info['behind']})"
+        lines = [branch]
+        for label in ("staged", "unstaged"):
+            if info[label]:
+                entries = ", ".join(f"{code} {path}" for code, path in info[label])
+                lines.append(f"{label.capitalize()} ({len(info[label])}): {entries}")
+        for label in ("untracked", "conflicts"):
+            if info[label]:
+                lines.append(f"{label.capitalize()} ({len(info[label])}): {', '.join(info[label])}")
+        if len(lines) == 1:
+            lines.append("Working tree clean")
+        return ToolResult.success("\n".join(lines))
+    except Exception as e:
+        return ToolResult.failure(f"git status failed: {e}")
+
 
+def git_diff(file_path: str = "", staged: bool = False, hunk: int = None) -> ToolResult:
+    """
+    Show git diff. Large diffs are paged: without file_path a per-file summary is
+    returned, and a single file's diff can be read one hunk at a time.
 
-def git_log(num_commits: int = 10) -> str:
+    Args:
+        file_path: Optional file to diff
+        staged: Diff the index against HEAD instead of the working tree
+        hunk: 1-based hunk number to show (requires file_path)
+    """
+    try:
+        cwd = _git_cwd()
+        rows = vcs.numstat(file_path, staged=staged, cwd=cwd)
+        if not rows:
+            return ToolResult.success(summary="no staged changes" if staged else "no unstaged changes")
+
+        changed = sum(int(a) + int(d) for a, d, _ in rows if a != "-")
+        if not file_path:
+            if changed <= vcs.MAX_DIFF_LINES:
+                args = ["diff", "--cached"] if staged else ["diff"]
+                return ToolResult.success(vcs.run_git(args, cwd=cwd))
+            added = sum(int(a) for a, _, _ in rows if a != "-")
+            deleted = sum(int(d) for _, d, _ in rows if d != "-")
+            lines = [f"{len(rows)} files changed (+{added} -{deleted}); diff too large to show at once:"]
+            lines += [f"  +{a} -{d} {path}" for a, d, path in rows]
+            lines.append("Call git_diff with file_path (and optionally hunk) to see changes.")
+            return ToolResult.success("\n".join(lines))
+
+        header, hunks = vcs.diff_hunks(file_path, staged=staged, cwd=cwd)
+        if hunk is not None:
+            if not 1 <= hunk <= len(hunks):
+                return ToolResult.failure(f"{file_path} has {len(hunks)} hunks, hunk {hunk} does not exist")
+            return ToolResult.success(f"[hunk {hunk}/{len(hunks)} of {file_path}]\n" + "\n".join(hunks[hunk - 1]))
+
+        if sum(len(h) for h in hunks) <= vcs.MAX_DIFF_LINES:
+            return ToolResult.success("\n".join(header + [line for h in hunks for line in h]))
+
+        # Show whole hunks until the budget runs out, then list the rest
+        lines = list(header)
+        budget = vcs.MAX_DIFF_LINES
+        shown = 0
+        for h in hunks:
+            if len(h) > budget:
+                if not shown:
+                    lines.extend(h[:budget])
+                    lines.append(f"[hunk 1 truncated: {len(h) - budget} more lines]")
+                    shown = 1
+                break
+            lines.extend(h)
+            budget -= len(h)
+            shown += 1
+        if shown < len(hunks):
+            lines.append(f"[{len(hunks) - shown} more hunks of {len(hunks)}:]")
+            for number, h in enumerate(hunks[shown:], shown + 1):
+                lines.append(f"  hunk {number}: {h[0]} ({len(h) - 1} lines)")
+            lines.append("Call git_diff with file_path and hunk=N to see a hunk.")
+        return ToolResult.success("\n".join(lines))
+    except Exception as e:
+        return ToolResult.failure(f"git diff failed: {e}")
+
+
+def git_log(num_commits: int = 10) -> ToolResult:
     """View git commit history."""
-    return run_command(f"git log -n {num_commits} --oneline")
+    try:
+        commits = vcs.log(num_commits, cwd=_git_cwd())
+        if not commits:
+            return ToolResult.success(summary="no commits yet")
+        return ToolResult.success("\n".join(f"{c['hash']} {c['date']} {c['author']}: {c['subject']}" for c in commits))
+    except Exception as e:
+        return ToolResult.failure(f"git log failed: {e}")
 
 
-def git_commit(message: str) -> str:
+def git_commit(message: str) -> ToolResult:
     """Commit staged changes."""
-    return run_command(f'git commit -m "{message}"')
+    try:
+        output = vcs.commit(message, cwd=_git_cwd())
+        # First line is "[branch hash] subject", second the change stats
+        return ToolResult.success("\n".join(output.strip().splitlines()[:2]))
+    except Exception as e:
+        return ToolResult.failure(f"commit failed: {e}")
 
 
-def git_add(file_path: str) -> str:
-    """Stage a file for commit."""
-    return run_command(f"git add {file_path}")
+def git_add(file_path: str) -> ToolResult:
+    """Stage one or more files (space separated) for commit."""
+    try:
+        paths = shlex.split(file_path)
+        if not paths:
+            return ToolResult.failure("no file path given")
+        vcs.add(paths, cwd=_git_cwd())
+        return ToolResult.success(summary=f"staged {', '.join(paths)}")
+    except Exception as e:
+        return ToolResult.failure(f"staging failed: {e}")
 
 
 # Package Management
-def install_package(package_name: str) -> str:
+def install_package(package_name: str) -> ToolResult:
     """Install a Python package using pip."""
     return run_command(f"pip install {package_name}")
 
 
-def list_installed_packages() -> str:
+def list_installed_packages() -> ToolResult:
     """List installed Python packages."""
     return run_command("pip list")
 
 
 # Code Quality Tools
-def check_syntax(path: str) -> str:
+def check_syntax(path: str) -> ToolResult:
     """
     Check Python file for syntax errors using ast.parse().
     Fast validation without external dependencies.
@@ -303,14 +480,15 @@ def check_syntax(path: str) -> str:
 
         try:
             ast.parse(code)
-            return f"✓ Syntax check passed for {path}"
+            return ToolResult.success(summary="syntax ok")
         except SyntaxError as e:
-            return f"✗ Syntax error in {path}:\n  Line {e.lineno}: {e.msg}\n  {e.text}"
+            return ToolResult.failure(f"syntax error at line {e.lineno}: {e.msg}", (e.text or "").rstrip(),
+                                      line=e.lineno)
     except Exception as e:
-        return f"Error checking syntax: {e}"
+        return ToolResult.failure(f"cannot check {path}: {e}")
 
 
-def lint_file(path: str, fix: bool = False) -> str:
+def lint_file(path: str, fix: bool = False) -> ToolResult:
     """
     Lint a Python file using ruff.
     Checks for style issues, bugs, and errors.
@@ -321,16 +499,14 @@ def lint_file(path: str, fix: bool = False) -> str:
     """
     try:
         if not os.path.exists(path):
-            return f"Error: File {path} does not exist"
+            return ToolResult.failure(f"{path} does not exist")
 
         # Run ruff check
-        cmd = f"ruff check {path}"
+        cmd = ["ruff", "check", path]
         if fix:
-            cmd += " --fix"
+            cmd.append("--fix")
 
-        result = subprocess.run(
-            cmd, shell=True, capture_output=True, text=True, timeout=30
-        )
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
 
         output = result.stdout
         if result.stderr:
@@ -338,44 +514,74 @@ def lint_file(path: str, fix: bool = False) -> str:
 
         if result.returncode == 0:
             if fix:
-                return f"✓ Linting passed and fixes applied for {path}\n{output}"
+                return ToolResult.success(output.strip(), summary="fixes applied, no issues left")
             else:
-                return f"✓ No linting issues found in {path}"
+                return ToolResult.success(summary="no lint issues")
         else:
-            return f"Linting issues found in {path}:\n{output}"
+            return ToolResult.failure("lint issues found", output.strip())
     except Exception as e:
-        return f"Error linting file: {e}"
+        return ToolResult.failure(f"cannot lint {path}: {e}")
 
 
-def format_file(path: str) -> str:
+def format_file(path: str) -> ToolResult:
     """
     Format a Python file using ruff.
     Applies PEP 8 and best practice formatting.
     """
     try:
         if not os.path.exists(path):
-            return f"Error: File {path} does not exist"
+            return ToolResult.failure(f"{path} does not exist")
 
         # Run ruff format
         result = subprocess.run(
-            f"ruff format {path}",
-            shell=True,
+            ["ruff", "format", path],
             capture_output=True,
             text=True,
             timeout=30,
         )
 
         if result.returncode == 0:
-            return f"✓ Successfully formatted {path}"
+            return ToolResult.success(summary="formatted")
         else:
             error_msg = result.stderr or result.stdout
-            return f"Error formatting {path}:\n{error_msg}"
+            return ToolResult.failure("ruff format failed", error_msg.strip())
+    except Exception as e:
+        return ToolResult.failure(f"cannot format {path}: {e}")
+
+
+def check_files(paths, lint: bool = True, fix: bool = False, format: bool = False) -> ToolResult:
+    """
+    Check many Python files in one pass: parallel syntax check, then a single
+    ruff lint run and (optionally) a single ruff format run over all of them.
+
+    Args:
+        paths: Paths, globs or directories (list, or whitespace/comma separated string)
+        lint: Run ruff check
+        fix: Let ruff fix lint issues where possible
+        format: Run ruff format before linting
+    """
+    try:
+        report = verify_files(paths, lint=lint, fix=fix, format=format)
+        text = format_report(report)
+        problems = []
+        if report["syntax"]:
+            problems.append(f"{len(report['syntax'])} file(s) with syntax errors")
+        if report["lint"]:
+            n_lint = sum(len(issues) for issues in report["lint"].values())
+            problems.append(f"{n_lint} lint issue(s) in {len(report['lint'])} file(s)")
+        problems.extend(report["errors"])
+        if problems:
+            # The summary carries the headline's counts and the errors; the payload keeps the per-file lines
+            repeated = {f"Error: {error}" for error in report["errors"]}
+            details = [line for line in text.splitlines()[1:] if line not in repeated]
+            return ToolResult.failure("; ".join(problems), "\n".join(details))
+        return ToolResult.success(text)
     except Exception as e:
-        return f"Error formatting file: {e}"
+        return ToolResult.failure(f"cannot check files: {e}")
 
 
 # Code Execution Sandbox
-def python_repl(code: str) -> str:
+def python_repl(code: str) -> ToolResult:
     """
     Execute Python code in a safe sandbox environment.
     Captures stdout/stderr and enforces a timeout.
@@ -405,13 +611,14 @@ def python_repl(code: str) -> str:
                     "success": True,
                 }
             )
-        except Exception:
+        except Exception as e:
             import traceback
 
             queue.put(
                 {
                     "stdout": stdout_capture.getvalue(),
-                    "stderr": traceback.format_exc(),
+                    # Skip this wrapper's frame; only the user's code is relevant
+                    "stderr": "".join(traceback.format_exception(type(e), e, e.__traceback__.tb_next)),
                     "success": False,
                 }
             )
@@ -427,22 +634,28 @@ def python_repl(code: str) -> str:
         if process.is_alive():
             process.terminate()
             process.join()
-            return "Error: Code execution timed out (limit: 5 seconds)"
+            return ToolResult.failure("code execution timed out (limit: 5 seconds)")
 
         if not queue.empty():
             result = queue.get()
-            output = ""
-            if result["stdout"]:
-                output += f"Output:\n{result['stdout']}\n"
+            output = result["stdout"]
             if result["stderr"]:
-                output += f"Errors:\n{result['stderr']}\n"
-
-            if not output:
-                output = "Code executed successfully (no output)"
+                output += f"stderr:\n{result['stderr']}"
+            output = output.rstrip("\n")
 
-            return output
+            if not result["success"]:
+                return ToolResult.failure("exception raised", output)
+            return ToolResult.success(output, summary="" if output else "no output")
         else:
-            return "Error: Process finished but returned no result"
+            return ToolResult.failure("process finished but returned no result")
 
     except Exception as e:
-        return f"Error executing code: {e}"
+        return ToolResult.failure(f"cannot execute code: {e}")
+
+
+# Tools that never change files; anything else invalidates cached workspace state
+READ_ONLY_TOOLS = {
+    "list_files", "read_file", "read_command_log", "search_file", "grep_search",
+    "find_files", "get_file_info", "git_status", "git_diff", "git_log",
+    "list_installed_packages", "check_syntax", "delegate",
+}
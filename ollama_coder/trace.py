@@ -0,0 +1,222 @@
+import gzip
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Dict, Generator, Iterator, List, Optional
+
+from .results import ToolResult
+
+TRACE_VERSION = 1
+
+# Per-chunk fields that are identical across a stream and only bloat traces
+_CHUNK_NOISE = ("model", "created_at")
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _plain(chunk: Any) -> Dict:
+    """Turn an ollama response object (or dict) into a compact plain dict."""
+    if hasattr(chunk, "model_dump"):
+        data = chunk.model_dump(exclude_none=True)
+    else:
+        data = dict(chunk)
+    for key in _CHUNK_NOISE:
+        data.pop(key, None)
+    return data
+
+
+class TraceRecorder:
+    """
+    Records a session to a JSON-lines trace (gzip-compressed for .gz paths).
+
+    Events are user turns, every streamed model chunk with its offset from the
+    request, and every tool call with arguments, raw result and elapsed time.
+    """
+
+    def __init__(self, path: str, model: str = ""):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = _open(path, "w")
+        self._lock = threading.Lock()
+        self._write({"type": "header", "version": TRACE_VERSION, "model": model, "cwd": os.getcwd(), "time": time.time()})
+
+    def _write(self, event: Dict):
+        line = json.dumps(event, default=str, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def user(self, content: str):
+        self._write({"type": "user", "content": content})
+
+    def turn_end(self, elapsed: float):
+        self._write({"type": "turn_end", "elapsed": round(elapsed, 4)})
+        with self._lock:
+            self._file.flush()
+
+    def wrap_stream(self, stream: Iterator) -> Generator:
+        """Pass a generate_stream iterator through, recording each chunk."""
+        started = time.perf_counter()
+        self._write({"type": "request"})
+        for chunk in stream:
+            data = _plain(chunk)
+            self._write({"type": "chunk", "dt": round(time.perf_counter() - started, 4), "data": data})
+            yield chunk
+
+    def response(self, data: Dict, elapsed: float):
+        """Record a reply that was not streamed (e.g. a chosen best-of candidate) as a one-chunk stream."""
+        self._write({"type": "request"})
+        self._write({"type": "chunk", "dt": round(elapsed, 4), "data": data})
+
+    def tool(self, name: str, arguments: Any, content: str, elapsed: float, ok: bool = True):
+        self._write({"type": "tool", "name": name, "arguments": arguments, "content": content, "elapsed": round(elapsed, 4),
+                     "ok": ok})
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+class Trace:
+    """A loaded trace: the header, user turns, model streams and tool results."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.header: Dict = {}
+        self.turns: List[Dict] = []  # {"content", "elapsed"}; elapsed is None if the turn never finished
+        self.streams: List[List[Dict]] = []  # per model request: [{"dt", "data"}, ...]
+        self.tools: List[Dict] = []
+
+        with _open(path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                kind = event["type"]
+                if kind == "header":
+                    self.header = event
+                elif kind == "user":
+                    self.turns.append({"content": event["content"], "elapsed": None})
+                elif kind == "turn_end" and self.turns:
+                    self.turns[-1]["elapsed"] = event["elapsed"]
+                elif kind == "request":
+                    self.streams.append([])
+                elif kind == "chunk" and self.streams:
+                    self.streams[-1].append({"dt": event["dt"], "data": event["data"]})
+                elif kind == "tool":
+                    self.tools.append(event)
+
+
+class ReplayChatModel:
+    """
+    Stands in for ChatModel, serving recorded streams in order.
+
+    With realtime=True chunks are delayed to their recorded offsets, so a
+    replay includes the model's original latency.
+    """
+
+    def __init__(self, trace: Trace, realtime: bool = False):
+        self.model = trace.header.get("model", "replay")
+        self.realtime = realtime
+        self._streams = deque(trace.streams)
+
+    def probe(self) -> Optional[str]:
+        return None
+
+    def warm_up(self):
+        pass
+
+    def generate_stream(self, messages: List[Dict[str, str]], tools: List[Dict[str, Any]] = None) -> Generator:
+        if not self._streams:
+            yield {"error": "Trace exhausted: the agent made more model requests than were recorded"}
+            return
+        started = time.perf_counter()
+        for chunk in self._streams.popleft():
+            if self.realtime:
+                delay = chunk["dt"] - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            yield chunk["data"]
+
+
+def stub_tools(trace: Trace, names, realtime: bool = False) -> Dict:
+    """Tool functions that return the recorded results, per tool in call order."""
+    recorded = defaultdict(deque)
+    for event in trace.tools:
+        recorded[event["name"]].append(event)
+
+    def make(name):
+        def stub(**arguments):
+            if not recorded[name]:
+                return ToolResult.failure(f"no recorded result left for {name}")
+            event = recorded[name].popleft()
+            if realtime:
+                time.sleep(event["elapsed"])
+            content = event["content"]
+            # replayed: the content already went through the read tracker when it was recorded
+            if event.get("ok", True):
+                return ToolResult.success(content, replayed=True)
+            # Rebuild the failure so it serializes back to the recorded "error: ..." text
+            summary, _, payload = content.partition("\n")
+            if summary.startswith("error: "):
+                summary = summary[len("error: "):]
+            return ToolResult.failure(summary, payload, replayed=True)
+
+        return stub
+
+    return {name: make(name) for name in names}
+
+
+def replay_trace(path: str, execute_tools: bool = False, realtime: bool = False, quiet: bool = True) -> List[Dict]:
+    """
+    Replay a recorded session through a fresh Agent without Ollama.
+
+    Args:
+        path: Trace file written by TraceRecorder
+        execute_tools: Run the real tools instead of returning recorded results
+        realtime: Reproduce recorded model and (stubbed) tool latency
+        quiet: Render to a throwaway terminal instead of the screen
+
+    Returns:
+        One dict per user turn with "content", "recorded" and "replayed" seconds.
+    """
+    from rich.console import Console
+
+    from . import agent as agent_module
+
+    trace = Trace(path)
+    output = None
+    sink = None
+    if quiet:
+        # Still render everything (UI cost is part of what we measure), just not to the screen
+        sink = open(os.devnull, "w")
+        output = Console(file=sink, force_terminal=True, width=agent_module.console.width)
+    agent = agent_module.Agent(model_name=trace.header.get("model", "replay"), verify=False, watch=False,
+                               output=output)
+    agent.llm = ReplayChatModel(trace, realtime=realtime)
+    if not execute_tools:
+        agent.tools.update(stub_tools(trace, agent.tools, realtime=realtime))
+
+    results = []
+    try:
+        for turn in trace.turns:
+            started = time.perf_counter()
+            agent.chat(turn["content"])
+            results.append({
+                "content": turn["content"],
+                "recorded": turn["elapsed"],
+                "replayed": time.perf_counter() - started,
+            })
+    finally:
+        agent.close()
+        if sink is not None:
+            sink.close()
+    return results
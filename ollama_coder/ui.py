@@ -1,9 +1,12 @@
+import json
 import time
 from rich.console import Console
 from rich.panel import Panel
 from rich.align import Align
 from rich.text import Text
 from rich.live import Live
+from rich.console import Group
+from rich.syntax import Syntax
 
 console = Console()
 
@@ -119,131 +122,274 @@ def create_starfield():
     return stars + planets
 
 
-def print_banner():
-    """Print the Space ASCII banner with fixed twinkling stars and planets."""
-    banner_lines = SPACE_BANNER.split("\n")
-    banner_height = len(banner_lines)
-    banner_width = max(len(line) for line in banner_lines)
+STAR_CHARS = {"✨", "⭐", "✦", "✧", "★", "·", "*", "∘", "+", "°"}
+BANNER_COLORS = ["#ff00ff", "#d700ff", "#af00ff", "#8700ff", "#5f00ff", "#0000ff"]
+# Where the logo sits on the canvas
+BANNER_OFFSET = (5, 2)
+# Stars are visible 2 out of every TWINKLE_PERIOD frames
+TWINKLE_PERIOD = 3
+
+
+class BannerRenderer:
+    """
+    Precomputed frames for the starfield banner.
+
+    The canvas, the logo layer and a coordinate-to-style lookup are built once.
+    Star visibility only depends on (frame + phase) % TWINKLE_PERIOD, so each
+    distinct frame is composed once from the static layer by toggling the
+    twinkling cells, and the animation just cycles through them.
+    """
+
+    def __init__(self):
+        banner_lines = SPACE_BANNER.split("\n")
+        self.width = max(len(line) for line in banner_lines) + 10
+        self.height = len(banner_lines) + 4
+        start_x, start_y = BANNER_OFFSET
+
+        # Static layer: logo characters (stars are never drawn over them)
+        self.static = {}
+        for by, line in enumerate(banner_lines):
+            for bx, char in enumerate(line):
+                if char != " ":
+                    color = BANNER_COLORS[by % len(BANNER_COLORS)]
+                    self.static[(start_x + bx, start_y + by)] = (char, f"bold {color}")
+
+        # Celestial objects, later ones drawn over earlier ones like on a canvas
+        self.twinkling = []  # (x, y, char, phase)
+        self.planets = {}
+        star_styles = {}
+        for obj in create_starfield():
+            x, y = obj["x"], obj["y"]
+            if not (0 <= y < self.height and 0 <= x < self.width):
+                continue
+            if obj.get("is_planet"):
+                self.planets[(x, y)] = obj["char"]
+                self.twinkling = [t for t in self.twinkling if (t[0], t[1]) != (x, y)]
+            else:
+                star_styles.setdefault((x, y), obj["color"])
+                self.planets.pop((x, y), None)
+                self.twinkling.append((x, y, obj["char"], obj.get("phase", 0)))
+        self.star_styles = star_styles
+
+        self.frames = [self._compose(frame) for frame in range(TWINKLE_PERIOD)]
+        self.cell_width = max(line.cell_len for line in self.frames[0].split("\n"))
+
+    def _compose(self, frame: int) -> Text:
+        cells = {}
+        for (x, y), char in self.planets.items():
+            cells[(x, y)] = (char, None)
+        for x, y, char, phase in self.twinkling:
+            if (frame + phase) % TWINKLE_PERIOD != TWINKLE_PERIOD - 1:
+                cells[(x, y)] = (char, self.star_styles.get((x, y), "yellow") if char in STAR_CHARS else None)
+        cells.update(self.static)
+
+        output = Text()
+        for y in range(self.height):
+            # Append runs of same-style cells at once instead of char by char
+            run, run_style = [], None
+            for x in range(self.width):
+                char, style = cells.get((x, y), (" ", None))
+                if style != run_style and run:
+                    output.append("".join(run), style=run_style)
+                    run = []
+                run_style = style
+                run.append(char)
+            output.append("".join(run), style=run_style)
+            output.append("\n")
+        return output
+
+    def frame(self, n: int) -> Text:
+        return self.frames[n % TWINKLE_PERIOD]
+
+    def fits(self, width: int) -> bool:
+        # Panel border and padding take two cells on each side
+        return self.cell_width + 4 <= width
 
-    # Canvas size
-    canvas_width = banner_width + 10
-    canvas_height = banner_height + 4
 
-    # Create fixed starfield
-    celestial_objects = create_starfield()
+_banner_renderer = None
+
+
+def get_banner_renderer() -> BannerRenderer:
+    global _banner_renderer
+    if _banner_renderer is None:
+        _banner_renderer = BannerRenderer()
+    return _banner_renderer
+
+
+def _banner_panel(content) -> Panel:
+    return Panel(
+        Align.center(content),
+        border_style="blue",
+        padding=(0, 1),
+        title="[bold cyan]v1.0[/bold cyan]",
+        subtitle="[dim]As good as your LLM[/dim]",
+    )
+
+
+def print_banner(frames: int = 12, delay: float = 0.25):
+    """Print the Space ASCII banner with fixed twinkling stars and planets."""
+    renderer = get_banner_renderer()
+
+    if not renderer.fits(console.width):
+        # Too narrow for the starfield; a wrapped canvas would be unreadable
+        console.print("[bold #af00ff]Space[/bold #af00ff] [bold cyan]v1.0[/bold cyan] [dim]As good as your LLM[/dim]")
+        return
+    if not console.is_terminal:
+        console.print(_banner_panel(renderer.frame(0)))
+        return
 
     # Animate for a few seconds with fixed twinkling pattern
     with Live(console=console, refresh_per_second=4) as live:
-        for frame in range(12):  # ~3 seconds of animation
-            # Create canvas
-            canvas = [[" " for _ in range(canvas_width)] for _ in range(canvas_height)]
-
-            # Draw stars and planets
-            for obj in celestial_objects:
-                x, y = obj["x"], obj["y"]
-                if 0 <= y < len(canvas) and 0 <= x < len(canvas[0]):
-                    # Planets always visible
-                    if obj.get("is_planet"):
-                        canvas[y][x] = obj["char"]
-                    else:
-                        # Stars twinkle in a fixed pattern based on phase
-                        phase = obj.get("phase", 0)
-                        if (frame + phase) % 3 != 2:  # Visible 2 out of 3 frames
-                            canvas[y][x] = obj["char"]
-
-            # Overlay the Space logo in the center
-            start_y = 2
-            start_x = 5
-
-            output = Text()
-            colors = ["#ff00ff", "#d700ff", "#af00ff", "#8700ff", "#5f00ff", "#0000ff"]
-
-            for y, line in enumerate(canvas):
-                for x, char in enumerate(line):
-                    # Check if this position is part of the banner
-                    banner_y = y - start_y
-                    banner_x = x - start_x
-
-                    if 0 <= banner_y < len(banner_lines) and 0 <= banner_x < len(
-                        banner_lines[banner_y]
-                    ):
-                        banner_char = banner_lines[banner_y][banner_x]
-                        if banner_char != " ":
-                            # Draw banner character with gradient (never draw stars here)
-                            color = colors[banner_y % len(colors)]
-                            output.append(banner_char, style=f"bold {color}")
-                        else:
-                            # Empty space in banner - can draw stars/planets here
-                            if char in [
-                                "✨",
-                                "⭐",
-                                "✦",
-                                "✧",
-                                "★",
-                                "·",
-                                "*",
-                                "∘",
-                                "+",
-                                "°",
-                            ]:
-                                # Find color for this star
-                                for obj in celestial_objects:
-                                    if (
-                                        obj["x"] == x
-                                        and obj["y"] == y
-                                        and not obj.get("is_planet")
-                                    ):
-                                        output.append(char, style=obj["color"])
-                                        break
-                                else:
-                                    output.append(char, style="yellow")
-                            elif char in ["🪐", "🌍", "🌎", "🌏", "☄️"]:
-                                output.append(char)
-                            else:
-                                output.append(char)
-                    else:
-                        # Outside banner area - draw stars/planets
-                        if char in ["✨", "⭐", "✦", "✧", "★", "·", "*", "∘", "+", "°"]:
-                            # Find color for this star
-                            for obj in celestial_objects:
-                                if (
-                                    obj["x"] == x
-                                    and obj["y"] == y
-                                    and not obj.get("is_planet")
-                                ):
-                                    output.append(char, style=obj["color"])
-                                    break
-                            else:
-                                output.append(char, style="yellow")
-                        elif char in ["🪐", "🌍", "🌎", "🌏", "☄️"]:
-                            output.append(char)
-                        else:
-                            output.append(char)
-                output.append("\n")
-
-            panel = Panel(
-                Align.center(output),
-                border_style="blue",
-                padding=(0, 1),
-                title="[bold cyan]v1.0[/bold cyan]",
-                subtitle="[dim]As good as your LLM[/dim]",
-            )
-            live.update(panel)
-            time.sleep(0.25)
-
-
-def startup_animation():
-    """Run a funky startup animation sequence."""
-    steps = [
-        ("Initializing core systems...", "dots"),
-        ("Loading neural pathways...", "dots2"),
-        ("Connecting to local model...", "bouncingBar"),
-        ("Calibrating creative engines...", "material"),
-    ]
+        for frame in range(frames):
+            live.update(_banner_panel(renderer.frame(frame)))
+            time.sleep(delay)
+
+
+STARTUP_STEPS = [
+    ("Initializing core systems...", "dots"),
+    ("Loading neural pathways...", "dots2"),
+    ("Connecting to local model...", "bouncingBar"),
+    ("Calibrating creative engines...", "material"),
+]
 
+
+def startup_animation(tasks=()):
+    """
+    Run the startup animation while real startup work finishes.
+
+    Args:
+        tasks: Blocking callables matched to STARTUP_STEPS in order; each step's
+               spinner runs until its callable returns. Steps without a task
+               finish immediately.
+    """
+    tasks = list(tasks)
     console.print()
-    for text, spinner_name in steps:
+    for i, (text, spinner_name) in enumerate(STARTUP_STEPS):
         with console.status(f"[bold cyan]{text}[/bold cyan]", spinner=spinner_name):
-            time.sleep(0.4)
+            if i < len(tasks) and tasks[i] is not None:
+                tasks[i]()
 
     console.print("[bold green]✓ All systems nominal.[/bold green]\n")
+
+
+# Tool panels show at most this much of each payload; /last shows everything
+PREVIEW_LINES = 12
+PREVIEW_CHARS = 600
+# Arguments that carry source code and get syntax highlighted
+CODE_ARGUMENTS = {"content", "new_text", "old_text", "code"}
+
+
+def _clip(text: str, max_lines: int = PREVIEW_LINES, max_chars: int = PREVIEW_CHARS):
+    """Cut text to a preview; returns (preview, note about what was left out or None)."""
+    if len(text) <= max_chars and text.count("\n") < max_lines:
+        return text, None
+    # Find the cut point without splitting the whole payload into lines
+    end = -1
+    for _ in range(max_lines):
+        end = text.find("\n", end + 1)
+        if end == -1:
+            end = len(text)
+            break
+    preview = text[:min(end, max_chars)]
+    hidden_lines = text.count("\n") - preview.count("\n")
+    return preview, f"… {hidden_lines} more lines, {len(text)} chars total (/last to view)"
+
+
+def _code_lexer(name: str, arguments: dict, code: str) -> str:
+    if name == "python_repl":
+        return "python"
+    path = arguments.get("path", "")
+    try:
+        return Syntax.guess_lexer(path, code) if path else "text"
+    except Exception:
+        return "text"
+
+
+def render_tool_call(name: str, arguments) -> Panel:
+    """Panel for a tool call with size-bounded argument previews."""
+    rows = [Text.assemble(("Tool: ", "bold blue"), name)]
+    if not isinstance(arguments, dict):
+        preview, note = _clip(repr(arguments))
+        rows.append(Text(preview))
+        if note:
+            rows.append(Text(note, style="dim"))
+        return Panel(Group(*rows), title="Executing Tool", border_style="blue")
+
+    for key, value in arguments.items():
+        if isinstance(value, str) and key in CODE_ARGUMENTS and value:
+            preview, note = _clip(value)
+            rows.append(Text(f"{key}:", style="dim"))
+            rows.append(Syntax(preview, _code_lexer(name, arguments, preview), theme="ansi_dark", word_wrap=True))
+        else:
+            text = value if isinstance(value, str) else json.dumps(value)
+            preview, note = _clip(text, max_lines=1, max_chars=200)
+            rows.append(Text.assemble((f"{key}: ", "dim"), preview))
+        if note:
+            rows.append(Text(note, style="dim"))
+    return Panel(Group(*rows), title="Executing Tool", border_style="blue")
+
+
+def render_tool_result(name: str, result) -> Panel:
+    """Panel for a ToolResult, clipped to a preview."""
+    from .results import view
+
+    preview, note = _clip(view(result))
+    body = Text(preview)
+    if note:
+        body.append("\n" + note, style="dim")
+    subtitle = f"{result.seconds:.2f}s" if result.seconds >= 0.01 else None
+    return Panel(body, title=f"Output: {name}", subtitle=subtitle, subtitle_align="right",
+                 border_style="green" if result.ok else "red")
+
+
+def render_tool_detail(record: dict) -> Group:
+    """Full arguments and result of a recorded tool call, for /last."""
+    name, arguments = record["name"], record["arguments"]
+    rows = [Text.assemble(("Tool: ", "bold blue"), name)]
+    if isinstance(arguments, dict):
+        for key, value in arguments.items():
+            rows.append(Text(f"{key}:", style="bold dim"))
+            if isinstance(value, str) and key in CODE_ARGUMENTS:
+                rows.append(Syntax(value, _code_lexer(name, arguments, value), theme="ansi_dark", line_numbers=True))
+            else:
+                rows.append(Text(value if isinstance(value, str) else json.dumps(value, indent=2)))
+    else:
+        rows.append(Text(repr(arguments)))
+    rows.append(Text("Output:", style="bold dim"))
+    rows.append(Text(record["content"]))
+    return Group(*rows)
+
+
+PLAN_STATUS_STYLES = {
+    "pending": ("·", "dim"),
+    "running": ("▶", "bold cyan"),
+    "done": ("✓", "green"),
+    "failed": ("✗", "red"),
+    "skipped": ("-", "yellow"),
+}
+
+
+def render_plan_progress(executor) -> Panel:
+    """Step table for a running PlanExecutor, with critical path and time saved."""
+    from rich.table import Table
+
+    stats = executor.stats()
+    critical = set(stats["critical_path"]) if executor.finished else set()
+    table = Table(show_header=True, header_style="bold magenta", box=None, expand=True)
+    table.add_column("", width=1)
+    table.add_column("Step", style="cyan", no_wrap=True)
+    table.add_column("Description", ratio=1, no_wrap=True, overflow="ellipsis")
+    table.add_column("After", style="dim", no_wrap=True)
+    table.add_column("Time", justify="right")
+    for step in executor.steps:
+        icon, style = PLAN_STATUS_STYLES.get(step.status, ("?", ""))
+        step_id = Text(step.id, style="bold yellow" if step.id in critical else "")
+        after = ", ".join(step.depends_on + [f"{d} (file)" for d in step.file_deps if d not in step.depends_on])
+        seconds = f"{step.seconds:.1f}s" if step.started is not None else ""
+        table.add_row(Text(icon, style=style), step_id, step.description, after, seconds)
+
+    caption = f"{stats['wall']:.1f}s elapsed, {stats['serial']:.1f}s of step time"
+    if executor.finished:
+        caption += (f" — saved {stats['saved']:.1f}s vs running in order; critical path "
+                    f"{' → '.join(stats['critical_path'])} ({stats['critical_seconds']:.1f}s)")
+    return Panel(Group(table, Text(caption, style="dim")), title="Plan", border_style="blue")
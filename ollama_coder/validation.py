@@ -0,0 +1,240 @@
+import json
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Names models use for a parameter instead of the schema's; each group is interchangeable
+ALIAS_GROUPS = [
+    {"path", "file_path", "filepath", "file", "filename", "file_name"},
+    {"directory", "dir", "folder", "root", "path"},
+    {"command", "cmd", "shell_command"},
+    {"content", "contents", "text", "data"},
+    {"old_text", "old", "old_str", "old_string", "search", "find"},
+    {"new_text", "new", "new_str", "new_string", "replace", "replacement"},
+    {"pattern", "query", "regex", "search_term"},
+    {"name_pattern", "glob", "filename_pattern", "pattern"},
+    {"file_pattern", "glob", "include", "file_glob"},
+    {"source", "src", "from_path"},
+    {"destination", "dest", "dst", "target", "to_path"},
+    {"code", "source_code", "python"},
+    {"package_name", "package", "packages"},
+    {"message", "commit_message", "msg"},
+]
+_ALIASES: Dict[str, set] = {}
+for _group in ALIAS_GROUPS:
+    for _name in _group:
+        _ALIASES.setdefault(_name, set()).update(_group)
+
+# Keys models wrap the real arguments in
+WRAPPER_KEYS = ("arguments", "args", "parameters", "params", "input", "kwargs")
+
+_TRUE = {"true", "yes", "1", "on"}
+_FALSE = {"false", "no", "0", "off", "none", "null", ""}
+
+
+class ArgumentError(ValueError):
+    """Arguments that could not be repaired; the message is what the model sees."""
+
+
+def _describe(value: Any) -> str:
+    text = json.dumps(value, default=str)
+    return text if len(text) <= 40 else text[:37] + "..."
+
+
+def _compile(schema: Dict[str, Any]) -> Callable[[Any, str, List[str]], Any]:
+    """Turn a JSON schema node into a function that coerces a value or raises ArgumentError."""
+    kind = schema.get("type")
+    enum = schema.get("enum")
+
+    if kind == "object":
+        properties = {name: _compile(sub) for name, sub in schema.get("properties", {}).items()}
+        required = schema.get("required", [])
+
+        def check_object(value, where, repairs):
+            if isinstance(value, str) and value.strip().startswith("{"):
+                try:
+                    value = json.loads(value)
+                    repairs.append("decoded_json")
+                except ValueError:
+                    pass
+            if not isinstance(value, dict):
+                raise ArgumentError(f"{where or 'arguments'} must be an object, got {_describe(value)}")
+            return _check_fields(value, properties, required, where, repairs)
+
+        return check_object
+
+    if kind == "array":
+        item = _compile(schema.get("items", {}))
+
+        def check_array(value, where, repairs):
+            if isinstance(value, str):
+                stripped = value.strip()
+                if stripped.startswith("["):
+                    try:
+                        value = json.loads(stripped)
+                        repairs.append("decoded_json")
+                    except ValueError:
+                        pass
+                if isinstance(value, str):
+                    value = [value]
+                    repairs.append("wrapped_in_list")
+            elif isinstance(value, (dict, int, float)) and not isinstance(value, bool):
+                value = [value]
+                repairs.append("wrapped_in_list")
+            if not isinstance(value, (list, tuple)):
+                raise ArgumentError(f"{where} must be an array, got {_describe(value)}")
+            return [item(v, f"{where}[{i}]", repairs) for i, v in enumerate(value)]
+
+        return check_array
+
+    def check_scalar(value, where, repairs):
+        if kind == "string" and not isinstance(value, str):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                value = str(value)
+                repairs.append("number_to_string")
+            elif isinstance(value, list) and all(isinstance(v, str) for v in value) and where in (
+                    "file_path", "package_name"):
+                # Space separated lists are what these tools expect
+                value = " ".join(value)
+                repairs.append("joined_list")
+            else:
+                raise ArgumentError(f"{where} must be a string, got {_describe(value)}")
+        elif kind in ("integer", "number"):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                try:
+                    value = float(str(value).strip())
+                except ValueError:
+                    raise ArgumentError(f"{where} must be {'an integer' if kind == 'integer' else 'a number'}, "
+                                        f"got {_describe(value)}")
+                repairs.append("string_to_number")
+            if kind == "integer" and not isinstance(value, int):
+                if not value.is_integer():
+                    raise ArgumentError(f"{where} must be an integer, got {_describe(value)}")
+                value = int(value)
+        elif kind == "boolean" and not isinstance(value, bool):
+            text = str(value).strip().lower()
+            if text in _TRUE:
+                value = True
+            elif text in _FALSE:
+                value = False
+            else:
+                raise ArgumentError(f"{where} must be true or false, got {_describe(value)}")
+            repairs.append("coerced_boolean")
+        if enum and value not in enum:
+            raise ArgumentError(f"{where} must be one of {', '.join(map(str, enum))}, got {_describe(value)}")
+        return value
+
+    return check_scalar
+
+
+def _check_fields(value: Dict, properties: Dict[str, Callable], required: List[str], where: str,
+                  repairs: List[str]) -> Dict:
+    prefix = f"{where}." if where else ""
+    result = {}
+    for key, item in value.items():
+        name = key
+        if name not in properties:
+            # Rename an alias to the schema's name when that name is still unset
+            candidates = [p for p in _ALIASES.get(name, ()) if p in properties and p not in value]
+            if len(candidates) != 1:
+                repairs.append("dropped_unknown")
+                continue
+            name = candidates[0]
+            repairs.append("renamed_alias")
+        if item is None and name not in required:
+            continue
+        result[name] = properties[name](item, prefix + name, repairs)
+    missing = [name for name in required if name not in result]
+    if missing:
+        expected = ", ".join(properties)
+        raise ArgumentError(f"missing required {', '.join(prefix + m for m in missing)} (parameters: {expected})")
+    return result
+
+
+def _unwrap(arguments: Any, properties: Dict[str, Any], repairs: List[str]) -> Any:
+    """Undo string-encoded JSON and {"arguments": {...}} style nesting."""
+    if arguments is None:
+        return {}
+    for _ in range(3):
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments)
+            except ValueError:
+                break
+            repairs.append("decoded_json")
+            continue
+        if not isinstance(arguments, dict):
+            break
+        wrapper = next((k for k in WRAPPER_KEYS if k in arguments and k not in properties), None)
+        if wrapper is None:
+            break
+        inner = arguments[wrapper]
+        if isinstance(inner, str):
+            try:
+                inner = json.loads(inner)
+            except ValueError:
+                break
+        if not isinstance(inner, dict):
+            break
+        # Outer keys that are real parameters win; the rest (tool name and such) is dropped
+        outer = {k: v for k, v in arguments.items() if k != wrapper and k in properties}
+        arguments = {**inner, **outer}
+        repairs.append("unwrapped_nesting")
+    return arguments
+
+
+class ToolValidator:
+    """Precompiled argument check for one tool schema."""
+
+    def __init__(self, name: str, parameters: Dict[str, Any]):
+        self.name = name
+        self.properties = parameters.get("properties", {})
+        self._check = _compile({"type": "object", **parameters})
+
+    def validate(self, arguments: Any) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Return (repaired arguments, list of repairs applied).
+
+        Raises:
+            ArgumentError: with a short message for the model when no repair helps
+        """
+        repairs: List[str] = []
+        arguments = _unwrap(arguments, self.properties, repairs)
+        return self._check(arguments, "", repairs), repairs
+
+
+def compile_validators(tool_definitions: List[Dict]) -> Dict[str, ToolValidator]:
+    return {
+        d["function"]["name"]: ToolValidator(d["function"]["name"], d["function"].get("parameters", {}))
+        for d in tool_definitions
+    }
+
+
+class ValidationStats:
+    """Per-model counts of tool calls that were fine, repaired or rejected."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.models: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, model: str, repairs: List[str], rejected: Optional[str] = None):
+        with self._lock:
+            stats = self.models.setdefault(model, {"calls": 0, "repaired": 0, "rejected": 0, "kinds": Counter()})
+            stats["calls"] += 1
+            if rejected is not None:
+                stats["rejected"] += 1
+            elif repairs:
+                stats["repaired"] += 1
+            stats["kinds"].update(repairs)
+
+    def summary(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for model, stats in self.models.items():
+                calls = stats["calls"]
+                line = (f"{model}: {calls} tool calls, {stats['repaired']} repaired "
+                        f"({stats['repaired'] / calls:.0%}), {stats['rejected']} rejected ({stats['rejected'] / calls:.0%})")
+                if stats["kinds"]:
+                    line += " [" + ", ".join(f"{k} {n}" for k, n in stats["kinds"].most_common()) + "]"
+                lines.append(line)
+        return lines
@@ -0,0 +1,211 @@
+import os
+import re
+import subprocess
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Cached git results: key -> (stamp, value)
+_cache: Dict[tuple, Tuple[tuple, object]] = {}
+_cache_lock = threading.Lock()
+# Bumped whenever something may have changed the working tree
+_generation = 0
+
+# Diffs longer than this are paged by file and hunk
+MAX_DIFF_LINES = 200
+
+_HUNK_HEADER = re.compile(r"^@@ .* @@")
+
+
+class GitError(Exception):
+    pass
+
+
+def invalidate_cache():
+    """Forget cached status/log results (call after anything that may touch the working tree)."""
+    global _generation
+    with _cache_lock:
+        _generation += 1
+        _cache.clear()
+
+
+def run_git(args: List[str], cwd: Optional[str] = None, timeout: int = 30) -> str:
+    """Run git with an argument list and return stdout, raising GitError on failure."""
+    result = subprocess.run(
+        ["git"] + args,
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        timeout=timeout,
+    )
+    if result.returncode != 0:
+        raise GitError((result.stderr or result.stdout).strip() or f"git exited with {result.returncode}")
+    return result.stdout
+
+
+def _git_dir(cwd: Optional[str]) -> str:
+    key = ("git-dir", os.path.abspath(cwd or "."))
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key][1]
+    path = run_git(["rev-parse", "--absolute-git-dir"], cwd=cwd).strip()
+    with _cache_lock:
+        _cache[key] = ((), path)
+    return path
+
+
+def _mtime(path: str) -> float:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def _stamp(git_dir: str) -> tuple:
+    """Fingerprint of index, HEAD and the branch HEAD points to."""
+    head = os.path.join(git_dir, "HEAD")
+    ref_mtime = 0
+    try:
+        with open(head) as f:
+            content = f.read().strip()
+        if content.startswith("ref: "):
+            ref_mtime = _mtime(os.path.join(git_dir, content[5:])) or _mtime(os.path.join(git_dir, "packed-refs"))
+    except OSError:
+        pass
+    return (_generation, _mtime(os.path.join(git_dir, "index")), _mtime(head), ref_mtime)
+
+
+def _cached(kind: str, cwd: Optional[str], params: tuple, compute):
+    git_dir = _git_dir(cwd)
+    key = (kind, git_dir, os.path.abspath(cwd or "."), params)
+    stamp = _stamp(git_dir)
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit and hit[0] == stamp:
+            return hit[1]
+    value = compute()
+    with _cache_lock:
+        _cache[key] = (stamp, value)
+    return value
+
+
+def status(cwd: Optional[str] = None) -> Dict:
+    """
+    Parse `git status --porcelain=v2 --branch -z`.
+
+    Returns:
+        {"branch", "upstream", "ahead", "behind", "staged": [(code, path)],
+         "unstaged": [(code, path)], "untracked": [paths], "conflicts": [paths]}
+    """
+
+    def compute():
+        out = run_git(["status", "--porcelain=v2", "--branch", "-z"], cwd=cwd)
+        info = {
+            "branch": None, "upstream": None, "ahead": 0, "behind": 0,
+            "staged": [], "unstaged": [], "untracked": [], "conflicts": [],
+        }
+        entries = out.split("\0")
+        i = 0
+        while i < len(entries):
+            entry = entries[i]
+            i += 1
+            if not entry:
+                continue
+            if entry.startswith("# branch.head "):
+                info["branch"] = entry[len("# branch.head "):]
+            elif entry.startswith("# branch.upstream "):
+                info["upstream"] = entry[len("# branch.upstream "):]
+            elif entry.startswith("# branch.ab "):
+                ahead, behind = entry[len("# branch.ab "):].split()
+                info["ahead"], info["behind"] = int(ahead), -int(behind)
+            elif entry[0] in "12":
+                fields = entry.split(" ", 8 if entry[0] == "1" else 9)
+                xy, path = fields[1], fields[-1]
+                staged_path = path
+                if entry[0] == "2":
+                    # Renames/copies carry the original path as the next entry
+                    staged_path = f"{entries[i]} -> {path}"
+                    i += 1
+                if xy[0] != ".":
+                    info["staged"].append((xy[0], staged_path))
+                if xy[1] != ".":
+                    info["unstaged"].append((xy[1], path))
+            elif entry[0] == "u":
+                info["conflicts"].append(entry.split(" ", 10)[-1])
+            elif entry[0] == "?":
+                info["untracked"].append(entry[2:])
+        return info
+
+    return _cached("status", cwd, (), compute)
+
+
+def log(num_commits: int = 10, cwd: Optional[str] = None) -> List[Dict]:
+    """Recent commits as {"hash", "date", "author", "subject"} dicts."""
+
+    def compute():
+        out = run_git(
+            ["log", f"-n{int(num_commits)}", "--date=short", "--format=%h%x1f%ad%x1f%an%x1f%s%x1e"],
+            cwd=cwd,
+        )
+        commits = []
+        for record in out.split("\x1e"):
+            record = record.strip("\n")
+            if record:
+                short, date, author, subject = record.split("\x1f", 3)
+                commits.append({"hash": short, "date": date, "author": author, "subject": subject})
+        return commits
+
+    return _cached("log", cwd, (int(num_commits),), compute)
+
+
+def numstat(file_path: str = "", staged: bool = False, cwd: Optional[str] = None) -> List[Tuple[str, str, str]]:
+    """Changed files as (added, deleted, path); binary files report '-'."""
+    args = ["diff", "--numstat"]
+    if staged:
+        args.append("--cached")
+    if file_path:
+        args += ["--", file_path]
+    rows = []
+    for line in run_git(args, cwd=cwd).splitlines():
+        added, deleted, path = line.split("\t", 2)
+        rows.append((added, deleted, path))
+    return rows
+
+
+def diff_hunks(file_path: str, staged: bool = False, cwd: Optional[str] = None) -> Tuple[List[str], List[List[str]]]:
+    """
+    Diff of one file split into its header lines and a list of hunks.
+    """
+    args = ["diff"]
+    if staged:
+        args.append("--cached")
+    args += ["--", file_path]
+    header: List[str] = []
+    hunks: List[List[str]] = []
+    for line in run_git(args, cwd=cwd).splitlines():
+        if _HUNK_HEADER.match(line):
+            hunks.append([line])
+        elif hunks:
+            hunks[-1].append(line)
+        else:
+            header.append(line)
+    return header, hunks
+
+
+def add(paths: List[str], cwd: Optional[str] = None) -> str:
+    out = run_git(["add", "--"] + paths, cwd=cwd)
+    invalidate_cache()
+    return out
+
+
+def commit(message: str, cwd: Optional[str] = None) -> str:
+    try:
+        return run_git(["commit", "-m", message], cwd=cwd)
+    finally:
+        invalidate_cache()
+
+
+def changed_paths(base: str = "HEAD", cwd: Optional[str] = None) -> List[str]:
+    """Paths (relative to cwd) that differ from base in the index or working tree, plus untracked files."""
+    out = run_git(["diff", "--name-only", "--relative", "-z", base], cwd=cwd)
+    out += run_git(["ls-files", "--others", "--exclude-standard", "-z"], cwd=cwd)
+    return sorted({path for path in out.split("\0") if path})
@@ -0,0 +1,118 @@
+import shlex
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from .quality import verify_files, format_report
+from .results import ToolResult
+
+# Tools whose successful calls on a .py file trigger verification
+WRITE_TOOLS = {"write_file", "edit_file", "append_to_file"}
+
+
+class BackgroundVerifier:
+    """
+    Verifies edited Python files off the main thread.
+
+    Paths submitted while a run is in progress are batched into the next run.
+    Each run does a syntax check and ruff lint over the batch, then the optional
+    fast test command. Finished reports are picked up with `collect()`, as a
+    ToolResult whose status says whether every run passed.
+    """
+
+    def __init__(self, test_command: Optional[str] = None, test_timeout: int = 60):
+        self.test_command = test_command
+        self.test_timeout = test_timeout
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="space-verify")
+        self._lock = threading.Lock()
+        self._pending: List[str] = []
+        self._reports: List[Tuple[str, bool]] = []
+        self._inflight = 0
+        self._queued = False
+        self._idle = threading.Event()
+        self._idle.set()
+
+    def submit(self, path: str):
+        """Queue a file for verification."""
+        with self._lock:
+            if path in self._pending:
+                return
+            self._pending.append(path)
+            # A run that has not started yet will pick this path up
+            if self._queued:
+                return
+            self._queued = True
+            self._inflight += 1
+            self._idle.clear()
+        self._executor.submit(self._run)
+
+    def collect(self, wait: float = 0) -> Optional[ToolResult]:
+        """
+        Return reports finished since the last call, or None.
+
+        The payload is the reports' text; the status is "error" when any run
+        found a problem.
+
+        Args:
+            wait: Seconds to wait for in-flight runs before collecting
+        """
+        if wait > 0:
+            self._idle.wait(wait)
+        with self._lock:
+            if not self._reports:
+                return None
+            reports, self._reports = self._reports, []
+        passed = all(ok for _, ok in reports)
+        return ToolResult("ok" if passed else "error", "\n".join(text for text, _ in reports),
+                          summary="verification passed" if passed else "verification found problems")
+
+    def _run(self):
+        try:
+            with self._lock:
+                self._queued = False
+                paths, self._pending = self._pending, []
+            if paths:
+                report, passed = self._verify(paths)
+                with self._lock:
+                    self._reports.append((report, passed))
+        finally:
+            with self._lock:
+                self._inflight -= 1
+                if self._inflight == 0:
+                    self._idle.set()
+
+    def _verify(self, paths: List[str]) -> Tuple[str, bool]:
+        started = time.monotonic()
+        report = verify_files(paths, lint=True)
+        lines = [format_report(report)]
+        passed = not (report["syntax"] or report["lint"] or report["errors"])
+
+        if self.test_command:
+            try:
+                result = subprocess.run(
+                    shlex.split(self.test_command),
+                    capture_output=True,
+                    text=True,
+                    timeout=self.test_timeout,
+                )
+                if result.returncode == 0:
+                    lines.append(f"✓ Tests passed ({self.test_command})")
+                else:
+                    output = (result.stdout + result.stderr).strip().splitlines()
+                    passed = False
+                    lines.append(f"✗ Tests failed ({self.test_command}), exit code {result.returncode}:")
+                    lines.extend(output[-20:])
+            except subprocess.TimeoutExpired:
+                passed = False
+                lines.append(f"✗ Tests timed out after {self.test_timeout}s ({self.test_command})")
+            except Exception as e:
+                passed = False
+                lines.append(f"Error running tests: {e}")
+
+        elapsed = time.monotonic() - started
+        return f"[auto-verify {', '.join(paths)} ({elapsed:.1f}s)]\n" + "\n".join(lines), passed
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
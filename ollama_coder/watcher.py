@@ -0,0 +1,409 @@
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+from typing import Callable, Dict, List, Optional, Tuple
+
+# A change to one file; path is relative to the watcher root, kind is
+# "created", "modified" or "deleted"
+ChangeEvent = namedtuple("ChangeEvent", ["path", "kind"])
+
+# Directories never worth watching
+IGNORED_DIRS = {
+    ".git", ".hg", ".svn", "__pycache__", ".venv", "venv", "node_modules",
+    ".mypy_cache", ".pytest_cache", ".ruff_cache", ".tox", ".nox", ".idea", ".space",
+}
+
+# Files above this size are tracked by (size, mtime) instead of content hash
+MAX_HASH_BYTES = 8 * 1024 * 1024
+
+# inotify constants (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_ONLYDIR = 0x01000000
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _hash_file(path: str, size: int) -> Optional[str]:
+    if size > MAX_HASH_BYTES:
+        return None
+    try:
+        with open(path, "rb") as f:
+            return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+    except OSError:
+        return None
+
+
+def walk_files(root: str, ignored=IGNORED_DIRS) -> Dict[str, Tuple[int, int]]:
+    """Map every file under root (relative path) to (size, mtime_ns), skipping ignored dirs."""
+    files = {}
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in ignored:
+                                stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            st = entry.stat(follow_symlinks=False)
+                            files[os.path.relpath(entry.path, root)] = (st.st_size, st.st_mtime_ns)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return files
+
+
+class _InotifyBackend:
+    """Raw change notifications from Linux inotify, one watch per directory."""
+
+    name = "inotify"
+
+    def __init__(self, root: str, ignored):
+        self.root = root
+        self.ignored = ignored
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs: Dict[int, str] = {}
+        self.add_tree(root)
+
+    def add_tree(self, directory: str) -> List[str]:
+        """Watch directory and its subdirectories; return files found in them."""
+        found = []
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            wd = self._add_watch(self.fd, os.fsencode(current), _WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err == errno.ENOSPC:
+                    raise OSError(err, "inotify watch limit reached (fs.inotify.max_user_watches)")
+                continue
+            self.dirs[wd] = current
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in self.ignored:
+                                stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            found.append(entry.path)
+            except OSError:
+                continue
+        return found
+
+    def read(self, timeout: float) -> Optional[List[Tuple[str, str]]]:
+        """Return (abs_path, kind) pairs, or None if events were lost and a rescan is needed."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 1 << 20)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                return None
+            directory = self.dirs.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                del self.dirs[wd]
+                continue
+            if not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and os.path.basename(path) not in self.ignored:
+                    # Files may be written before the new watch exists; report them now
+                    try:
+                        events.extend((found, "created") for found in self.add_tree(path))
+                    except OSError:
+                        return None
+                elif mask & IN_MOVED_FROM:
+                    events.append((path, "deleted-dir"))
+                continue
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                events.append((path, "deleted"))
+            else:
+                events.append((path, "changed"))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _PollingBackend:
+    """Fallback that rescans the tree and diffs (size, mtime) snapshots."""
+
+    name = "polling"
+
+    def __init__(self, root: str, ignored, interval: float, snapshot: Dict[str, Tuple[int, int]]):
+        self.root = root
+        self.ignored = ignored
+        self.interval = interval
+        self.snapshot = dict(snapshot)
+        self._next = time.monotonic() + interval
+        self._stop = threading.Event()
+
+    def read(self, timeout: float) -> List[Tuple[str, str]]:
+        wait = self._next - time.monotonic()
+        if wait > 0:
+            self._stop.wait(min(wait, timeout))
+            if time.monotonic() < self._next:
+                return []
+        self._next = time.monotonic() + self.interval
+
+        current = walk_files(self.root, self.ignored)
+        events = []
+        for rel, sig in current.items():
+            if self.snapshot.get(rel) != sig:
+                events.append((os.path.join(self.root, rel), "changed"))
+        for rel in self.snapshot.keys() - current.keys():
+            events.append((os.path.join(self.root, rel), "deleted"))
+        self.snapshot = current
+        return events
+
+    def close(self):
+        self._stop.set()
+
+
+class WorkspaceWatcher:
+    """
+    Tracks file changes under a workspace root and publishes them in batches.
+
+    Uses inotify on Linux and falls back to periodic rescans elsewhere (or when
+    the inotify watch limit is hit). A manifest maps each file to its size,
+    mtime and content hash; writes that leave the content unchanged are not
+    reported. Subscribers receive a list of ChangeEvent per batch, called from
+    the watcher thread.
+    """
+
+    def __init__(
+        self,
+        root: str = ".",
+        ignored=IGNORED_DIRS,
+        batch_interval: float = 0.2,
+        poll_interval: float = 2.0,
+        use_inotify: bool = True,
+    ):
+        self.root = os.path.abspath(root)
+        self.ignored = set(ignored)
+        self.batch_interval = batch_interval
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify and sys.platform.startswith("linux")
+        self.backend = None
+        # rel path -> [size, mtime_ns, content hash or None if not computed yet]
+        self.manifest: Dict[str, list] = {}
+        self.ready = threading.Event()
+        self._subscribers: List[Callable[[List[ChangeEvent]], None]] = []
+        self._lock = threading.RLock()
+        self._pending: Dict[str, str] = {}
+        self._pending_since = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self, wait: bool = False):
+        """Build the manifest and start watching in a background thread."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="space-watcher", daemon=True)
+        self._thread.start()
+        if wait:
+            self.ready.wait()
+
+    def stop(self):
+        self._stop.set()
+        if self.backend is not None:
+            self.backend.close()
+
+    def subscribe(self, callback: Callable[[List[ChangeEvent]], None]) -> Callable[[], None]:
+        """Register a batch callback; returns a function that unsubscribes it."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+
+        return unsubscribe
+
+    def files(self) -> List[str]:
+        """Relative paths of all tracked files."""
+        with self._lock:
+            return list(self.manifest)
+
+    def snapshot(self) -> Dict[str, Tuple[int, int]]:
+        """(size, mtime_ns) of every tracked file, like walk_files() without the scan."""
+        with self._lock:
+            return {path: (entry[0], entry[1]) for path, entry in self.manifest.items()}
+
+    def file_hash(self, path: str) -> Optional[str]:
+        """Content hash of a tracked file, computed on first request."""
+        rel = self._relative(path)
+        with self._lock:
+            entry = self.manifest.get(rel)
+            if entry is None:
+                return None
+            if entry[2] is None:
+                entry[2] = _hash_file(os.path.join(self.root, rel), entry[0])
+            return entry[2]
+
+    def notify(self, path: str):
+        """Report a change we made ourselves, so subscribers hear of it without waiting for the backend."""
+        rel = self._relative(path)
+        if rel is not None:
+            self._note(rel, "changed")
+
+    def _relative(self, path: str) -> Optional[str]:
+        rel = os.path.relpath(os.path.abspath(path), self.root)
+        return None if rel.startswith("..") else rel
+
+    def _run(self):
+        snapshot = walk_files(self.root, self.ignored)
+        with self._lock:
+            self.manifest = {rel: [size, mtime, None] for rel, (size, mtime) in snapshot.items()}
+        self.backend = self._make_backend(snapshot)
+        self.ready.set()
+
+        while not self._stop.is_set():
+            try:
+                raw = self.backend.read(self.batch_interval)
+            except OSError:
+                if self._stop.is_set():
+                    return
+                raw = None
+            if raw is None:
+                self._rescan()
+                continue
+            for path, kind in raw:
+                rel = os.path.relpath(path, self.root)
+                if kind == "deleted-dir":
+                    prefix = rel + os.sep
+                    with self._lock:
+                        for tracked in [p for p in self.manifest if p.startswith(prefix)]:
+                            self._note(tracked, "deleted")
+                else:
+                    self._note(rel, kind)
+            if self._pending and time.monotonic() - self._pending_since >= self.batch_interval:
+                self._flush()
+
+    def _make_backend(self, snapshot):
+        if self.use_inotify:
+            try:
+                return _InotifyBackend(self.root, self.ignored)
+            except (OSError, AttributeError):
+                pass
+        return _PollingBackend(self.root, self.ignored, self.poll_interval, snapshot)
+
+    def _rescan(self):
+        """Recover from lost events by diffing a fresh walk against the manifest."""
+        current = walk_files(self.root, self.ignored)
+        with self._lock:
+            for rel, (size, mtime) in current.items():
+                entry = self.manifest.get(rel)
+                if entry is None or (entry[0], entry[1]) != (size, mtime):
+                    self._note(rel, "changed")
+            for rel in self.manifest.keys() - current.keys():
+                self._note(rel, "deleted")
+        if isinstance(self.backend, _InotifyBackend):
+            self.backend.close()
+            self.backend = self._make_backend(current)
+
+    def _note(self, rel: str, kind: str):
+        with self._lock:
+            if not self._pending:
+                self._pending_since = time.monotonic()
+            self._pending[rel] = kind
+
+    def _flush(self):
+        """Resolve pending paths against the manifest and publish the real changes."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        events = []
+        for rel, kind in pending.items():
+            path = os.path.join(self.root, rel)
+            try:
+                st = os.stat(path)
+            except OSError:
+                st = None
+            with self._lock:
+                entry = self.manifest.get(rel)
+                if st is None:
+                    if entry is not None:
+                        del self.manifest[rel]
+                        events.append(ChangeEvent(rel, "deleted"))
+                    continue
+                if entry is not None and entry[2] is not None and (entry[0], entry[1]) == (st.st_size, st.st_mtime_ns):
+                    continue
+                digest = _hash_file(path, st.st_size)
+                if entry is not None:
+                    if entry[2] is None:
+                        # No earlier hash to compare with; fall back to the stat signature
+                        same = (entry[0], entry[1]) == (st.st_size, st.st_mtime_ns)
+                    else:
+                        same = digest is not None and digest == entry[2]
+                    entry[0], entry[1], entry[2] = st.st_size, st.st_mtime_ns, digest
+                    if not same:
+                        events.append(ChangeEvent(rel, "modified"))
+                else:
+                    self.manifest[rel] = [st.st_size, st.st_mtime_ns, digest]
+                    events.append(ChangeEvent(rel, "created"))
+
+        if not events:
+            return
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(events)
+            except Exception:
+                pass
+
+
+_watchers: Dict[str, WorkspaceWatcher] = {}
+_watchers_lock = threading.Lock()
+
+
+def get_watcher(root: str = ".", start: bool = True) -> WorkspaceWatcher:
+    """Return the shared watcher for a workspace root, creating it if needed."""
+    root = os.path.abspath(root)
+    with _watchers_lock:
+        watcher = _watchers.get(root)
+        if watcher is None:
+            watcher = _watchers[root] = WorkspaceWatcher(root)
+        if start:
+            watcher.start()
+        return watcher